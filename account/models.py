@@ -48,6 +48,8 @@ class User(AbstractBaseUser, SoftDeleteModel, PermissionsMixin):
 
     objects = UserManager()
 
+    soft_delete_children = ('shoppinglist', 'item', 'sharedshoppinglist')
+
     def __str__(self) -> str:
         return str(self.email)
 
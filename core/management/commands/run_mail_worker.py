@@ -0,0 +1,71 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from core.models import OutgoingEmail
+
+logger = logging.getLogger('shoppero')
+
+
+class Command(BaseCommand):
+    """
+    Django command to deliver the emails of the outbox. Due emails are sent
+    in batches over one reused connection of the configured email backend,
+    and the outbox is polled again after an interval when it is empty. The
+    connection is closed while the worker waits.
+    """
+    help = 'Deliver the emails waiting in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no more emails are due')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.MAIL_WORKER_BATCH_SIZE,
+                            help='Number of emails claimed at once')
+        parser.add_argument('--interval', type=float,
+                            default=settings.MAIL_WORKER_INTERVAL,
+                            help='Seconds to wait when no emails are due')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+        connection = get_connection()
+        try:
+            while True:
+                stats = OutgoingEmail.deliver_pending(
+                    connection, batch_size,
+                    settings.MAIL_WORKER_MAX_ATTEMPTS,
+                    settings.MAIL_WORKER_RETRY_DELAY,
+                    settings.MAIL_WORKER_LEASE,
+                )
+                for key, value in stats.items():
+                    totals[key] += value
+                processed = sum(stats.values())
+                if processed:
+                    logger.info('Mail worker sent %d, retried %d and failed '
+                                '%d emails, %s', stats['sent'],
+                                stats['retried'], stats['failed'],
+                                self._backlog())
+                if processed < batch_size:
+                    if options['once']:
+                        break
+                    # Don't keep an idle connection to the mail server open
+                    connection.close()
+                    time.sleep(options['interval'])
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {totals["sent"]} emails, retried {totals["retried"]}, '
+            f'failed {totals["failed"]}, {self._backlog()}'
+        ))
+
+    @classmethod
+    def _backlog(cls):
+        backlog = OutgoingEmail.backlog()
+        age = backlog['oldest_age']
+        return (f'{backlog["pending"]} pending'
+                + (f', oldest {age:.0f}s old' if age is not None else ''))
@@ -0,0 +1,82 @@
+from typing import Iterator, Tuple
+
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    """
+    Queryset of a SoftDeleteModel with bulk soft delete helpers. Bulk soft
+    delete and undelete cascade to the reverse relations listed in the
+    soft_delete_children attribute of the model, with one UPDATE per table.
+    Like update, they don't call save or send signals.
+    """
+
+    def alive(self) -> 'SoftDeleteQuerySet':
+        """Filter the objects that aren't soft deleted"""
+        return self.filter(deleted__isnull=True)
+
+    def dead(self) -> 'SoftDeleteQuerySet':
+        """Filter the soft deleted objects"""
+        return self.filter(deleted__isnull=False)
+
+    def soft_delete(self) -> int:
+        """
+        Soft delete the objects and their soft delete children that aren't
+        deleted yet. Children get the same deletion date as their parent.
+        :return: number of soft deleted objects, without the children
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            return self._soft_delete(timezone.now())
+
+    def undelete(self) -> int:
+        """
+        Restore the soft deleted objects and the children that were soft
+        deleted together with them. Children deleted on their own before
+        their parent stay deleted.
+        :return: number of restored objects, without the children
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            return self._undelete()
+
+    def _soft_delete(self, deleted) -> int:
+        queryset = self.alive()
+        # Children first, the parents wouldn't match alive() afterwards
+        for field, children in queryset.children():
+            children._soft_delete(deleted)
+        return queryset.update(deleted=deleted)
+
+    def _undelete(self) -> int:
+        queryset = self.dead()
+        for field, children in queryset.children():
+            children.filter(deleted=F(f'{field}__deleted'))._undelete()
+        return queryset.update(deleted=None)
+
+    def children(self) -> Iterator[Tuple[str, 'SoftDeleteQuerySet']]:
+        """
+        Get the soft delete children of the objects
+        :return: name of the foreign key to the parent and queryset of all
+        the children, by model
+        """
+        for name in getattr(self.model, 'soft_delete_children', ()):
+            relation = self.model._meta.get_field(name)
+            field = relation.field.name
+            yield field, relation.related_model.all_objects.filter(
+                **{f'{field}__in': self}
+            )
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """
+    Manager returning only the objects that aren't soft deleted. Used as the
+    default manager of soft delete models, so related managers and
+    get_object_or_404 skip soft deleted objects as well.
+    """
+
+    def get_queryset(self) -> SoftDeleteQuerySet:
+        return super(SoftDeleteManager, self).get_queryset().alive()
+
+
+class AllObjectsManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """Manager returning all objects, including the soft deleted ones"""
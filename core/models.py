@@ -1,11 +1,26 @@
-from django.db import models
+import logging
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from django.contrib.postgres.fields import ArrayField, JSONField
+from django.core.mail import EmailMessage
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from core.managers import AllObjectsManager, SoftDeleteManager
+from core.signals import post_soft_delete
+
+logger = logging.getLogger('shoppero')
+
 
 class SoftDeleteModel(models.Model):
     """
-    Add the fields and methods necessary to support soft delete of the model
+    Add the fields and methods necessary to support soft delete of the model.
+    The default objects manager only returns the objects that aren't soft
+    deleted, all_objects returns all of them. Soft delete cascades to the
+    reverse relations named in soft_delete_children.
     """
     deleted = models.DateTimeField(
         _('date of deletion'),
@@ -15,20 +30,164 @@ class SoftDeleteModel(models.Model):
         help_text=_('The date and time when the object was deleted')
     )
 
+    objects = SoftDeleteManager()
+    all_objects = AllObjectsManager()
+
+    soft_delete_children: Tuple[str, ...] = ()
+
     class Meta:
         abstract = True
 
     def soft_delete(self) -> None:
         """
-        Mark object as soft deleted.
+        Mark object and its soft delete children as soft deleted.
         :return: None
         """
         self.deleted = timezone.now()
-        self.save()
+        queryset = type(self).all_objects.filter(pk=self.pk)
+        with transaction.atomic():
+            for field, children in queryset.children():
+                children._soft_delete(self.deleted)
+            self.save()
+        post_soft_delete.send(sender=self.__class__, instance=self)
 
     def undelete(self) -> None:
         """
-        Mark the object as not soft deleted
+        Mark the object and the children deleted together with it as not
+        soft deleted
         :return: None
         """
-        self.deleted = None
+        queryset = type(self).all_objects.filter(pk=self.pk)
+        with transaction.atomic():
+            for field, children in queryset.children():
+                children.filter(deleted=self.deleted)._undelete()
+            self.deleted = None
+            self.save()
+
+
+class OutgoingEmail(models.Model):
+    """
+    Email waiting in the outbox. Emails are written in the transaction of
+    the request that sends them and delivered by the run_mail_worker
+    command, so a slow mail server doesn't hold up the request.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _('Pending')),
+        (SENT, _('Sent')),
+        (FAILED, _('Failed')),
+    )
+
+    subject = models.TextField(_('subject'))
+    body = models.TextField(_('body'))
+    from_email = models.CharField(_('sender'), max_length=254, null=True,
+                                  blank=True)
+    to = ArrayField(models.CharField(max_length=254), default=list)
+    cc = ArrayField(models.CharField(max_length=254), default=list)
+    bcc = ArrayField(models.CharField(max_length=254), default=list)
+    reply_to = ArrayField(models.CharField(max_length=254), default=list)
+    headers = JSONField(default=dict)
+    status = models.CharField(choices=STATUS_CHOICES, default=PENDING,
+                              max_length=10)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'outgoing_email'
+        indexes = [
+            models.Index(fields=['next_attempt', 'id'],
+                         name='outgoing_email_pending_idx',
+                         condition=Q(status='pending')),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.subject} - {", ".join(self.to)}'
+
+    def to_message(self, connection=None) -> EmailMessage:
+        """Build the html email message of the outbox entry"""
+        email = EmailMessage(self.subject, self.body, self.from_email,
+                             to=self.to, cc=self.cc, bcc=self.bcc,
+                             reply_to=self.reply_to, headers=self.headers,
+                             connection=connection)
+        email.content_subtype = 'html'
+        return email
+
+    @classmethod
+    def deliver_pending(cls, connection, batch_size: int, max_attempts: int,
+                        retry_delay: int, lease: int = 300) -> Dict[str, int]:
+        """
+        Send a batch of due emails over the given connection. The batch is
+        claimed in a short transaction with SKIP LOCKED, which moves its next
+        attempt past the lease, so several workers can run at once. The
+        emails are sent after the claim is committed and the status of every
+        email is saved right after it is sent, so a crashed worker only sends
+        the email it was sending again, once the lease runs out. Failed
+        emails are retried with exponential backoff and given up after the
+        maximum number of attempts.
+        :param connection: email backend connection, opened once and reused
+        for the whole batch
+        :param batch_size: maximum number of emails sent
+        :param max_attempts: number of attempts before an email is failed
+        :param retry_delay: delay in seconds before the first retry, doubled
+        after every failed attempt
+        :param lease: seconds before a claimed email can be claimed again
+        :return: number of sent, retried and failed emails
+        """
+        stats = {'sent': 0, 'retried': 0, 'failed': 0}
+        with transaction.atomic():
+            now = timezone.now()
+            batch = list(cls.objects.select_for_update(skip_locked=True)
+                         .filter(status=cls.PENDING, next_attempt__lte=now)
+                         .order_by('next_attempt', 'id')[:batch_size])
+            cls.objects.filter(pk__in=[x.pk for x in batch]).update(
+                attempts=F('attempts') + 1,
+                next_attempt=now + timedelta(seconds=lease)
+            )
+        opened = False
+        for email in batch:
+            email.attempts += 1
+            try:
+                if not opened:
+                    connection.open()
+                    opened = True
+                connection.send_messages([email.to_message(connection)])
+            except Exception as e:
+                logger.warning('Sending email %d failed: %s', email.pk, e)
+                # Reopened before the next send
+                connection.close()
+                opened = False
+                email.last_error = str(e)
+                if email.attempts >= max_attempts:
+                    email.status = cls.FAILED
+                    stats['failed'] += 1
+                else:
+                    email.next_attempt = timezone.now() + timedelta(
+                        seconds=retry_delay * 2 ** (email.attempts - 1)
+                    )
+                    stats['retried'] += 1
+            else:
+                email.status = cls.SENT
+                email.sent = timezone.now()
+                stats['sent'] += 1
+            email.save(update_fields=['status', 'next_attempt', 'last_error',
+                                      'sent'])
+        return stats
+
+    @classmethod
+    def backlog(cls) -> Dict[str, Optional[float]]:
+        """
+        Get the number of pending emails and the age in seconds of the
+        oldest one
+        """
+        oldest = cls.objects.filter(status=cls.PENDING).aggregate(
+            count=models.Count('id'), created=models.Min('created')
+        )
+        age = None
+        if oldest['created']:
+            age = (timezone.now() - oldest['created']).total_seconds()
+        return {'pending': oldest['count'], 'oldest_age': age}
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'widget_tweaks',
     'core',
@@ -112,6 +113,27 @@ TWO_FACTOR_TOKEN_LENGTH = int(os.environ.get('TWO_FACTOR_TOKEN_LEN'))
 TWO_FACTOR_TOKEN_VALID_MIN = int(
     os.environ.get('TWO_FACTOR_TOKEN_VALID_MINUTES'))
 
+AUTOCOMPLETE_CACHE_SIZE = int(
+    os.environ.get('AUTOCOMPLETE_CACHE_SIZE', 2048))
+AUTOCOMPLETE_CACHE_TTL = int(os.environ.get('AUTOCOMPLETE_CACHE_TTL', 300))
+AUTOCOMPLETE_INDEX_MAX_NODES = int(
+    os.environ.get('AUTOCOMPLETE_INDEX_MAX_NODES', 500000))
+AUTOCOMPLETE_INDEX_IDLE_SECONDS = int(
+    os.environ.get('AUTOCOMPLETE_INDEX_IDLE_SECONDS', 900))
+
+TAG_CACHE_SIZE = int(os.environ.get('TAG_CACHE_SIZE', 4096))
+
+PRICE_CACHE_SIZE = int(os.environ.get('PRICE_CACHE_SIZE', 10000))
+PRICE_CACHE_TTL = int(os.environ.get('PRICE_CACHE_TTL', 300))
+
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2000))
+FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 3600))
+
+SHOPPING_LIST_INGEST_BATCH_SIZE = int(
+    os.environ.get('SHOPPING_LIST_INGEST_BATCH_SIZE', 500))
+SHOPPING_LIST_INGEST_MAX_ITEMS = int(
+    os.environ.get('SHOPPING_LIST_INGEST_MAX_ITEMS', 10000))
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -150,6 +172,12 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 EMAIL_POST = os.environ.get('EMAIL_PORT')
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'false').lower() == 'true'
 
+MAIL_WORKER_BATCH_SIZE = int(os.environ.get('MAIL_WORKER_BATCH_SIZE', 100))
+MAIL_WORKER_INTERVAL = int(os.environ.get('MAIL_WORKER_INTERVAL', 5))
+MAIL_WORKER_MAX_ATTEMPTS = int(os.environ.get('MAIL_WORKER_MAX_ATTEMPTS', 5))
+MAIL_WORKER_RETRY_DELAY = int(os.environ.get('MAIL_WORKER_RETRY_DELAY', 60))
+MAIL_WORKER_LEASE = int(os.environ.get('MAIL_WORKER_LEASE', 300))
+
 PASSWORD_RESET_TIMEOUT_DAYS = 7
 LOGIN_REDIRECT_URL = 'dashboard'
 
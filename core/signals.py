@@ -0,0 +1,5 @@
+from django.db.models.signals import ModelSignal
+
+# Sent after a SoftDeleteModel instance is marked as deleted, the sender can
+# be given as an 'app_label.ModelName' string like for the model signals
+post_soft_delete = ModelSignal(use_caching=True)
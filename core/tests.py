@@ -0,0 +1,164 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import OutgoingEmail
+from utils.send_mail import send_mail
+
+
+class FailingConnection:
+    """Email connection that fails to send every message"""
+
+    def __init__(self):
+        self.opened = 0
+        self.closed = 0
+
+    def open(self):
+        self.opened += 1
+
+    def send_messages(self, messages):
+        raise SMTPServerDisconnected('Connection unexpectedly closed')
+
+    def close(self):
+        self.closed += 1
+
+
+class CrashingConnection:
+    """Email connection that sends the first message and stops the worker
+    on the second one"""
+
+    def __init__(self):
+        self.sent = []
+
+    def open(self):
+        pass
+
+    def send_messages(self, messages):
+        if self.sent:
+            raise KeyboardInterrupt
+        self.sent.extend(messages)
+
+    def close(self):
+        pass
+
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+
+class TestMailOutbox(TestCase):
+    def test_send_mail_writes_outbox(self):
+        """Test that send_mail only stores the email in the outbox"""
+        send_mail('Subject', '<p>Hello</p>', ['user@shoppero.com'],
+                  cc_list=['cc@shoppero.com'])
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.status, OutgoingEmail.PENDING)
+        self.assertEqual(email.to, ['user@shoppero.com'])
+        self.assertEqual(email.cc, ['cc@shoppero.com'])
+
+    def test_send_mail_rolled_back(self):
+        """Test that an email isn't sent if its transaction is rolled
+        back"""
+        try:
+            with transaction.atomic():
+                send_mail('Subject', 'Hello', ['user@shoppero.com'])
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_worker_delivers_outbox(self):
+        """Test that the worker sends the due emails as html and marks them
+        as sent"""
+        for i in range(3):
+            send_mail(f'Subject {i}', '<p>Hello</p>', ['user@shoppero.com'])
+        later = send_mail('Later', 'Hello', ['user@shoppero.com'])
+        later.next_attempt = timezone.now() + timedelta(hours=1)
+        later.save()
+
+        out = StringIO()
+        call_command('run_mail_worker', '--once', '--batch-size', '2',
+                     stdout=out)
+        self.assertIn('Sent 3 emails', out.getvalue())
+        self.assertIn('1 pending', out.getvalue())
+        self.assertEqual([x.subject for x in mail.outbox],
+                         ['Subject 0', 'Subject 1', 'Subject 2'])
+        self.assertEqual(mail.outbox[0].content_subtype, 'html')
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count(), 3
+        )
+
+    def test_failed_delivery_retried(self):
+        """Test that failed emails are retried with backoff and given up
+        after the maximum number of attempts"""
+        email = send_mail('Subject', 'Hello', ['user@shoppero.com'])
+        connection = FailingConnection()
+        stats = OutgoingEmail.deliver_pending(connection, 10, 2, 60)
+        self.assertEqual(stats, {'sent': 0, 'retried': 1, 'failed': 0})
+        self.assertEqual((connection.opened, connection.closed), (1, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts),
+                         (OutgoingEmail.PENDING, 1))
+        self.assertIn('unexpectedly closed', email.last_error)
+        self.assertGreater(email.next_attempt,
+                           timezone.now() + timedelta(seconds=50))
+
+        stats = OutgoingEmail.deliver_pending(connection, 10, 2, 60)
+        self.assertEqual(stats['retried'], 0)
+        OutgoingEmail.objects.update(next_attempt=timezone.now())
+        stats = OutgoingEmail.deliver_pending(connection, 10, 2, 60)
+        self.assertEqual(stats['failed'], 1)
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.FAILED)
+
+    @mock.patch('django.core.mail.backends.smtp.smtplib.SMTP')
+    def test_batch_uses_one_smtp_connection(self, smtp):
+        """Test that a batch is sent over a single SMTP connection, which is
+        reopened after a failed send"""
+        for i in range(3):
+            send_mail(f'Subject {i}', 'Hello', ['user@shoppero.com'])
+        connection = get_connection(SMTP_BACKEND)
+        stats = OutgoingEmail.deliver_pending(connection, 10, 2, 60)
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(smtp.call_count, 1)
+        self.assertEqual(smtp.return_value.sendmail.call_count, 3)
+
+        connection.close()
+        smtp.reset_mock()
+        smtp.return_value.sendmail.side_effect = [
+            SMTPServerDisconnected('Connection unexpectedly closed'),
+            {}, {},
+        ]
+        for i in range(3):
+            send_mail(f'Subject {i}', 'Hello', ['user@shoppero.com'])
+        stats = OutgoingEmail.deliver_pending(connection, 10, 2, 60)
+        self.assertEqual(stats, {'sent': 2, 'retried': 1, 'failed': 0})
+        self.assertEqual(smtp.call_count, 2)
+        connection.close()
+
+    def test_crashed_worker_keeps_sent_status(self):
+        """Test that the status of a sent email is kept when the worker
+        stops in the middle of a batch, and the email being sent is only
+        claimed again after the lease"""
+        first = send_mail('First', 'Hello', ['user@shoppero.com'])
+        second = send_mail('Second', 'Hello', ['user@shoppero.com'])
+        connection = CrashingConnection()
+        with self.assertRaises(KeyboardInterrupt):
+            OutgoingEmail.deliver_pending(connection, 10, 2, 60, lease=300)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, OutgoingEmail.SENT)
+        self.assertEqual((second.status, second.attempts),
+                         (OutgoingEmail.PENDING, 1))
+        self.assertGreater(second.next_attempt,
+                           timezone.now() + timedelta(seconds=250))
+        stats = OutgoingEmail.deliver_pending(connection, 10, 2, 60)
+        self.assertEqual(sum(stats.values()), 0)
@@ -11,6 +11,7 @@ from rest_framework.test import APIClient
 
 from account.models import Profile
 from account.tokens import account_activation_token
+from shopping_list.models import Item
 
 BASIC_INFORMATION_URL = reverse('profile')
 PASSWORD_URL = reverse('change-password')
@@ -164,6 +165,7 @@ class TestUserSettingsPrivate(TestCase):
 
     def test_delete_account_confirm_success(self):
         """Test that the user can delete their account"""
+        Item.objects.create(user=self.user, name='Milk')
         uidb64 = urlsafe_base64_encode(force_bytes(self.user.pk))
         token = account_activation_token.make_token(self.user)
         delete_account_confirm_url = reverse('delete-account-s2',
@@ -172,3 +174,4 @@ class TestUserSettingsPrivate(TestCase):
         self.assertEqual(res.status_code, status.HTTP_302_FOUND)
         self.user.refresh_from_db()
         self.assertIsNotNone(self.user.deleted)
+        self.assertFalse(Item.objects.filter(user=self.user).exists())
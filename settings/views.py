@@ -256,7 +256,6 @@ class DeleteAccountViewSet(ViewSet):
         if str(user.pk) == pk \
                 and account_activation_token.check_token(user, token):
             user.soft_delete()
-            user.save()
             messages.success(request,
                              'Your account was successfully deleted.')
             logger.info('User %d successfully deleted account', user.pk)
@@ -0,0 +1,413 @@
+import heapq
+import logging
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger('shoppero')
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MIN_LENGTH = 2
+# Number of name ordered prefix matches ranked by usage when the
+# autocomplete is served by the database
+AUTOCOMPLETE_CANDIDATES = 100
+
+
+def normalize_prefix(name: str) -> str:
+    """Normalize an autocomplete term the way the database compares it"""
+    return name.upper()
+
+
+class AutocompleteCache:
+    """
+    Per process cache of serialized autocomplete results keyed by user and
+    normalized prefix. A cached result that contains less than the
+    autocomplete limit of items is complete, so longer prefixes are answered
+    by filtering it instead of querying the database.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None,
+                 limit: int = AUTOCOMPLETE_LIMIT):
+        self.limit = limit
+        self._cache = LRUCache(max_size, ttl)
+
+    def get(self, user_id: int, name: str) -> Optional[List[dict]]:
+        """
+        Get the autocomplete result for the user and the name prefix
+        :param user_id: user's ID
+        :param name: beginning of the item name
+        :return: list of serialized items or None if not cached
+        """
+        prefix = normalize_prefix(name)
+        data = self._cache.get((user_id, prefix), count=False)
+        if data is None:
+            data = self._get_from_shorter_prefix(user_id, prefix)
+        self._cache.record(data is not None)
+        return data
+
+    def _get_from_shorter_prefix(self, user_id: int,
+                                 prefix: str) -> Optional[List[dict]]:
+        for length in range(len(prefix) - 1, AUTOCOMPLETE_MIN_LENGTH - 1, -1):
+            data = self._cache.get((user_id, prefix[:length]), count=False)
+            if data is None:
+                continue
+            if len(data) >= self.limit:
+                return None
+            data = [x for x in data
+                    if normalize_prefix(x['name']).startswith(prefix)]
+            self._cache.set((user_id, prefix), data)
+            return data
+        return None
+
+    def set(self, user_id: int, name: str, data: List[dict]) -> None:
+        """
+        Cache the autocomplete result for the user and the name prefix
+        :param user_id: user's ID
+        :param name: beginning of the item name
+        :param data: list of serialized items
+        :return: None
+        """
+        self._cache.set((user_id, normalize_prefix(name)), data)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Remove all cached results of the user"""
+        removed = self._cache.delete_where(lambda key: key[0] == user_id)
+        if removed:
+            logger.debug('Invalidated %d autocomplete results of user %d',
+                         removed, user_id)
+
+    def clear(self) -> None:
+        """Remove all cached results and reset the counters"""
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the cache hit and miss counters
+        :return: dictionary with hits, misses, size and max_size keys
+        """
+        return self._cache.stats()
+
+
+def item_to_autocomplete_dict(item) -> dict:
+    """
+    Convert an item to the same dictionary the ItemAutocompleteSerializer
+    produces
+    :param item: Item instance
+    :return: dictionary with id, name, code and price keys
+    """
+    price = item.price
+    if price is not None:
+        price = str(Decimal(price).quantize(Decimal('0.01')))
+    return {
+        'id': item.id,
+        'name': item.name,
+        'code': item.code,
+        'price': price,
+    }
+
+
+class _TrieNode:
+    __slots__ = ('children', 'item_ids', 'top')
+
+    def __init__(self):
+        self.children = None
+        self.item_ids = None
+        self.top = []
+
+
+class ItemTrie:
+    """
+    Prefix trie of a single user's item names. Names are stored normalized
+    and every item keeps its usage score, so the matches of a prefix are
+    ranked the same way as by the autocomplete query. Every node keeps the
+    best ranked items of its subtree, at most top_size of them, so a search
+    walks down the prefix and reads that node's list.
+    """
+
+    def __init__(self, top_size: int = AUTOCOMPLETE_LIMIT):
+        self.root = _TrieNode()
+        self.node_count = 1
+        self.top_size = top_size
+        self.items = {}
+        self.scores = {}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def insert(self, data: dict, score: Optional[float] = None) -> None:
+        """
+        Add an item to the trie or replace it if it already exists
+        :param data: item dictionary with at least id and name keys
+        :param score: usage score of the item, keeps the current score
+        if not given
+        :return: None
+        """
+        if score is None:
+            score = self.scores.get(data['id'], 0.0)
+        self.remove(data['id'])
+        self.items[data['id']] = data
+        self.scores[data['id']] = score
+        node = self.root
+        path = [node]
+        for char in normalize_prefix(data['name']):
+            if node.children is None:
+                node.children = {}
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+                self.node_count += 1
+            node = child
+            path.append(node)
+        if node.item_ids is None:
+            node.item_ids = []
+        node.item_ids.append(data['id'])
+        for node in path:
+            node.top = heapq.nsmallest(self.top_size,
+                                       node.top + [data['id']],
+                                       key=self._rank_key)
+
+    def set_score(self, item_id: int, score: float) -> None:
+        """Change the usage score of an item in the trie"""
+        if item_id in self.items:
+            self.scores[item_id] = score
+            self._refresh(self._path(self.items[item_id]['name']))
+
+    def remove(self, item_id: int) -> None:
+        """
+        Remove an item from the trie and prune the nodes left empty
+        :param item_id: item's ID
+        :return: None
+        """
+        data = self.items.get(item_id)
+        if data is None:
+            return
+        key = normalize_prefix(data['name'])
+        path = self._path(data['name'])
+        node = path[-1]
+        node.item_ids.remove(item_id)
+        if not node.item_ids:
+            node.item_ids = None
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.item_ids or node.children:
+                break
+            parent = path[depth - 1]
+            del parent.children[key[depth - 1]]
+            if not parent.children:
+                parent.children = None
+            self.node_count -= 1
+            path.pop()
+        # Ancestors of a node that didn't rank the item don't rank it either
+        while path and item_id in path[-1].top:
+            self._refresh([path.pop()])
+        del self.items[item_id]
+        del self.scores[item_id]
+
+    def search(self, name: str, limit: int) -> List[dict]:
+        """
+        Get the items whose name starts with the given prefix, the most
+        used first. Takes time proportional to the length of the prefix,
+        unless more than top_size items are asked for, in which case the
+        whole subtree under the prefix is ranked.
+        :param name: beginning of the item name
+        :param limit: maximum number of returned items
+        :return: list of item dictionaries
+        """
+        node = self.root
+        for char in normalize_prefix(name):
+            if node.children is None or char not in node.children:
+                return []
+            node = node.children[char]
+        if limit <= self.top_size:
+            return [self.items[x] for x in node.top[:limit]]
+        item_ids = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.item_ids:
+                item_ids.extend(node.item_ids)
+            if node.children:
+                stack.extend(node.children.values())
+        item_ids = heapq.nsmallest(limit, item_ids, key=self._rank_key)
+        return [self.items[x] for x in item_ids]
+
+    def _path(self, name: str) -> List[_TrieNode]:
+        path = [self.root]
+        for char in normalize_prefix(name):
+            path.append(path[-1].children[char])
+        return path
+
+    def _refresh(self, path: List[_TrieNode]) -> None:
+        """Rebuild the best ranked items of the nodes, deepest first, from
+        their own items and the lists of their children"""
+        for node in reversed(path):
+            item_ids = list(node.item_ids or [])
+            for child in (node.children or {}).values():
+                item_ids.extend(child.top)
+            node.top = heapq.nsmallest(self.top_size, item_ids,
+                                       key=self._rank_key)
+
+    def _rank_key(self, item_id: int) -> tuple:
+        return (-self.scores[item_id],
+                normalize_prefix(self.items[item_id]['name']), item_id)
+
+
+class ItemIndex:
+    """
+    Per process collection of item tries of the users that recently used
+    autocomplete. Tries are loaded on the first search and updated in place
+    when items change. The total number of trie nodes is kept under
+    max_nodes by dropping the least recently used tries, and tries not used
+    for idle_seconds are dropped as well. Tries are reloaded after max_age
+    seconds to pick up changes made by other worker processes.
+    """
+
+    def __init__(self, max_nodes: int, idle_seconds: float, max_age: float):
+        self.max_nodes = max_nodes
+        self.idle_seconds = idle_seconds
+        self.max_age = max_age
+        self.node_count = 0
+        self._tries = OrderedDict()
+        self._last_used = {}
+        self._loaded = {}
+        self._oversized = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._tries
+
+    def search(self, user_id: int, name: str, limit: int,
+               loader: Callable[[], Iterable[Tuple[dict, float]]]
+               ) -> Optional[List[dict]]:
+        """
+        Get the items of the user whose name starts with the given prefix.
+        Loads the user's trie if it isn't loaded yet.
+        :param user_id: user's ID
+        :param name: beginning of the item name
+        :param limit: maximum number of returned items
+        :param loader: function returning all item dictionaries of the user
+        paired with their usage scores
+        :return: list of item dictionaries or None if the user's catalog
+        is too large to be kept in memory
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            if self._oversized.get(user_id, 0) > now:
+                return None
+            if self._loaded.get(user_id, now) + self.max_age <= now:
+                self._drop(user_id)
+            trie = self._tries.get(user_id)
+        if trie is None:
+            trie = self._load(user_id, loader, now)
+            if trie is None:
+                return None
+        with self._lock:
+            if user_id in self._tries:
+                self._tries.move_to_end(user_id)
+                self._last_used[user_id] = now
+            return trie.search(name, limit)
+
+    def _load(self, user_id: int,
+              loader: Callable[[], Iterable[Tuple[dict, float]]],
+              now: float) -> Optional[ItemTrie]:
+        trie = ItemTrie()
+        for data, score in loader():
+            trie.insert(data, score)
+            if trie.node_count > self.max_nodes:
+                logger.info('Item catalog of user %d is too large for the '
+                            'autocomplete index', user_id)
+                with self._lock:
+                    self._oversized[user_id] = now + self.idle_seconds
+                return None
+        with self._lock:
+            self._drop(user_id)
+            self._tries[user_id] = trie
+            self._last_used[user_id] = now
+            self._loaded[user_id] = now
+            self.node_count += trie.node_count
+            while self.node_count > self.max_nodes:
+                self._drop(next(iter(self._tries)))
+        return trie
+
+    def _drop(self, user_id: int) -> None:
+        trie = self._tries.pop(user_id, None)
+        self._last_used.pop(user_id, None)
+        self._loaded.pop(user_id, None)
+        if trie is not None:
+            self.node_count -= trie.node_count
+
+    def _evict_idle(self, now: float) -> None:
+        while self._tries:
+            user_id = next(iter(self._tries))
+            if self._last_used[user_id] + self.idle_seconds > now:
+                break
+            self._drop(user_id)
+        self._oversized = {user_id: until
+                           for user_id, until in self._oversized.items()
+                           if until > now}
+
+    def _modify(self, user_id: int, method: str, arg) -> None:
+        with self._lock:
+            trie = self._tries.get(user_id)
+            if trie is None:
+                return
+            before = trie.node_count
+            getattr(trie, method)(arg)
+            self.node_count += trie.node_count - before
+
+    def update(self, item) -> None:
+        """
+        Add or replace an item in its owner's trie if the trie is loaded
+        :param item: Item instance
+        :return: None
+        """
+        self._modify(item.user_id, 'insert', item_to_autocomplete_dict(item))
+
+    def update_score(self, user_id: int, item_id: int, score: float) -> None:
+        """
+        Change the usage score of an item if its owner's trie is loaded
+        :param user_id: ID of the item owner
+        :param item_id: item's ID
+        :param score: new usage score
+        :return: None
+        """
+        with self._lock:
+            trie = self._tries.get(user_id)
+            if trie is not None:
+                trie.set_score(item_id, score)
+
+    def remove(self, item) -> None:
+        """
+        Remove an item from its owner's trie if the trie is loaded
+        :param item: Item instance
+        :return: None
+        """
+        self._modify(item.user_id, 'remove', item.id)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop the user's trie so it gets reloaded on the next search"""
+        with self._lock:
+            self._drop(user_id)
+
+    def clear(self) -> None:
+        """Drop all loaded tries"""
+        with self._lock:
+            self._tries.clear()
+            self._last_used.clear()
+            self._loaded.clear()
+            self._oversized.clear()
+            self.node_count = 0
+
+
+autocomplete_cache = AutocompleteCache(settings.AUTOCOMPLETE_CACHE_SIZE,
+                                       settings.AUTOCOMPLETE_CACHE_TTL)
+item_index = ItemIndex(settings.AUTOCOMPLETE_INDEX_MAX_NODES,
+                       settings.AUTOCOMPLETE_INDEX_IDLE_SECONDS,
+                       settings.AUTOCOMPLETE_CACHE_TTL)
@@ -0,0 +1,137 @@
+import json
+import logging
+from typing import Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from shopping_list.models import ShoppingList, ShoppingListItemChanges
+from shopping_list.serializers import ShoppingListItemSerializer, \
+    ShoppingListSerializer
+from shopping_list.signals import list_items_changed
+
+logger = logging.getLogger('shoppero')
+
+INGEST_BATCH_SIZE = settings.SHOPPING_LIST_INGEST_BATCH_SIZE
+INGEST_MAX_ITEMS = settings.SHOPPING_LIST_INGEST_MAX_ITEMS
+
+
+class ShoppingListIngest:
+    """
+    Import items into a shopping list from a stream of NDJSON lines, one
+    item per line in the format of ShoppingListItemSerializer. Lines are
+    validated and inserted in fixed-size batches, each in its own
+    transaction, so memory use doesn't depend on the size of the upload.
+    Invalid lines are reported and skipped. A new, unsaved list is created
+    in the transaction of the first batch, so a failed import doesn't leave
+    an empty list behind, and every report contains the ID of the list to
+    retry against once a batch was committed.
+    """
+
+    def __init__(self, instance: ShoppingList, request,
+                 batch_size: int = INGEST_BATCH_SIZE,
+                 max_items: int = INGEST_MAX_ITEMS):
+        self.instance = instance
+        self.batch_size = batch_size
+        self.max_items = max_items
+        self.processed = 0
+        self.created = 0
+        self.error_count = 0
+        self._serializer = ShoppingListSerializer(
+            instance, context={'request': request}
+        )
+
+    def run(self, lines: Iterable[bytes]) -> Iterator[dict]:
+        """
+        Import the lines, yielding a progress report after every batch and
+        a summary at the end
+        :param lines: iterable of NDJSON encoded items
+        :return: iterator of progress reports
+        """
+        batch = []
+        try:
+            for number, line in enumerate(lines, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                if self.processed + len(batch) >= self.max_items:
+                    yield from self._process(batch)
+                    yield self._summary('error', message=(
+                        f'Can not import more than {self.max_items} items'
+                    ))
+                    return
+                batch.append((number, line))
+                if len(batch) >= self.batch_size:
+                    yield from self._process(batch)
+                    batch = []
+            yield from self._process(batch, last=True)
+        except Exception:
+            logger.exception('Import into list %s failed', self.instance.pk)
+            yield self._summary('error', message='Import failed')
+            return
+        yield self._summary('done')
+
+    def _process(self, batch: List[Tuple[int, bytes]],
+                 last: bool = False) -> Iterator[dict]:
+        if not batch:
+            if last and self.instance.pk is None:
+                self.instance.save()
+            return
+        errors = []
+        numbers = []
+        items = []
+        for number, line in batch:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                errors.append({'line': number, 'errors': {
+                    'non_field_errors': ['Invalid JSON']
+                }})
+                continue
+            serializer = ShoppingListItemSerializer(data=data)
+            if not serializer.is_valid():
+                errors.append({'line': number, 'errors': serializer.errors})
+            elif serializer.validated_data.get('link_id'):
+                errors.append({'line': number, 'errors': {
+                    'link_id': ['Existing items can not be imported']
+                }})
+            else:
+                numbers.append(number)
+                items.append(serializer.validated_data)
+
+        valid_items = []
+        reference_errors = self._serializer.check_references(items)
+        for number, item, error in zip(numbers, items, reference_errors):
+            if error:
+                errors.append({'line': number, 'errors': error})
+            else:
+                valid_items.append(item)
+
+        with transaction.atomic():
+            if self.instance.pk is None:
+                self.instance.save()
+            changes = ShoppingListItemChanges()
+            links = self._serializer.create_links(self.instance, valid_items)
+            changes.add_links(x.pk for x in links)
+            list_items_changed.send(sender=ShoppingList,
+                                    list_ids=[self.instance.pk],
+                                    changes=changes)
+
+        self.processed += len(batch)
+        self.created += len(links)
+        self.error_count += len(errors)
+        logger.info('Imported %d of %d items into list %d', self.created,
+                    self.processed, self.instance.pk)
+        yield self._summary('progress',
+                            errors=sorted(errors, key=lambda x: x['line']))
+
+    def _summary(self, status: str, **kwargs) -> dict:
+        summary = {
+            'status': status,
+            'list_id': self.instance.pk,
+            'processed': self.processed,
+            'created': self.created,
+            'error_count': self.error_count,
+        }
+        summary.update(kwargs)
+        return summary
@@ -0,0 +1,39 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from shopping_list.models import ArchivedShoppingList, ShoppingList
+
+logger = logging.getLogger('shoppero')
+
+
+class Command(BaseCommand):
+    """
+    Django command to move soft deleted shopping lists, archived before
+    the lists were moved at archiving time, to the archive tables. Lists
+    are moved in batches ordered by ID, each in its own transaction.
+    """
+    help = 'Move soft deleted shopping lists to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of shopping lists moved in one '
+                                 'transaction')
+
+    def handle(self, *args, **options):
+        last_id = 0
+        archived = 0
+        while True:
+            list_ids = list(ShoppingList.all_objects.dead()
+                            .filter(id__gt=last_id)
+                            .order_by('id')
+                            .values_list('id', flat=True)
+                            [:options['batch_size']])
+            if not list_ids:
+                break
+            archived += ArchivedShoppingList.archive_lists(list_ids)
+            last_id = list_ids[-1]
+            logger.info('Archived %d shopping lists', archived)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} shopping lists'
+        ))
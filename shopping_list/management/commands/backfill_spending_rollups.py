@@ -0,0 +1,46 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shopping_list.models import CategorySpending, DailySpending, \
+    MonthlySpending
+
+logger = logging.getLogger('shoppero')
+
+ROLLUPS = (DailySpending, MonthlySpending, CategorySpending)
+
+
+class Command(BaseCommand):
+    """
+    Django command to rebuild the precomputed spending statistics of all
+    users from their shopping lists. The rollups of each batch of users are
+    replaced in a single transaction.
+    """
+    help = 'Rebuild the daily, monthly and category spending rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of users processed at once')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        processed = 0
+        while True:
+            user_ids = list(get_user_model().objects.filter(id__gt=last_id)
+                            .order_by('id')
+                            .values_list('id', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            with transaction.atomic():
+                for rollup in ROLLUPS:
+                    rollup.rebuild(user_ids)
+            last_id = user_ids[-1]
+            processed += len(user_ids)
+            logger.info('Rebuilt the spending rollups of %d users', processed)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the spending rollups of {processed} users'
+        ))
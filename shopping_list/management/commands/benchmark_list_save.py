@@ -0,0 +1,79 @@
+from statistics import median
+from time import perf_counter
+from types import SimpleNamespace
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from shopping_list.serializers import ShoppingListSerializer
+
+
+class Command(BaseCommand):
+    """
+    Django command to time saving shopping lists of different sizes through
+    the shopping list serializer. Every size is saved as a new list of new
+    items and then as an update of all its links. Everything is created by
+    a temporary user in a transaction that is rolled back at the end.
+    """
+    help = 'Time creating and updating shopping lists of different sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1, 10, 50, 100],
+                            help='Numbers of items on the saved lists')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Number of saves timed for every size')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                f'benchmark-{uuid4().hex}@shoppero.com', uuid4().hex
+            )
+            request = SimpleNamespace(user=user)
+            for size in options['sizes']:
+                create, update = [], []
+                for _ in range(options['repeat']):
+                    instance, result = self._save(request, None, [
+                        {'name': f'Item {uuid4().hex}', 'price': 1}
+                        for _ in range(size)
+                    ])
+                    create.append(result)
+                    _, result = self._save(request, instance, [
+                        {'link_id': x.pk, 'name': x.item.name,
+                         'quantity': 2, 'is_done': True}
+                        for x in instance.shoppinglistitem_set
+                        .select_related('item')
+                    ])
+                    update.append(result)
+                self._report(size, 'create', create)
+                self._report(size, 'update', update)
+            transaction.set_rollback(True)
+
+    @classmethod
+    def _save(cls, request, instance, items):
+        """
+        Validate and save a list with the given items
+        :return: saved list and tuple of the query count and the seconds
+            spent saving
+        """
+        serializer = ShoppingListSerializer(
+            instance, data={'name': 'Benchmark', 'items': items},
+            context={'request': request}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            serializer.is_valid(raise_exception=True)
+            instance = serializer.save()
+            elapsed = perf_counter() - start
+        return instance, (len(queries), elapsed)
+
+    def _report(self, size, operation, results):
+        query_counts = {x[0] for x in results}
+        times = [x[1] * 1000 for x in results]
+        line = (f'{operation} {size:>4} items: '
+                f'{"/".join(map(str, sorted(query_counts)))} queries, '
+                f'median {median(times):.1f} ms, max {max(times):.1f} ms')
+        self.stdout.write(line)
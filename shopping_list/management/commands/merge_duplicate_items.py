@@ -0,0 +1,131 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min, Case, When, Value, IntegerField
+from django.utils import timezone
+
+from shopping_list.autocomplete import autocomplete_cache, item_index
+from shopping_list.models import Item, ItemPriceHistory, ItemUsage, \
+    ShoppingList, ShoppingListItem, ShoppingListItemChanges, price_cache
+from shopping_list.signals import list_items_changed
+
+logger = logging.getLogger('shoppero')
+
+
+class Command(BaseCommand):
+    """
+    Django command to merge items of a user that have the same normalized
+    name into the oldest one. Shopping list links, tags, price history and
+    usage counters are moved to the kept item and the duplicates are soft
+    deleted.
+    """
+    help = 'Merge duplicate items with the same normalized name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of duplicate groups merged in one '
+                                 'transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the number of duplicates')
+
+    def handle(self, *args, **options):
+        groups = Item.objects.values(
+            'user_id', 'normalized_name'
+        ).annotate(
+            count=Count('id'),
+            keeper_id=Min('id'),
+        ).filter(count__gt=1).order_by('user_id', 'normalized_name')
+
+        if options['dry_run']:
+            duplicates = sum(x['count'] - 1 for x in groups)
+            self.stdout.write(f'Found {duplicates} duplicate items in '
+                              f'{len(groups)} groups')
+            return
+
+        merged_groups = 0
+        merged_items = 0
+        while True:
+            batch = list(groups[:options['batch_size']])
+            if not batch:
+                break
+            merged_items += self._merge(batch)
+            merged_groups += len(batch)
+            logger.info('Merged %d duplicate items in %d groups',
+                        merged_items, merged_groups)
+        self.stdout.write(self.style.SUCCESS(
+            f'Merged {merged_items} duplicate items in {merged_groups} groups'
+        ))
+
+    @transaction.atomic
+    def _merge(self, groups):
+        keepers = {(x['user_id'], x['normalized_name']): x['keeper_id']
+                   for x in groups}
+        candidates = Item.objects.filter(
+            user_id__in={x['user_id'] for x in groups},
+            normalized_name__in={x['normalized_name'] for x in groups},
+        ).values_list('id', 'user_id', 'normalized_name')
+        duplicates = {}
+        for item_id, user_id, name in candidates:
+            keeper_id = keepers.get((user_id, name))
+            if keeper_id is not None and keeper_id != item_id:
+                duplicates[item_id] = keeper_id
+
+        changes = ShoppingListItemChanges(
+            item_ids=set(duplicates) | set(duplicates.values())
+        )
+        links = ShoppingListItem.all_objects.filter(item_id__in=duplicates)
+        list_ids = set(links.values_list('shopping_list_id', flat=True))
+        keeper_id = Case(
+            *[When(item_id=k, then=Value(v)) for k, v in duplicates.items()],
+            output_field=IntegerField()
+        )
+        links.update(item_id=keeper_id)
+        ItemPriceHistory.objects.filter(item_id__in=duplicates) \
+            .update(item_id=keeper_id)
+        keeper_ids = set(duplicates.values())
+        transaction.on_commit(
+            lambda: [price_cache.delete(x) for x in keeper_ids]
+        )
+
+        tags = Item.tags.through
+        tags.objects.bulk_create([
+            tags(item_id=duplicates[item_id], category_id=category_id)
+            for item_id, category_id in tags.objects.filter(
+                item_id__in=duplicates
+            ).values_list('item_id', 'category_id')
+        ], ignore_conflicts=True)
+        # bulk_create doesn't send m2m_changed
+        Item.update_tags_display(set(duplicates.values()))
+
+        self._merge_usage(duplicates)
+        Item.objects.filter(pk__in=duplicates).update(deleted=timezone.now())
+
+        list_items_changed.send(sender=ShoppingList, list_ids=list_ids,
+                                changes=changes)
+        for user_id in {x['user_id'] for x in groups}:
+            item_index.invalidate_user(user_id)
+            autocomplete_cache.invalidate_user(user_id)
+        return len(duplicates)
+
+    @classmethod
+    def _merge_usage(cls, duplicates):
+        """Add the usage counters of the duplicates to the kept items"""
+        usages = ItemUsage.objects.filter(
+            item_id__in=set(duplicates) | set(duplicates.values())
+        )
+        merged = {}
+        for usage in usages:
+            keeper_id = duplicates.get(usage.item_id, usage.item_id)
+            total = merged.get(keeper_id)
+            if total is None:
+                usage.item_id = keeper_id
+                merged[keeper_id] = usage
+                continue
+            total.use_count += usage.use_count
+            total.score += usage.score
+            if usage.last_used and (not total.last_used or
+                                    usage.last_used > total.last_used):
+                total.last_used = usage.last_used
+        usages.delete()
+        ItemUsage.objects.bulk_create(merged.values())
@@ -0,0 +1,186 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import CASCADE, Exists, OuterRef
+from django.db.models.deletion import get_candidate_relations_to_delete
+from django.utils import timezone
+
+from shopping_list.models import Item, ShoppingList, ShoppingListItem, \
+    SharedShoppingList, ShoppingListItemChanges
+from shopping_list.signals import list_items_changed
+
+logger = logging.getLogger('shoppero')
+
+
+class Command(BaseCommand):
+    """
+    Django command to permanently delete rows that were soft deleted before
+    a given number of days. Rows are deleted in batches ordered by primary
+    key, each in its own short transaction, with a pause between batches so
+    the command can run against the live database. Items still on a
+    shopping list are kept, archived shopping lists keep a copy of the item
+    name and code. Archived shopping lists are moved to the archive tables
+    instead of purged. The
+    rows owned by a purged user are purged in batches before the user, so
+    deleting the user doesn't cascade to all of them in one transaction.
+    """
+    help = 'Permanently delete old soft deleted rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30,
+                            help='Minimum age in days of the purged rows')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows deleted in one transaction')
+        parser.add_argument('--sleep', type=float, default=0.1,
+                            help='Seconds to wait between batches')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the rows that would be purged')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        # Children first, so their tombstones are not counted as cascades
+        models = (SharedShoppingList, ShoppingListItem, Item,
+                  get_user_model())
+        total_rows = 0
+        total_bytes = 0
+        for model in models:
+            queryset = self._tombstones(model, cutoff)
+            if model is get_user_model():
+                rows, size = self._purge_owners(model, queryset, options)
+            else:
+                rows, size = self._purge(model, queryset, options)
+            total_rows += rows
+            total_bytes += size
+            self.stdout.write(f'{model._meta.db_table}: {rows} rows, '
+                              f'{size} bytes')
+
+        action = 'Would purge' if options['dry_run'] else 'Purged'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {total_rows} rows and {total_bytes} bytes of row '
+            f'data soft deleted before {cutoff:%Y-%m-%d %H:%M}'
+        ))
+
+    @classmethod
+    def _tombstones(cls, model, cutoff):
+        """Get the rows of the model that can be purged"""
+        queryset = model.all_objects.filter(deleted__lt=cutoff)
+        if model is Item:
+            queryset = queryset.filter(~Exists(
+                ShoppingListItem.all_objects.filter(item_id=OuterRef('pk'))
+            ))
+        return queryset
+
+    def _purge_owners(self, model, queryset, options):
+        """
+        Delete the rows of the queryset one at a time, after purging the
+        rows each of them cascades to in batches
+        :return: number of deleted rows, including cascades, and the size
+            of the purged rows
+        """
+        last_id = 0
+        purged_rows = 0
+        purged_bytes = 0
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            for pk in ids:
+                rows, size = self._purge_related(model, '', pk, options)
+                purged_rows += rows
+                purged_bytes += size
+                rows, size = self._purge(
+                    model, model._base_manager.filter(pk=pk), options
+                )
+                purged_rows += rows
+                purged_bytes += size
+            last_id = ids[-1]
+        return purged_rows, purged_bytes
+
+    def _purge_related(self, model, path, pk, options, parents=()):
+        """
+        Purge the rows that deleting a row of the model cascades to,
+        deepest relations first. The links of a user's items on other
+        users' lists are purged before the items, with the changes applied
+        to the summaries, spending and versions of those lists.
+        :param model: model of the deleted row
+        :param path: lookup from the model to the purged row, empty for the
+            purged row itself
+        :param pk: primary key of the purged row
+        :param parents: models already on the path, to stop at cycles
+        :return: number of deleted rows and the size of the purged rows
+        """
+        purged_rows = 0
+        purged_bytes = 0
+        parents += (model,)
+        for relation in get_candidate_relations_to_delete(model._meta):
+            child = relation.related_model
+            if relation.on_delete is not CASCADE or child in parents:
+                continue
+            lookup = relation.field.name + (f'__{path}' if path else '')
+            rows, size = self._purge_related(child, lookup, pk, options,
+                                             parents)
+            purged_rows += rows
+            purged_bytes += size
+            rows, size = self._purge(
+                child, child._base_manager.filter(**{lookup: pk}), options
+            )
+            purged_rows += rows
+            purged_bytes += size
+        return purged_rows, purged_bytes
+
+    def _purge(self, model, queryset, options):
+        """
+        Delete the rows of the queryset in keyset ordered batches
+        :return: number of deleted rows, including cascades, and the size
+            of the purged rows
+        """
+        last_id = 0
+        purged_rows = 0
+        purged_bytes = 0
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            purged_bytes += self._row_size(model, ids)
+            if options['dry_run']:
+                purged_rows += len(ids)
+            else:
+                purged_rows += self._delete(model, ids)
+            last_id = ids[-1]
+            logger.info('Purged %d rows of %s', purged_rows,
+                        model._meta.db_table)
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return purged_rows, purged_bytes
+
+    @classmethod
+    @transaction.atomic
+    def _delete(cls, model, ids):
+        list_ids = []
+        if model is ShoppingListItem:
+            list_ids = set(model.all_objects.filter(pk__in=ids)
+                           .values_list('shopping_list_id', flat=True))
+            changes = ShoppingListItemChanges(link_ids=ids)
+        deleted, _ = model._base_manager.filter(pk__in=ids).delete()
+        if list_ids:
+            # The summaries still count soft deleted links
+            list_items_changed.send(sender=ShoppingList, list_ids=list_ids,
+                                    changes=changes)
+        return deleted
+
+    @classmethod
+    def _row_size(cls, model, ids):
+        """Get the total size of the given rows in bytes"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(pg_column_size(t.*)), 0)
+                FROM {model._meta.db_table} t
+                WHERE t.{model._meta.pk.column} = ANY(%s)
+            """, [ids])
+            return cursor.fetchone()[0]
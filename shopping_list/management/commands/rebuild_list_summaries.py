@@ -0,0 +1,73 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shopping_list.models import ShoppingList, ShoppingListSummary
+from shopping_list.querysets import get_shopping_list_totals_queryset
+
+logger = logging.getLogger('shoppero')
+
+SUMMARY_FIELDS = ('item_count', 'complete_item_count', 'total_price')
+
+
+class Command(BaseCommand):
+    """
+    Django command to rebuild the precomputed shopping list summaries from
+    the shopping list items, or to verify that they are up to date
+    """
+    help = 'Rebuild or verify the shopping list summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of shopping lists processed at once')
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report summaries that are out of date')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        processed = 0
+        mismatched = []
+        while True:
+            list_ids = list(ShoppingList.objects.filter(id__gt=last_id)
+                            .order_by('id')
+                            .values_list('id', flat=True)[:batch_size])
+            if not list_ids:
+                break
+            if options['verify']:
+                mismatched += self._verify(list_ids)
+            else:
+                ShoppingListSummary.refresh(list_ids)
+            last_id = list_ids[-1]
+            processed += len(list_ids)
+            logger.info('Processed %d shopping list summaries', processed)
+
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {processed} shopping list summaries'
+            ))
+        elif mismatched:
+            raise CommandError(
+                f'{len(mismatched)} of {processed} shopping list summaries '
+                f'are out of date: {", ".join(map(str, mismatched))}'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'All {processed} shopping list summaries are up to date'
+            ))
+
+    @classmethod
+    def _verify(cls, list_ids):
+        """Get the IDs of the lists whose summary doesn't match their items"""
+        expected = {
+            x['id']: tuple(x[field] for field in SUMMARY_FIELDS)
+            for x in get_shopping_list_totals_queryset().filter(
+                id__in=list_ids
+            )
+        }
+        stored = {
+            x[0]: x[1:] for x in ShoppingListSummary.objects.filter(
+                shopping_list_id__in=list_ids
+            ).values_list('shopping_list_id', *SUMMARY_FIELDS)
+        }
+        return [x for x in list_ids if stored.get(x) != expected.get(x)]
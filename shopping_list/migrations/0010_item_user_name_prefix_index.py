@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shopping_list', '0009_sharedshoppinglist_access_level'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                'item_user_name_prefix_idx ON item '
+                '(user_id, UPPER(name) text_pattern_ops) '
+                'WHERE deleted IS NULL',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                        'item_user_name_prefix_idx',
+        ),
+    ]
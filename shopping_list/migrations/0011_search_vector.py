@@ -0,0 +1,45 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:28
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from shopping_list.search import item_search_vector, \
+    shopping_list_search_vector
+
+
+def fill_search_vectors(apps, schema_editor):
+    Item = apps.get_model('shopping_list', 'Item')
+    ShoppingList = apps.get_model('shopping_list', 'ShoppingList')
+    Item.objects.update(search_vector=item_search_vector(Item))
+    ShoppingList.objects.update(search_vector=shopping_list_search_vector())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0010_item_user_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='item_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='shopping_list_search_idx'),
+        ),
+        migrations.RunPython(fill_search_vectors,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:29
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shopping_list', '0011_search_vector'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='item',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['user', 'id'], name='item_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='item',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['user', 'name', 'id'], name='item_user_name_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='item',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['user', 'code', 'id'], name='item_user_code_id_idx'),
+        ),
+    ]
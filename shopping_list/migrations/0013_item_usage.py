@@ -0,0 +1,50 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopping_list', '0012_item_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemUsage',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='usage', serialize=False, to='shopping_list.Item')),
+                ('use_count', models.PositiveIntegerField(default=0)),
+                ('score', models.FloatField(default=0)),
+                ('last_used', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'item_usage',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='itemusage',
+            index=models.Index(fields=['user', '-score'], name='item_usage_user_score_idx'),
+        ),
+        migrations.RunSQL(
+            # Count existing list items, weighting each use by the creation
+            # date of its list like ItemUsage.weight does
+            sql="""
+                INSERT INTO item_usage
+                    (item_id, user_id, use_count, score, last_used)
+                SELECT link.item_id, item.user_id, COUNT(*),
+                    SUM(POWER(2, (EXTRACT(EPOCH FROM list.created)
+                                  - 1577836800) / 2592000.0)),
+                    MAX(list.created)
+                FROM shopping_list_item link
+                JOIN item ON item.id = link.item_id
+                JOIN shopping_list list ON list.id = link.shopping_list_id
+                GROUP BY link.item_id, item.user_id
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
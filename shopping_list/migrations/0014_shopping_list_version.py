@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0013_item_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Increased on every change of the list, its items or its shares', verbose_name='version'),
+        ),
+    ]
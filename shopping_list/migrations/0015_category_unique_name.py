@@ -0,0 +1,48 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    """
+    Normalize category names and merge categories that end up with the same
+    name into the oldest one, moving their items over
+    """
+    Category = apps.get_model('shopping_list', 'Category')
+    Item = apps.get_model('shopping_list', 'Item')
+    ItemTags = Item.tags.through
+    keepers = {}
+    for category in Category.objects.order_by('id'):
+        name = ' '.join(category.name.split())
+        if not name:
+            category.delete()
+            continue
+        keeper = keepers.get(name)
+        if keeper is None:
+            keepers[name] = category
+            if category.name != name:
+                category.name = name
+                category.save(update_fields=['name'])
+            continue
+        tagged = ItemTags.objects.filter(category_id=keeper.id) \
+            .values('item_id')
+        ItemTags.objects.filter(category_id=category.id) \
+            .exclude(item_id__in=tagged).update(category_id=keeper.id)
+        category.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0014_shopping_list_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=30, unique=True, verbose_name='item category'),
+        ),
+    ]
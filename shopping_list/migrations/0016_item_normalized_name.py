@@ -0,0 +1,42 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:46
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_normalized_names(apps, schema_editor):
+    Item = apps.get_model('shopping_list', 'Item')
+    last_id = 0
+    while True:
+        items = list(Item.objects.filter(id__gt=last_id)
+                     .only('id', 'name').order_by('id')[:BATCH_SIZE])
+        if not items:
+            break
+        for item in items:
+            item.normalized_name = ' '.join(item.name.split()).casefold()
+        Item.objects.bulk_update(items, ['normalized_name'])
+        last_id = items[-1].id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shopping_list', '0015_category_unique_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, help_text='Case folded name with collapsed whitespace, used for finding items with the same name', max_length=200, verbose_name='normalized item name'),
+        ),
+        migrations.RunPython(fill_normalized_names,
+                             migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='item',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['user', 'normalized_name'], name='item_user_normalized_name_idx'),
+        ),
+    ]
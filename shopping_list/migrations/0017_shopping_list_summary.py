@@ -0,0 +1,45 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopping_list', '0016_item_normalized_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListSummary',
+            fields=[
+                ('shopping_list', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='shopping_list.ShoppingList')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('complete_item_count', models.PositiveIntegerField(default=0)),
+                ('total_price', models.DecimalField(blank=True, decimal_places=4, max_digits=15, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'shopping_list_summary',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglistsummary',
+            index=models.Index(fields=['user', 'shopping_list'], name='shopping_list_summary_user_idx'),
+        ),
+        migrations.RunSQL("""
+            INSERT INTO shopping_list_summary (shopping_list_id, user_id,
+                item_count, complete_item_count, total_price, updated_at)
+            SELECT l.id, l.user_id, COUNT(li.item_id),
+                COUNT(li.item_id) FILTER (WHERE li.is_done),
+                COALESCE(SUM(i.price * li.quantity), 0), now()
+            FROM shopping_list l
+            LEFT JOIN shopping_list_item li ON li.shopping_list_id = l.id
+            LEFT JOIN item i ON i.id = li.item_id
+            GROUP BY l.id
+        """, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopping_list', '0017_shopping_list_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySpending',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='first day of the period')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=4, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'spending_category_monthly',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySpending',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='first day of the period')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=4, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'spending_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlySpending',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='first day of the period')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=4, default=0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'spending_monthly',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['user', 'created'], name='shopping_list_user_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='monthlyspending',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='dailyspending',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='categoryspending',
+            name='category',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shopping_list.Category'),
+        ),
+        migrations.AddField(
+            model_name='categoryspending',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyspending',
+            constraint=models.UniqueConstraint(fields=('user', 'period'), name='spending_monthly_user_period_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyspending',
+            constraint=models.UniqueConstraint(fields=('user', 'period'), name='spending_daily_user_period_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='categoryspending',
+            index=models.Index(fields=['user', 'period'], name='spending_category_user_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0018_spending_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemPriceHistory',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('source', models.CharField(choices=[('item', 'Item price'), ('list', 'Shopping list price')], max_length=4)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='shopping_list.Item')),
+                ('shopping_list', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shopping_list.ShoppingList')),
+            ],
+            options={
+                'db_table': 'item_price_history',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='itempricehistory',
+            index=models.Index(fields=['item', 'source', '-recorded_at'], name='item_price_history_idx'),
+        ),
+        migrations.RunSQL("""
+            INSERT INTO item_price_history (item_id, price, source,
+                shopping_list_id, recorded_at)
+            SELECT i.id, i.price, 'item', NULL, now()
+            FROM item i
+            WHERE i.price IS NOT NULL
+        """, migrations.RunSQL.noop),
+        migrations.RunSQL("""
+            INSERT INTO item_price_history (item_id, price, source,
+                shopping_list_id, recorded_at)
+            SELECT DISTINCT ON (li.item_id) li.item_id, li.price, 'list',
+                l.id, l.created
+            FROM shopping_list_item li
+            JOIN shopping_list l ON l.id = li.shopping_list_id
+            WHERE li.price IS NOT NULL AND li.deleted IS NULL
+            ORDER BY li.item_id, l.created DESC, li.id DESC
+        """, migrations.RunSQL.noop),
+    ]
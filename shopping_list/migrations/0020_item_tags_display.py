@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0019_item_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='tags_display',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Comma separated tag names, used by views that only display the tags', max_length=1000, verbose_name='item tag names'),
+        ),
+        migrations.RunSQL("""
+            UPDATE item SET tags_display = t.names
+            FROM (
+                SELECT it.item_id, string_agg(c.name, ', ' ORDER BY c.name)
+                    AS names
+                FROM item_tags it
+                JOIN shopping_list_category c ON c.id = it.category_id
+                GROUP BY it.item_id
+            ) t
+            WHERE t.item_id = item.id
+        """, migrations.RunSQL.noop),
+    ]
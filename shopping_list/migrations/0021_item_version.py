@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0020_item_tags_display'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Increased whenever the displayed item changes, used as the cache key of its rendered fragments', verbose_name='item version'),
+        ),
+    ]
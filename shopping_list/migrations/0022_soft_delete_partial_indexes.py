@@ -0,0 +1,31 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:02
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shopping_list', '0021_item_version'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='sharedshoppinglist',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['user', 'shopping_list'], name='shared_list_user_alive_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='sharedshoppinglist',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['shopping_list', 'id'], name='shared_list_list_alive_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppinglist',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['user', 'id'], name='shopping_list_user_alive_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppinglistitem',
+            index=models.Index(condition=models.Q(deleted__isnull=True), fields=['shopping_list', 'id'], name='list_item_list_alive_idx'),
+        ),
+    ]
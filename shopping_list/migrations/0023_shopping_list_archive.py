@@ -0,0 +1,51 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shopping_list', '0022_soft_delete_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedShoppingList',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, max_length=100, null=True, verbose_name='shopping list name')),
+                ('created', models.DateTimeField(verbose_name='creation date')),
+                ('archived', models.DateTimeField(verbose_name='date of archiving')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('total_price', models.DecimalField(decimal_places=4, max_digits=15, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_shopping_lists', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'archived_shopping_list',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedShoppingListItem',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200, verbose_name='item name')),
+                ('code', models.CharField(blank=True, max_length=20, verbose_name='item code')),
+                ('is_done', models.BooleanField(default=False)),
+                ('quantity', models.DecimalField(decimal_places=2, default=1, max_digits=4)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True)),
+                ('item', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shopping_list.Item')),
+                ('shopping_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shopping_list.ArchivedShoppingList')),
+            ],
+            options={
+                'db_table': 'archived_shopping_list_item',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedshoppinglist',
+            index=models.Index(fields=['user', '-id'], name='archived_list_user_id_idx'),
+        ),
+    ]
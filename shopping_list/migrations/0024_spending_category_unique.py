@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0023_shopping_list_archive'),
+    ]
+
+    operations = [
+        # Concurrent rebuilds could leave duplicate rows, each one holding
+        # the full total of the period
+        migrations.RunSQL(
+            """
+            DELETE FROM spending_category_monthly a
+            USING spending_category_monthly b
+            WHERE a.id > b.id AND a.user_id = b.user_id
+                AND a.period = b.period
+                AND a.category_id IS NOT DISTINCT FROM b.category_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='categoryspending',
+            constraint=models.UniqueConstraint(condition=models.Q(category__isnull=False), fields=('user', 'period', 'category'), name='spending_category_user_period_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='categoryspending',
+            constraint=models.UniqueConstraint(condition=models.Q(category__isnull=True), fields=('user', 'period'), name='spending_category_user_period_null_uniq'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.0.14 on 2026-10-18 17:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping_list', '0024_spending_category_unique'),
+    ]
+
+    operations = [
+        # The backfill left NULL totals for lists without priced items,
+        # refresh and the differences count them as 0
+        migrations.RunSQL(
+            """
+            UPDATE shopping_list_summary SET total_price = 0
+            WHERE total_price IS NULL
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('shopping_list', '0025_summary_total_not_null'),
+    ]
+
+    operations = [
+        # A C collation index serves both the prefix match and the name
+        # order of the autocomplete, a text_pattern_ops one only the match
+        migrations.RunSQL(
+            sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                'item_user_upper_name_idx ON item '
+                '(user_id, (UPPER(name) COLLATE "C")) '
+                'WHERE deleted IS NULL',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                        'item_user_upper_name_idx',
+        ),
+        migrations.RunSQL(
+            sql='DROP INDEX CONCURRENTLY IF EXISTS '
+                'item_user_name_prefix_idx',
+            reverse_sql='CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                        'item_user_name_prefix_idx ON item '
+                        '(user_id, UPPER(name) text_pattern_ops) '
+                        'WHERE deleted IS NULL',
+        ),
+    ]
@@ -1,21 +1,43 @@
 import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, connection, transaction
+from django.db.models import Q, F, Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth
+from django.db.models.signals import post_save, post_delete, pre_delete, \
+    pre_save, m2m_changed
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from account.models import Profile
 from core.models import SoftDeleteModel
+from core.signals import post_soft_delete
+from shopping_list.autocomplete import autocomplete_cache, item_index
+from shopping_list.search import item_search_vector, item_tags_display, \
+    shopping_list_search_vector
+from shopping_list.signals import list_items_changed
+from utils.lru_cache import LRUCache
 from utils.send_mail import send_mail
 
 logger = logging.getLogger('shoppero')
 
+# Process local cache of category IDs by name used when tagging items
+tag_cache = LRUCache(settings.TAG_CACHE_SIZE)
+# Process local cache of the last paid price of items by item ID
+price_cache = LRUCache(settings.PRICE_CACHE_SIZE, settings.PRICE_CACHE_TTL)
+
 
 class Item(SoftDeleteModel):
     """Items that are added to shopping lists"""
@@ -26,13 +48,97 @@ class Item(SoftDeleteModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
     tags = models.ManyToManyField('shopping_list.Category', blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    normalized_name = models.CharField(
+        _('normalized item name'),
+        max_length=200,
+        editable=False,
+        default='',
+        help_text=_('Case folded name with collapsed whitespace, used for '
+                    'finding items with the same name')
+    )
+    tags_display = models.CharField(
+        _('item tag names'),
+        max_length=1000,
+        editable=False,
+        blank=True,
+        default='',
+        help_text=_('Comma separated tag names, used by views that only '
+                    'display the tags')
+    )
+    version = models.PositiveIntegerField(
+        _('item version'),
+        default=1,
+        editable=False,
+        help_text=_('Increased whenever the displayed item changes, used as '
+                    'the cache key of its rendered fragments')
+    )
 
     class Meta:
         db_table = 'item'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='item_search_vector_idx'),
+            models.Index(fields=['user', 'id'], name='item_user_id_idx',
+                         condition=Q(deleted__isnull=True)),
+            models.Index(fields=['user', 'name', 'id'],
+                         name='item_user_name_id_idx',
+                         condition=Q(deleted__isnull=True)),
+            models.Index(fields=['user', 'code', 'id'],
+                         name='item_user_code_id_idx',
+                         condition=Q(deleted__isnull=True)),
+            models.Index(fields=['user', 'normalized_name'],
+                         name='item_user_normalized_name_idx',
+                         condition=Q(deleted__isnull=True)),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.normalized_name = self.normalize_name(self.name)
+        # The version is only ever increased in the database, never written
+        # back from a possibly stale instance
+        if not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = [
+                x.name for x in self._meta.concrete_fields
+                if not x.primary_key and x.name != 'version'
+            ]
+        super(Item, self).save(*args, **kwargs)
+
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        """
+        Get the form of an item name used for matching items with the same
+        name
+        :param name: item name
+        :return: case folded name with collapsed whitespace
+        """
+        return ' '.join(name.split()).casefold()
+
+    @classmethod
+    def update_search_vectors(cls, item_ids: Iterable[int]) -> None:
+        """
+        Recompute the search vector of the given items in a single query
+        :param item_ids: IDs of the items to update
+        :return: None
+        """
+        cls.all_objects.filter(pk__in=list(item_ids)).update(
+            search_vector=item_search_vector(cls)
+        )
+
+    @classmethod
+    def update_tags_display(cls, item_ids: Iterable[int]) -> None:
+        """
+        Recompute the tag names shown for the given items and increase
+        their versions in a single query
+        :param item_ids: IDs of the items to update
+        :return: None
+        """
+        cls.all_objects.filter(pk__in=list(item_ids)).update(
+            tags_display=Coalesce(item_tags_display(cls), Value('')),
+            version=F('version') + 1
+        )
+
     def clean_fields(self, exclude=None):
         super(Item, self).clean_fields(exclude)
         if self.price and self.price < 0:
@@ -50,13 +156,103 @@ class ShoppingList(SoftDeleteModel):
     created = models.DateTimeField(_('creation date'), auto_now_add=True)
     items = models.ManyToManyField('shopping_list.Item',
                                    through='ShoppingListItem')
+    search_vector = SearchVectorField(null=True, editable=False)
+    version = models.PositiveIntegerField(
+        _('version'),
+        default=1,
+        editable=False,
+        help_text=_('Increased on every change of the list, its items or '
+                    'its shares')
+    )
+
+    soft_delete_children = ('shoppinglistitem', 'sharedshoppinglist')
 
     class Meta:
         db_table = 'shopping_list'
+        indexes = [
+            GinIndex(fields=['search_vector'],
+                     name='shopping_list_search_idx'),
+            models.Index(fields=['user', 'created'],
+                         name='shopping_list_user_created_idx'),
+            models.Index(fields=['user', 'id'],
+                         name='shopping_list_user_alive_idx',
+                         condition=Q(deleted__isnull=True)),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The version is only ever increased in the database, never written
+        # back from a possibly stale instance
+        if not self._state.adding and not kwargs.get('update_fields'):
+            kwargs['update_fields'] = [
+                x.name for x in self._meta.concrete_fields
+                if not x.primary_key and x.name != 'version'
+            ]
+        super(ShoppingList, self).save(*args, **kwargs)
+
+    @classmethod
+    def bump_versions(cls, list_ids: Iterable[int]) -> None:
+        """
+        Increase the version of the given shopping lists in a single query
+        :param list_ids: IDs of the changed shopping lists
+        :return: None
+        """
+        cls.all_objects.filter(pk__in=list(list_ids)).update(
+            version=F('version') + 1
+        )
+
+    @classmethod
+    def bump_item_versions(cls, item_ids: Iterable[int]) -> None:
+        """
+        Increase the version of the shopping lists showing the given items
+        in a single query
+        :param item_ids: IDs of the changed items
+        :return: None
+        """
+        cls.all_objects.filter(pk__in=ShoppingListItem.objects.filter(
+            item_id__in=list(item_ids)
+        ).values('shopping_list_id')).update(version=F('version') + 1)
+
+    @classmethod
+    def bump_version_if_match(cls, pk: int, versions: Iterable[int]) -> bool:
+        """
+        Increase the version of a shopping list only if it is one of the
+        given versions. The compare and set is a single UPDATE, whose row
+        lock makes a concurrent write with the same version wait and fail.
+        :param pk: shopping list's ID
+        :param versions: versions the client based the write on
+        :return: True if the version matched
+        """
+        return cls.all_objects.filter(
+            pk=pk, version__in=list(versions)
+        ).update(version=F('version') + 1) > 0
+
+    def get_access_level(self, user) -> Optional[str]:
+        """
+        Get the access level the user has to the shopping list
+        :param user: user accessing the list
+        :return: one of the share levels, or None if the list isn't shared
+                 with the user
+        """
+        if self.user_id == user.id:
+            return Profile.FULL_ACCESS
+        share = self.sharedshoppinglist_set.filter(user=user).first()
+        return share.access_level if share else None
+
+    @classmethod
+    def update_search_vectors(cls, list_ids: Iterable[int]) -> None:
+        """
+        Recompute the search vector of the given shopping lists in a single
+        query
+        :param list_ids: IDs of the shopping lists to update
+        :return: None
+        """
+        cls.all_objects.filter(pk__in=list(list_ids)).update(
+            search_vector=shopping_list_search_vector()
+        )
+
 
 class ShoppingListItem(SoftDeleteModel):
     """Object for connecting items and shopping lists"""
@@ -77,6 +273,11 @@ class ShoppingListItem(SoftDeleteModel):
 
     class Meta:
         db_table = 'shopping_list_item'
+        indexes = [
+            models.Index(fields=['shopping_list', 'id'],
+                         name='list_item_list_alive_idx',
+                         condition=Q(deleted__isnull=True)),
+        ]
 
     def __str__(self):
         return f'{self.shopping_list.name} : {self.item.name}'
@@ -87,6 +288,777 @@ class ShoppingListItem(SoftDeleteModel):
         super(ShoppingListItem, self).save(*args, **kwargs)
 
 
+class ShoppingListSummary(models.Model):
+    """
+    Precomputed totals of a shopping list shown in the shopping lists
+    overview. Updated by the difference whenever the items of the list
+    change, or recomputed with refresh.
+    """
+    shopping_list = models.OneToOneField(ShoppingList, primary_key=True,
+                                         on_delete=models.CASCADE,
+                                         related_name='summary')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    item_count = models.PositiveIntegerField(default=0)
+    complete_item_count = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=15, decimal_places=4,
+                                      null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'shopping_list_summary'
+        indexes = [
+            models.Index(fields=['user', 'shopping_list'],
+                         name='shopping_list_summary_user_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.shopping_list_id} : {self.item_count}'
+
+    @classmethod
+    def refresh(cls, list_ids: Iterable[int]) -> None:
+        """
+        Recompute the summaries of the given shopping lists with a single
+        upsert
+        :param list_ids: IDs of the changed shopping lists
+        :return: None
+        """
+        list_ids = list(set(list_ids))
+        if not list_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {cls._meta.db_table} (shopping_list_id, user_id,
+                    item_count, complete_item_count, total_price, updated_at)
+                SELECT l.id, l.user_id, COUNT(li.item_id),
+                    COUNT(li.item_id) FILTER (WHERE li.is_done),
+                    COALESCE(SUM(i.price * li.quantity), 0), %s
+                FROM {ShoppingList._meta.db_table} l
+                LEFT JOIN {ShoppingListItem._meta.db_table} li
+                    ON li.shopping_list_id = l.id
+                LEFT JOIN {Item._meta.db_table} i ON i.id = li.item_id
+                WHERE l.id = ANY(%s)
+                GROUP BY l.id
+                ON CONFLICT (shopping_list_id) DO UPDATE SET
+                    item_count = EXCLUDED.item_count,
+                    complete_item_count = EXCLUDED.complete_item_count,
+                    total_price = EXCLUDED.total_price,
+                    updated_at = EXCLUDED.updated_at
+            """, [timezone.now(), list_ids])
+
+    @classmethod
+    def apply_price_change(cls, item_id: int, difference: Decimal) -> None:
+        """
+        Change the total price of the lists of an item whose price changed,
+        with a single query
+        :param item_id: item's ID
+        :param difference: new price minus the old one, missing prices
+        counted as 0
+        :return: None
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {cls._meta.db_table} s SET
+                    total_price = COALESCE(s.total_price, 0)
+                        + v.quantity * %s,
+                    updated_at = %s
+                FROM (
+                    SELECT shopping_list_id, SUM(quantity) AS quantity
+                    FROM {ShoppingListItem._meta.db_table}
+                    WHERE item_id = %s AND shopping_list_id IS NOT NULL
+                    GROUP BY shopping_list_id
+                ) AS v
+                WHERE s.shopping_list_id = v.shopping_list_id
+            """, [difference, timezone.now(), item_id])
+
+    @classmethod
+    def apply_deltas(cls, deltas: Dict[int, list]) -> None:
+        """
+        Add differences of the totals to the summaries of the given lists.
+        Summaries that gain items are upserted, the others only updated.
+        :param deltas: user ID and the differences of the item count,
+        complete item count and total price by shopping list ID
+        :return: None
+        """
+        rows = sorted((k,) + tuple(v) for k, v in deltas.items()
+                      if any(v[1:]))
+        if not rows:
+            return
+        table = cls._meta.db_table
+        now = timezone.now()
+        grown = [x + (now,) for x in rows if x[2] > 0 and x[3] >= 0]
+        changed = [(x[0],) + x[2:] for x in rows
+                   if not (x[2] > 0 and x[3] >= 0)]
+        with connection.cursor() as cursor:
+            if grown:
+                placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)']
+                                         * len(grown))
+                cursor.execute(f"""
+                    INSERT INTO {table} AS s (shopping_list_id, user_id,
+                        item_count, complete_item_count, total_price,
+                        updated_at)
+                    VALUES {placeholders}
+                    ON CONFLICT (shopping_list_id) DO UPDATE SET
+                        item_count = s.item_count + EXCLUDED.item_count,
+                        complete_item_count = s.complete_item_count
+                            + EXCLUDED.complete_item_count,
+                        total_price = COALESCE(s.total_price, 0)
+                            + EXCLUDED.total_price,
+                        updated_at = EXCLUDED.updated_at
+                """, [x for row in grown for x in row])
+            if changed:
+                placeholders = ', '.join(
+                    ['(%s::integer, %s::integer, %s::integer, %s::numeric)']
+                    * len(changed)
+                )
+                cursor.execute(f"""
+                    UPDATE {table} s SET
+                        item_count = GREATEST(s.item_count + v.item_count, 0),
+                        complete_item_count = GREATEST(
+                            s.complete_item_count + v.complete_item_count, 0
+                        ),
+                        total_price = COALESCE(s.total_price, 0)
+                            + v.total_price,
+                        updated_at = %s
+                    FROM (VALUES {placeholders}) AS v (shopping_list_id,
+                        item_count, complete_item_count, total_price)
+                    WHERE s.shopping_list_id = v.shopping_list_id
+                """, [now] + [x for row in changed for x in row])
+
+
+class ArchivedShoppingList(models.Model):
+    """
+    Cold storage copy of an archived shopping list. Archived lists are moved
+    out of the shopping list tables, so the queries of the active lists
+    don't scan them. Keeps the ID of the original list.
+    """
+    id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='archived_shopping_lists')
+    name = models.CharField(_('shopping list name'), max_length=100,
+                            blank=True, null=True)
+    created = models.DateTimeField(_('creation date'))
+    archived = models.DateTimeField(_('date of archiving'))
+    item_count = models.PositiveIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=15, decimal_places=4,
+                                      null=True)
+
+    class Meta:
+        db_table = 'archived_shopping_list'
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='archived_list_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name}'
+
+    @classmethod
+    @transaction.atomic
+    def archive_lists(cls, list_ids: Iterable[int]) -> int:
+        """
+        Move soft deleted shopping lists and their items to the archive
+        tables and delete them from the shopping list tables. Items that
+        were live when the list was soft deleted are copied, with their name
+        and code, so the archive doesn't depend on the items.
+        :param list_ids: IDs of soft deleted shopping lists
+        :return: number of archived lists
+        """
+        lists = list(ShoppingList.all_objects.filter(
+            pk__in=list(list_ids), deleted__isnull=False
+        ))
+        if not lists:
+            return 0
+        links = {}
+        for link in ShoppingListItem.all_objects.filter(
+            Q(deleted__isnull=True) | Q(deleted=F('shopping_list__deleted')),
+            shopping_list__in=lists
+        ).select_related('item'):
+            links.setdefault(link.shopping_list_id, []).append(link)
+
+        archived = []
+        archived_items = []
+        for instance in lists:
+            list_links = links.get(instance.pk, [])
+            prices = [x.price * x.quantity for x in list_links
+                      if x.price is not None]
+            archived.append(cls(
+                id=instance.pk,
+                user_id=instance.user_id,
+                name=instance.name,
+                created=instance.created,
+                archived=instance.deleted,
+                item_count=len(list_links),
+                total_price=sum(prices) if prices else None,
+            ))
+            archived_items += [ArchivedShoppingListItem(
+                id=x.pk,
+                shopping_list_id=instance.pk,
+                item_id=x.item_id,
+                name=x.item.name,
+                code=x.item.code,
+                is_done=x.is_done,
+                quantity=x.quantity,
+                price=x.price,
+            ) for x in list_links]
+        cls.objects.bulk_create(archived)
+        ArchivedShoppingListItem.objects.bulk_create(archived_items)
+        ShoppingList.all_objects.filter(pk__in=[x.pk for x in lists]).delete()
+        return len(lists)
+
+
+class ArchivedShoppingListItem(models.Model):
+    """Item of an archived shopping list, keeps the ID of the original link"""
+    id = models.IntegerField(primary_key=True)
+    shopping_list = models.ForeignKey(ArchivedShoppingList,
+                                      on_delete=models.CASCADE,
+                                      related_name='items')
+    item = models.ForeignKey(Item, null=True, on_delete=models.SET_NULL,
+                             related_name='+')
+    name = models.CharField(_('item name'), max_length=200)
+    code = models.CharField(_('item code'), max_length=20, blank=True)
+    is_done = models.BooleanField(default=False)
+    quantity = models.DecimalField(max_digits=4, decimal_places=2, default=1)
+    price = models.DecimalField(max_digits=9, decimal_places=2, null=True,
+                                blank=True)
+
+    class Meta:
+        db_table = 'archived_shopping_list_item'
+
+    def __str__(self):
+        return f'{self.shopping_list_id} : {self.name}'
+
+
+class SpendingRollup(models.Model):
+    """
+    Base of the precomputed spending statistics of a user, aggregated from
+    the price and quantity of the items on the shopping lists created in a
+    period. Archived lists are counted from the archive tables, deleted
+    lists and items aren't.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE, related_name='+')
+    period = models.DateField(_('first day of the period'))
+    item_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=15, decimal_places=4,
+                                      default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Function truncating the list creation time to the period
+    truncate = TruncDay
+    # Additional fields the rows are grouped by, mapped to their source
+    group_by = {}
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def rebuild(cls, user_ids: Iterable[int], start: Optional[date] = None,
+                end: Optional[date] = None) -> None:
+        """
+        Replace the rows of the given users in the given range of periods
+        with freshly aggregated ones. Only used for backfilling, changes
+        are applied with apply_deltas.
+        :param user_ids: IDs of the users
+        :param start: first period to rebuild, defaults to the first one
+        :param end: period after the last one to rebuild, defaults to none
+        :return: None
+        """
+        user_ids = list(user_ids)
+        rows = cls.objects.filter(user_id__in=user_ids)
+        if start:
+            rows = rows.filter(period__gte=start)
+        if end:
+            rows = rows.filter(period__lt=end)
+
+        # Active and archived lists are aggregated separately and added up
+        totals = {}
+        spent_links = ShoppingListItem.all_objects.filter(
+            Q(deleted__isnull=True) | Q(deleted=F('shopping_list__deleted'))
+        )
+        for links in (spent_links, ArchivedShoppingListItem.objects.all()):
+            links = links.filter(shopping_list__user_id__in=user_ids)
+            if start:
+                links = links.filter(shopping_list__created__date__gte=start)
+            if end:
+                links = links.filter(shopping_list__created__date__lt=end)
+            for x in links.values(
+                user_id=F('shopping_list__user_id'),
+                period=cls.truncate('shopping_list__created',
+                                    output_field=models.DateField()),
+                **{k: F(v) for k, v in cls.group_by.items()}
+            ).annotate(
+                rollup_item_count=Count('id'),
+                rollup_total_spent=Coalesce(Sum(
+                    F('price') * F('quantity'),
+                    output_field=models.DecimalField(max_digits=15,
+                                                     decimal_places=4)
+                ), 0),
+            ).order_by():
+                count = x.pop('rollup_item_count')
+                spent = x.pop('rollup_total_spent')
+                key = tuple(sorted(x.items()))
+                total = totals.setdefault(key, [0, 0])
+                total[0] += count
+                total[1] += spent
+        rows.delete()
+        cls.objects.bulk_create([
+            cls(item_count=count, total_spent=spent, **dict(key))
+            for key, (count, spent) in totals.items()
+        ])
+
+    @classmethod
+    def get_keys(cls, link: dict) -> List[tuple]:
+        """
+        Get the keys of the rows a shopping list item is counted in
+        :param link: shopping list item as read by ShoppingListItemChanges
+        :return: list of (user ID, period, *group_by values) tuples
+        """
+        return [(link['user_id'],
+                 cls.get_period(timezone.localdate(link['created'])))]
+
+    @classmethod
+    def get_period(cls, day: date) -> date:
+        """Get the first day of the period containing the day"""
+        return day
+
+    @classmethod
+    def apply_deltas(cls, deltas: Dict[tuple, list]) -> None:
+        """
+        Add differences of the item count and spending to the rows with the
+        given keys. Rows that gain items are upserted, so concurrent writers
+        of the same period can't insert the same row twice. The others are
+        only updated and removed once they don't count any items.
+        :param deltas: pairs of item count and spending difference by the
+        keys returned by get_keys
+        :return: None
+        """
+        rows = sorted(
+            ((k, v) for k, v in deltas.items() if any(v)),
+            key=lambda x: tuple(0 if y is None else y for y in x[0])
+        )
+        if not rows:
+            return
+        table = cls._meta.db_table
+        key_fields = ('user_id', 'period') + tuple(cls.group_by)
+        columns = ', '.join(key_fields)
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            grown = {}
+            for key, (count, spent) in rows:
+                if count > 0:
+                    # Rows with a NULL key column have their own unique index
+                    nulls = tuple(x is None for x in key[2:])
+                    grown.setdefault(nulls, []).append(
+                        key + (count, spent, now)
+                    )
+            for nulls, values in grown.items():
+                target = [x for x, null in zip(key_fields[2:], nulls)
+                          if not null]
+                condition = ' AND '.join(
+                    f'{x} IS {"" if null else "NOT "}NULL'
+                    for x, null in zip(key_fields[2:], nulls)
+                )
+                placeholders = ', '.join(
+                    ['(' + ', '.join(['%s'] * len(values[0])) + ')']
+                    * len(values)
+                )
+                cursor.execute(f"""
+                    INSERT INTO {table} AS t ({columns}, item_count,
+                        total_spent, updated_at)
+                    VALUES {placeholders}
+                    ON CONFLICT ({', '.join(key_fields[:2] + tuple(target))})
+                        {f'WHERE {condition}' if condition else ''}
+                    DO UPDATE SET
+                        item_count = t.item_count + EXCLUDED.item_count,
+                        total_spent = t.total_spent + EXCLUDED.total_spent,
+                        updated_at = EXCLUDED.updated_at
+                """, [x for value in values for x in value])
+
+            shrunk = [key + (count, spent) for key, (count, spent) in rows
+                      if count <= 0]
+            if not shrunk:
+                return
+            types = ('integer', 'date') + ('integer',) * len(cls.group_by)
+            placeholders = ', '.join(
+                ['(' + ', '.join(f'%s::{x}' for x in types)
+                 + ', %s::integer, %s::numeric)'] * len(shrunk)
+            )
+            matches = ' AND '.join(f't.{x} IS NOT DISTINCT FROM v.{x}'
+                                   for x in key_fields[2:])
+            cursor.execute(f"""
+                UPDATE {table} t SET
+                    item_count = GREATEST(t.item_count + v.item_count, 0),
+                    total_spent = t.total_spent + v.total_spent,
+                    updated_at = %s
+                FROM (VALUES {placeholders})
+                    AS v ({columns}, item_count, total_spent)
+                WHERE t.user_id = v.user_id AND t.period = v.period
+                    {f'AND {matches}' if matches else ''}
+            """, [now] + [x for value in shrunk for x in value])
+            if any(x[-2] < 0 for x in shrunk):
+                cursor.execute(f"""
+                    DELETE FROM {table}
+                    WHERE item_count = 0 AND user_id = ANY(%s)
+                        AND period = ANY(%s)
+                """, [list({x[0] for x in shrunk}),
+                      list({x[1] for x in shrunk})])
+
+
+class DailySpending(SpendingRollup):
+    """Spending of a user per day, for the spending over time chart"""
+
+    class Meta:
+        db_table = 'spending_daily'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period'],
+                                    name='spending_daily_user_period_uniq'),
+        ]
+
+
+class MonthlySpending(SpendingRollup):
+    """Spending of a user per month, for the items per month chart"""
+    truncate = TruncMonth
+
+    @classmethod
+    def get_period(cls, day: date) -> date:
+        return day.replace(day=1)
+
+    class Meta:
+        db_table = 'spending_monthly'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period'],
+                                    name='spending_monthly_user_period_uniq'),
+        ]
+
+
+class CategorySpending(SpendingRollup):
+    """
+    Spending of a user per month and item category, for the top categories
+    chart. Untagged items are counted without a category.
+    """
+    category = models.ForeignKey('shopping_list.Category', null=True,
+                                 on_delete=models.CASCADE, related_name='+')
+    truncate = TruncMonth
+    group_by = {'category_id': 'item__tags'}
+
+    class Meta:
+        db_table = 'spending_category_monthly'
+        indexes = [
+            models.Index(fields=['user', 'period'],
+                         name='spending_category_user_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'period', 'category'],
+                name='spending_category_user_period_uniq',
+                condition=Q(category__isnull=False)
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'period'],
+                name='spending_category_user_period_null_uniq',
+                condition=Q(category__isnull=True)
+            ),
+        ]
+
+    @classmethod
+    def get_keys(cls, link: dict) -> List[tuple]:
+        # Untagged items have a single NULL category
+        period = cls.get_period(timezone.localdate(link['created']))
+        return [(link['user_id'], period, x) for x in link['categories']]
+
+    @classmethod
+    def get_period(cls, day: date) -> date:
+        return day.replace(day=1)
+
+
+class ShoppingListItemChanges:
+    """
+    Difference in the shopping list summaries and spending rollups made by
+    a write to shopping list items. The affected items are read before and
+    after the write and only the difference is applied, so the cost depends
+    on the number of changed items instead of the size of the lists and of
+    the rolled up periods. The spending counts the items of active lists
+    and the items archived together with their list.
+    """
+    rollups = (DailySpending, MonthlySpending, CategorySpending)
+
+    def __init__(self, link_ids: Iterable[int] = (),
+                 list_ids: Iterable[int] = (), item_ids: Iterable[int] = ()):
+        """
+        Read the state of the shopping list items before the write
+        :param link_ids: IDs of the changed shopping list items
+        :param list_ids: IDs of the lists whose items all may change
+        :param item_ids: IDs of the items whose links all may change
+        """
+        self.link_ids = set(link_ids)
+        self.list_ids = set(list_ids)
+        self.item_ids = set(item_ids)
+        self.completed = {}
+        self.before = self._read()
+
+    def add_links(self, link_ids: Iterable[int]) -> None:
+        """Add shopping list items created by the write"""
+        self.link_ids.update(link_ids)
+
+    def add_completed(self, list_id: int, count: int) -> None:
+        """
+        Add a change of the number of completed items of a list made to
+        items that aren't read before and after the write
+        :param list_id: shopping list's ID
+        :param count: difference of the completed item count
+        :return: None
+        """
+        self.completed[list_id] = self.completed.get(list_id, 0) + count
+
+    def apply(self) -> None:
+        """
+        Read the state of the shopping list items after the write and apply
+        the difference to the summaries and spending rollups
+        :return: None
+        """
+        after = self._read()
+        summaries = {}
+        for links, sign in ((self.before, -1), (after, 1)):
+            for link in links.values():
+                delta = summaries.setdefault(link['shopping_list_id'],
+                                             [link['user_id'], 0, 0, 0])
+                delta[1] += sign
+                delta[2] += sign * link['is_done']
+                if link['item_price'] is not None:
+                    delta[3] += sign * link['item_price'] * link['quantity']
+        for list_id, count in self.completed.items():
+            summaries.setdefault(list_id, [None, 0, 0, 0])[2] += count
+        self.completed = {}
+        ShoppingListSummary.apply_deltas(summaries)
+
+        for rollup in self.rollups:
+            deltas = {}
+            for links, sign in ((self.before, -1), (after, 1)):
+                for link in links.values():
+                    if not self._is_spent(link):
+                        continue
+                    spent = 0
+                    if link['price'] is not None:
+                        spent = link['price'] * link['quantity']
+                    for key in rollup.get_keys(link):
+                        delta = deltas.setdefault(key, [0, 0])
+                        delta[0] += sign
+                        delta[1] += sign * spent
+            rollup.apply_deltas(deltas)
+        self.before = after
+
+    @classmethod
+    def _is_spent(cls, link: dict) -> bool:
+        return link['deleted'] is None or \
+            link['deleted'] == link['list_deleted']
+
+    def _read(self) -> Dict[int, dict]:
+        if not (self.link_ids or self.list_ids or self.item_ids):
+            return {}
+        links = ShoppingListItem.all_objects.filter(
+            Q(pk__in=self.link_ids) |
+            Q(shopping_list_id__in=self.list_ids) |
+            Q(item_id__in=self.item_ids),
+            shopping_list__isnull=False,
+        ).values(
+            'id', 'shopping_list_id', 'is_done', 'quantity', 'price',
+            'deleted',
+            user_id=F('shopping_list__user_id'),
+            created=F('shopping_list__created'),
+            list_deleted=F('shopping_list__deleted'),
+            item_price=F('item__price'),
+        ).annotate(
+            categories=ArrayAgg('item__tags'),
+        ).order_by()
+        return {x['id']: x for x in links}
+
+
+class ItemPriceHistory(models.Model):
+    """
+    Append only history of item prices, recording the price set on the item
+    and the price paid on shopping lists. A row is only added when the price
+    differs from the last one recorded for the item and source, so repeated
+    saves with the same price don't grow the table.
+    """
+    ITEM = 'item'
+    LIST = 'list'
+    SOURCE_CHOICES = [
+        (ITEM, _('Item price')),
+        (LIST, _('Shopping list price')),
+    ]
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE,
+                             related_name='price_history')
+    price = models.DecimalField(max_digits=9, decimal_places=2)
+    source = models.CharField(max_length=4, choices=SOURCE_CHOICES)
+    shopping_list = models.ForeignKey(ShoppingList, null=True,
+                                      on_delete=models.SET_NULL,
+                                      related_name='+')
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'item_price_history'
+        indexes = [
+            models.Index(fields=['item', 'source', '-recorded_at'],
+                         name='item_price_history_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.item_id} : {self.price}'
+
+    @classmethod
+    def record(cls, entries: Iterable[Tuple[int, Optional[Decimal],
+                                            Optional[int]]],
+               source: str) -> None:
+        """
+        Add the prices that changed since the last recorded ones, with one
+        query for the last prices and one insert
+        :param entries: triples of item ID, price and shopping list ID
+        :param source: ITEM or LIST
+        :return: None
+        """
+        prices = {item_id: (price, list_id)
+                  for item_id, price, list_id in entries
+                  if item_id and price is not None}
+        if not prices:
+            return
+        last = dict(cls.objects.filter(
+            item_id__in=prices, source=source
+        ).order_by('item_id', '-recorded_at').distinct('item_id')
+            .values_list('item_id', 'price'))
+        changed = [cls(item_id=item_id, price=price, source=source,
+                       shopping_list_id=list_id)
+                   for item_id, (price, list_id) in prices.items()
+                   if last.get(item_id) != price]
+        cls.objects.bulk_create(changed)
+        if source == cls.LIST:
+            item_ids = [x.item_id for x in changed]
+            for item_id in item_ids:
+                price_cache.delete(item_id)
+            # Entries read inside the transaction may have been cached
+            # before it was committed
+            transaction.on_commit(
+                lambda: [price_cache.delete(x) for x in item_ids]
+            )
+
+    @classmethod
+    def between(cls, item_id: int, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> models.QuerySet:
+        """
+        Get the recorded prices of an item in a time range, oldest first
+        :param item_id: item's ID
+        :param start: first time included, defaults to the first record
+        :param end: time after the last one included, defaults to now
+        :return: a queryset
+        """
+        queryset = cls.objects.filter(item_id=item_id)
+        if start:
+            queryset = queryset.filter(recorded_at__gte=start)
+        if end:
+            queryset = queryset.filter(recorded_at__lt=end)
+        return queryset.order_by('recorded_at', 'id')
+
+    @classmethod
+    def last_paid_prices(cls, item_ids: Iterable[int]
+                         ) -> Dict[int, Tuple[Decimal, datetime]]:
+        """
+        Get the last price paid for each of the items on a shopping list.
+        Cached items are served from a process local cache and the rest are
+        fetched with a single query.
+        :param item_ids: IDs of the items
+        :return: dict of item ID to the last price and when it was recorded,
+            without the items that were never on a list with a price
+        """
+        item_ids = set(item_ids)
+        found = {x: price_cache.get(x) for x in item_ids}
+        missing = [x for x, value in found.items() if value is None]
+        if missing:
+            fetched = {x: () for x in missing}
+            fetched.update((x[0], x[1:]) for x in cls.objects.filter(
+                item_id__in=missing, source=cls.LIST
+            ).order_by('item_id', '-recorded_at').distinct('item_id')
+                .values_list('item_id', 'price', 'recorded_at'))
+            # Empty tuples cache items without a price history
+            transaction.on_commit(lambda: [
+                price_cache.set(item_id, value)
+                for item_id, value in fetched.items()
+            ])
+            found.update(fetched)
+        return {x: value for x, value in found.items() if value}
+
+
+class ItemUsage(models.Model):
+    """
+    Precomputed usage counter of an item, used for ranking autocomplete
+    suggestions. Every use adds a weight that doubles each half life since
+    the epoch, so comparing scores is the same as comparing usage counts
+    with an exponential recency decay, without ever rewriting old rows.
+    """
+    EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    HALF_LIFE = timedelta(days=30)
+
+    item = models.OneToOneField(Item, on_delete=models.CASCADE,
+                                primary_key=True, related_name='usage')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    use_count = models.PositiveIntegerField(default=0)
+    score = models.FloatField(default=0)
+    last_used = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'item_usage'
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='item_usage_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.item_id} : {self.use_count}'
+
+    @classmethod
+    def weight(cls, when: datetime) -> float:
+        """
+        Get the score added by a single use at the given time
+        :param when: time of the use
+        :return: weight of the use
+        """
+        return 2 ** ((when - cls.EPOCH) / cls.HALF_LIFE)
+
+    @classmethod
+    def record(cls, item_ids: Iterable[int],
+               when: Optional[datetime] = None) -> None:
+        """
+        Count a use of each of the given items with a single upsert and
+        update the ranking of the loaded autocomplete indexes
+        :param item_ids: IDs of the used items
+        :param when: time of the use, defaults to now
+        :return: None
+        """
+        item_ids = list(set(item_ids))
+        if not item_ids:
+            return
+        when = when or timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {cls._meta.db_table}
+                    (item_id, user_id, use_count, score, last_used)
+                SELECT id, user_id, 1, %s, %s
+                FROM {Item._meta.db_table} WHERE id = ANY(%s)
+                ON CONFLICT (item_id) DO UPDATE SET
+                    use_count = {cls._meta.db_table}.use_count + 1,
+                    score = {cls._meta.db_table}.score + EXCLUDED.score,
+                    last_used = EXCLUDED.last_used
+                RETURNING item_id, user_id, score
+            """, [cls.weight(when), when, item_ids])
+            rows = cursor.fetchall()
+        for item_id, user_id, score in rows:
+            item_index.update_score(user_id, item_id, score)
+        for user_id in {row[1] for row in rows}:
+            autocomplete_cache.invalidate_user(user_id)
+
+
 class SharedShoppingList(SoftDeleteModel):
     shopping_list = models.ForeignKey(ShoppingList,
                                       on_delete=models.CASCADE)
@@ -98,6 +1070,14 @@ class SharedShoppingList(SoftDeleteModel):
 
     class Meta:
         db_table = 'shared_shopping_list'
+        indexes = [
+            models.Index(fields=['user', 'shopping_list'],
+                         name='shared_list_user_alive_idx',
+                         condition=Q(deleted__isnull=True)),
+            models.Index(fields=['shopping_list', 'id'],
+                         name='shared_list_list_alive_idx',
+                         condition=Q(deleted__isnull=True)),
+        ]
 
     def __str__(self):
         return f'{self.get_email()} - {self.shopping_list.name}'
@@ -107,11 +1087,55 @@ class SharedShoppingList(SoftDeleteModel):
 
 
 class Category(SoftDeleteModel):
-    name = models.CharField(_('item category'), max_length=30)
+    name = models.CharField(_('item category'), max_length=30, unique=True)
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def normalize_names(cls, names: Iterable[str]) -> List[str]:
+        """
+        Strip and collapse the whitespace of tag names, dropping empty and
+        repeated names and cutting them to the maximum length
+        :param names: tag names as entered by the user
+        :return: list of unique normalized names, in the original order
+        """
+        max_length = cls._meta.get_field('name').max_length
+        normalized = (' '.join(x.split())[:max_length].strip() for x in names)
+        return list(OrderedDict.fromkeys(x for x in normalized if x))
+
+    @classmethod
+    def resolve_ids(cls, names: Iterable[str]) -> List[int]:
+        """
+        Get the IDs of the categories with the given names, creating the
+        missing ones. Known names are served from a process local cache, the
+        rest are fetched with one query and the missing ones inserted with
+        one more, letting the unique index resolve concurrent inserts, and
+        fetched again.
+        :param names: tag names as entered by the user
+        :return: list of category IDs
+        """
+        names = cls.normalize_names(names)
+        ids = {x: tag_cache.get(x) for x in names}
+        missing = [x for x in names if ids[x] is None]
+        if missing:
+            found = dict(cls.all_objects.filter(name__in=missing)
+                         .values_list('name', 'id'))
+            to_create = [x for x in missing if x not in found]
+            if to_create:
+                cls.objects.bulk_create([cls(name=x) for x in to_create],
+                                        ignore_conflicts=True)
+                found.update(cls.all_objects.filter(name__in=to_create)
+                             .values_list('name', 'id'))
+            # Only cache IDs once they are committed, a rolled back
+            # transaction would leave IDs of categories that don't exist
+            transaction.on_commit(lambda: [
+                tag_cache.set(name, category_id)
+                for name, category_id in found.items()
+            ])
+            ids.update(found)
+        return [ids[x] for x in names]
+
 
 @receiver(post_save, sender=SharedShoppingList)
 def share_shopping_list_signal(sender, instance, created, **kwargs):
@@ -132,3 +1156,235 @@ def share_shopping_list_signal(sender, instance, created, **kwargs):
             'list_url': url
         })
         send_mail(subject, message, [email])
+
+
+@receiver(post_save, sender=Item)
+def update_item_autocomplete_signal(sender, instance, **kwargs):
+    """Keep the item owner's autocomplete index and cache up to date"""
+    if instance.deleted:
+        item_index.remove(instance)
+    else:
+        item_index.update(instance)
+    autocomplete_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_soft_delete, sender=Item)
+def remove_item_autocomplete_signal(sender, instance, **kwargs):
+    """Remove a deleted item from the autocomplete index and cache"""
+    item_index.remove(instance)
+    autocomplete_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_soft_delete, sender=settings.AUTH_USER_MODEL)
+def remove_user_autocomplete_signal(sender, instance, **kwargs):
+    """Drop the autocomplete data of a user whose items were soft deleted
+    together with their account"""
+    item_index.invalidate_user(instance.pk)
+    autocomplete_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Item)
+def update_item_search_vector_signal(sender, instance, **kwargs):
+    """Keep the item search vector in sync with its name and code"""
+    Item.update_search_vectors([instance.pk])
+
+
+@receiver(m2m_changed, sender=Item.tags.through)
+def update_item_tags_search_vector_signal(sender, instance, action, reverse,
+                                          pk_set, **kwargs):
+    """Keep the item search vector in sync with its tags"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Item.update_search_vectors([instance.pk])
+    elif pk_set:
+        Item.update_search_vectors(pk_set)
+
+
+@receiver(m2m_changed, sender=Item.tags.through)
+def update_item_tags_spending_signal(sender, instance, action, reverse,
+                                     pk_set, **kwargs):
+    """Move the spending of items between categories when their tags
+    change"""
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        if not reverse:
+            item_ids = [instance.pk]
+        elif pk_set is not None:
+            item_ids = pk_set
+        else:
+            item_ids = Item.tags.through.objects.filter(
+                category_id=instance.pk
+            ).values_list('item_id', flat=True)
+        instance._tag_changes = ShoppingListItemChanges(item_ids=item_ids)
+    elif hasattr(instance, '_tag_changes'):
+        instance._tag_changes.apply()
+        del instance._tag_changes
+
+
+@receiver(m2m_changed, sender=Item.tags.through)
+def update_item_tags_display_signal(sender, instance, action, reverse,
+                                    pk_set, **kwargs):
+    """Keep the displayed item tag names in sync with its tags"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Item.update_tags_display([instance.pk])
+    elif pk_set:
+        Item.update_tags_display(pk_set)
+
+
+@receiver(post_save, sender=ShoppingList)
+def update_shopping_list_search_vector_signal(sender, instance, **kwargs):
+    """Keep the shopping list search vector in sync with its name"""
+    ShoppingList.update_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=ShoppingList)
+def bump_shopping_list_version_signal(sender, instance, created, **kwargs):
+    """Increase the version of a changed shopping list"""
+    if not created:
+        ShoppingList.bump_versions([instance.pk])
+
+
+@receiver(post_save, sender=SharedShoppingList)
+@receiver(post_delete, sender=SharedShoppingList)
+def bump_shopping_list_version_share_signal(sender, instance, **kwargs):
+    """Increase the version of the shopping list of a changed share"""
+    ShoppingList.bump_versions([instance.shopping_list_id])
+
+
+@receiver(pre_save, sender=ShoppingListItem)
+def read_shopping_list_item_signal(sender, instance, **kwargs):
+    """Remember the state of an item link before it is saved"""
+    link_ids = [instance.pk] if instance.pk else []
+    instance._item_changes = ShoppingListItemChanges(link_ids)
+
+
+@receiver(post_save, sender=ShoppingListItem)
+def shopping_list_item_changed_signal(sender, instance, **kwargs):
+    """
+    Update the version, summary and spending statistics of the list of a
+    changed item link
+    """
+    if instance.shopping_list_id:
+        ShoppingList.bump_versions([instance.shopping_list_id])
+        changes = instance._item_changes
+        changes.add_links([instance.pk])
+        changes.apply()
+
+
+@receiver(post_save, sender=ShoppingListItem)
+def record_shopping_list_item_price_signal(sender, instance, **kwargs):
+    """Record the price paid for an item on a shopping list"""
+    ItemPriceHistory.record(
+        [(instance.item_id, instance.price, instance.shopping_list_id)],
+        ItemPriceHistory.LIST
+    )
+
+
+@receiver(post_save, sender=Item)
+def bump_item_version_signal(sender, instance, created, **kwargs):
+    """Increase the version of a changed item"""
+    if not created:
+        Item.all_objects.filter(pk=instance.pk).update(
+            version=F('version') + 1
+        )
+
+
+@receiver(post_save, sender=Item)
+def record_item_price_signal(sender, instance, **kwargs):
+    """Record a changed item price"""
+    ItemPriceHistory.record([(instance.pk, instance.price, None)],
+                            ItemPriceHistory.ITEM)
+
+
+@receiver(list_items_changed, sender=ShoppingList)
+def shopping_list_items_changed_signal(sender, list_ids, changes=None,
+                                       **kwargs):
+    """
+    Update the version, summary and spending statistics of lists changed
+    with bulk queries
+    """
+    ShoppingList.bump_versions(list_ids)
+    if changes is not None:
+        changes.apply()
+    else:
+        ShoppingListSummary.refresh(list_ids)
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def read_shopping_list_spending_signal(sender, instance, **kwargs):
+    """
+    Remember the items of a shopping list before it is deleted. Soft
+    deleted lists are only deleted when they are moved to the archive,
+    which keeps their spending.
+    """
+    if instance.deleted is None:
+        instance._item_changes = ShoppingListItemChanges(
+            list_ids=[instance.pk]
+        )
+
+
+@receiver(post_delete, sender=ShoppingList)
+def remove_shopping_list_spending_signal(sender, instance, **kwargs):
+    """Remove a deleted shopping list from the spending statistics"""
+    changes = getattr(instance, '_item_changes', None)
+    if changes is not None:
+        changes.apply()
+
+
+@receiver(pre_save, sender=Item)
+def read_item_price_signal(sender, instance, update_fields, **kwargs):
+    """Remember the price of an item before it is saved"""
+    instance._old_price = instance.price
+    if instance.pk and (update_fields is None or 'price' in update_fields):
+        instance._old_price = Item.all_objects.filter(pk=instance.pk) \
+            .values_list('price', flat=True).first()
+
+
+@receiver(post_save, sender=Item)
+def item_shopping_lists_changed_signal(sender, instance, created, **kwargs):
+    """Update the version and summary of the lists showing a changed item"""
+    if created:
+        return
+    ShoppingList.bump_item_versions([instance.pk])
+    if instance.price != instance._old_price:
+        ShoppingListSummary.apply_price_change(
+            instance.pk,
+            Decimal(str(instance.price or 0)) - (instance._old_price or 0)
+        )
+
+
+@receiver(pre_delete, sender=Category)
+def collect_category_items_signal(sender, instance, **kwargs):
+    """Remember the items of a category before its tags are deleted"""
+    instance._tagged_item_ids = list(Item.tags.through.objects.filter(
+        category_id=instance.pk
+    ).values_list('item_id', flat=True))
+    instance._tag_changes = ShoppingListItemChanges(
+        item_ids=instance._tagged_item_ids
+    )
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_cache_signal(sender, instance, **kwargs):
+    """Forget the ID of a deleted category"""
+    tag_cache.delete(instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_tags_display_signal(sender, instance, **kwargs):
+    """Remove a deleted category from the displayed tag names"""
+    Item.update_tags_display(getattr(instance, '_tagged_item_ids', []))
+
+
+@receiver(post_delete, sender=Category)
+def move_category_spending_signal(sender, instance, **kwargs):
+    """
+    Count the items that lost their last tag as untagged. The rows of the
+    deleted category are removed by the cascade.
+    """
+    changes = getattr(instance, '_tag_changes', None)
+    if changes is not None:
+        changes.apply()
@@ -0,0 +1,175 @@
+import base64
+import json
+from collections import OrderedDict
+from typing import List, Mapping, Optional
+
+from django.db import models
+from django.db.models import Q, QuerySet
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+ITEM_ORDERING_FIELDS = ('id', 'name', 'code')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPaginator:
+    """
+    Keyset (seek) paginator. Pages are ordered by a whitelisted field and
+    the primary key, and the cursor holds the values of the last row of the
+    previous page, so every page is read from an index in the same time.
+    """
+    ordering_param = 'order_by'
+    cursor_param = 'cursor'
+
+    def __init__(self, ordering_fields: tuple, page_size: int,
+                 default_ordering: str = 'id'):
+        """
+        :param ordering_fields: fields that can be used for ordering, each
+        one backed by a (user, field, id) index
+        :param page_size: number of objects on a page
+        :param default_ordering: ordering used if none or an invalid one is
+        requested
+        """
+        self.ordering_fields = ordering_fields
+        self.page_size = page_size
+        self.default_ordering = default_ordering
+        self.ordering = default_ordering
+        self.next_cursor = None
+
+    def get_ordering(self, params: Mapping) -> str:
+        """
+        Get the requested ordering if it is whitelisted
+        :param params: request query parameters
+        :return: ordering, optionally prefixed with '-' for descending
+        """
+        ordering = params.get(self.ordering_param) or self.default_ordering
+        if ordering.lstrip('-') not in self.ordering_fields:
+            return self.default_ordering
+        return ordering
+
+    def paginate_queryset(self, queryset: QuerySet,
+                          params: Mapping) -> List:
+        """
+        Get a single page of the queryset
+        :param queryset: queryset to paginate
+        :param params: request query parameters
+        :return: list of objects on the requested page
+        """
+        self.ordering = self.get_ordering(params)
+        field = self.ordering.lstrip('-')
+        descending = self.ordering.startswith('-')
+        prefix = '-' if descending else ''
+        fields = (field,) if field == 'id' else (field, 'id')
+        queryset = queryset.order_by(*[prefix + x for x in fields])
+        cursor = self.decode_cursor(
+            params.get(self.cursor_param),
+            self._value_types(queryset.model._meta.get_field(field))
+        )
+        if cursor is not None:
+            queryset = queryset.filter(
+                self._after_cursor(field, descending, cursor))
+        page = list(queryset[:self.page_size + 1])
+        self.next_cursor = None
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(
+                [getattr(last, field), last.pk])
+        return page
+
+    @classmethod
+    def _after_cursor(cls, field: str, descending: bool, cursor: list) -> Q:
+        value, pk = cursor
+        lookup = 'lt' if descending else 'gt'
+        if field == 'id':
+            return Q(**{f'id__{lookup}': pk})
+        # The inclusive condition on the first column bounds the index scan,
+        # the rest only breaks ties between rows with the same value
+        return Q(**{f'{field}__{lookup}e': value}) & (
+            Q(**{f'{field}__{lookup}': value}) | Q(**{f'id__{lookup}': pk})
+        )
+
+    @classmethod
+    def _value_types(cls, model_field) -> tuple:
+        """Get the JSON types a cursor value of the ordering field can have"""
+        if isinstance(model_field, (models.IntegerField, models.FloatField,
+                                    models.DecimalField)):
+            types = (int, float)
+        else:
+            types = (str,)
+        return types + (type(None),) if model_field.null else types
+
+    def encode_cursor(self, position: list) -> str:
+        """Encode the ordering and position of the last row on a page"""
+        data = json.dumps([self.ordering] + position)
+        return base64.urlsafe_b64encode(data.encode()).decode('ascii')
+
+    def decode_cursor(self, encoded: Optional[str],
+                      value_types: tuple) -> Optional[list]:
+        """
+        Decode a cursor created by encode_cursor
+        :param encoded: cursor query parameter
+        :param value_types: types the value of the ordering field can have
+        :return: position of the last row on the previous page
+        """
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            ordering, value, pk = data
+            pk = int(pk)
+        except (TypeError, ValueError, OverflowError):
+            raise InvalidCursor(_('Invalid cursor'))
+        if ordering != self.ordering:
+            raise InvalidCursor(_('Invalid cursor'))
+        if isinstance(value, bool) or not isinstance(value, value_types):
+            raise InvalidCursor(_('Invalid cursor'))
+        return [value, pk]
+
+
+class ItemKeysetPagination(BasePagination):
+    page_size = 50
+    ordering_fields = ITEM_ORDERING_FIELDS
+    default_ordering = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.paginator = KeysetPaginator(self.ordering_fields, self.page_size,
+                                         self.default_ordering)
+        try:
+            return self.paginator.paginate_queryset(queryset,
+                                                    request.query_params)
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+
+    def get_next_link(self):
+        if self.paginator.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, KeysetPaginator.ordering_param,
+                                  self.paginator.ordering)
+        return replace_query_param(url, KeysetPaginator.cursor_param,
+                                   self.paginator.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class ArchivedShoppingListPagination(ItemKeysetPagination):
+    ordering_fields = ('id',)
+    default_ordering = '-id'
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -1,24 +1,266 @@
-from django.db.models import F, Count, Sum, Q, FloatField, QuerySet
+from datetime import date
+from typing import List, Optional
 
-from shopping_list.models import ShoppingListItem
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Count, Sum, Q, QuerySet, Value, CharField, \
+    DecimalField
+from django.db.models import Func
+from django.db.models.functions import Upper, Coalesce
+
+from shopping_list.autocomplete import AUTOCOMPLETE_LIMIT, \
+    AUTOCOMPLETE_CANDIDATES
+from shopping_list.models import Item, ShoppingListItem, ShoppingList, \
+    ShoppingListSummary, SharedShoppingList, DailySpending, MonthlySpending, \
+    CategorySpending
 
 
 def get_shopping_list_items_queryset(user_id: int) -> QuerySet:
     """
     A query for getting shopping list details for the shopping lists overview
+    from the precomputed shopping list summaries
     :param user_id: user's ID
     :return: a queryset
     """
-    return ShoppingListItem.objects.values(
-        'shopping_list__name'
+    return ShoppingListSummary.objects.values(
+        'shopping_list__name', 'item_count', 'complete_item_count',
+        'total_price',
     ).filter(
-        shopping_list__user_id=user_id,
+        user_id=user_id,
         shopping_list__deleted__isnull=True,
+        item_count__gt=0,
     ).annotate(
         id=F('shopping_list_id'),
-        item_count=Count('item'),
-        complete_item_count=Count('item', filter=Q(is_done=True)),
-        total_price=Sum(
-            F('item__price') * F('quantity'), output_field=FloatField()
+        version=F('shopping_list__version'),
+    ).order_by('shopping_list_id')
+
+
+def get_shopping_list_totals_queryset() -> QuerySet:
+    """
+    A query computing the shopping list summaries from the shopping list
+    items, used for verifying and rebuilding the stored summaries
+    :return: a queryset
+    """
+    return ShoppingList.objects.values('id').annotate(
+        item_count=Count('shoppinglistitem__item'),
+        complete_item_count=Count(
+            'shoppinglistitem__item',
+            filter=Q(shoppinglistitem__is_done=True)
         ),
-    ).order_by('shopping_list__id')
+        total_price=Coalesce(Sum(
+            F('shoppinglistitem__item__price') *
+            F('shoppinglistitem__quantity'),
+            output_field=DecimalField(max_digits=15, decimal_places=4)
+        ), 0),
+    ).order_by('id')
+
+
+def get_shopping_list_detail_items_queryset(list_id: int) -> QuerySet:
+    """
+    A query for the items of a single shopping list with their item details
+    :param list_id: shopping list's ID
+    :return: a queryset of dicts
+    """
+    return ShoppingListItem.objects.filter(
+        shopping_list_id=list_id
+    ).values(
+        'item_id', 'price', 'quantity', 'is_done',
+        link_id=F('id'),
+        name=F('item__name'),
+        code=F('item__code'),
+    ).order_by('id')
+
+
+def get_shopping_list_shares_queryset(list_id: int) -> QuerySet:
+    """
+    A query for the live shares of a single shopping list
+    :param list_id: shopping list's ID
+    :return: a queryset of dicts
+    """
+    return SharedShoppingList.objects.filter(
+        shopping_list_id=list_id
+    ).values('id', 'email', 'access_level').order_by('id')
+
+
+def get_shopping_list_detail(list_id: int, user_id: int) -> Optional[dict]:
+    """
+    Load a shopping list of the user for the detail page as plain dicts,
+    with its live items and shares, in three queries regardless of the
+    number of items. The items and shares are fetched only when used, so
+    a cached rendering of the list skips their queries.
+    :param list_id: shopping list's ID
+    :param user_id: ID of the owner
+    :return: the list with its items and shares or None if not found
+    """
+    detail = ShoppingList.objects.filter(
+        pk=list_id,
+        user_id=user_id
+    ).values('id', 'name', 'version').first()
+    if detail is not None:
+        detail['items'] = get_shopping_list_detail_items_queryset(list_id)
+        detail['shares'] = get_shopping_list_shares_queryset(list_id)
+    return detail
+
+
+def get_accessible_shopping_lists_queryset(user_id: int) -> QuerySet:
+    """
+    A query for the shopping lists the user owns or that are shared with them
+    :param user_id: user's ID
+    :return: a queryset
+    """
+    return ShoppingList.objects.filter(
+        Q(user_id=user_id) |
+        Q(sharedshoppinglist__user_id=user_id,
+          sharedshoppinglist__deleted__isnull=True)
+    )
+
+
+def get_accessible_items_queryset(user_id: int) -> QuerySet:
+    """
+    A query for the items the user owns or that are on shopping lists shared
+    with them
+    :param user_id: user's ID
+    :return: a queryset
+    """
+    shared_lists = ShoppingList.objects.filter(
+        sharedshoppinglist__user_id=user_id,
+        sharedshoppinglist__deleted__isnull=True
+    )
+    return Item.objects.filter(
+        Q(user_id=user_id) | Q(shoppinglist__in=shared_lists)
+    )
+
+
+class CollateC(Func):
+    """
+    Text compared byte by byte with the C collation, which can be matched
+    by prefix and ordered from the same index
+    """
+    template = '%(expressions)s COLLATE "C"'
+
+
+def get_item_autocomplete_queryset(user_id: int, name: str,
+                                   limit: int = AUTOCOMPLETE_CANDIDATES
+                                   ) -> QuerySet:
+    """
+    A query for the item name autocomplete candidates. Matches the beginning
+    of the name case insensitively and returns the first `limit` matches in
+    name order. Both the filter and the order are read from the
+    item_user_upper_name_idx index, so the query stops after `limit` index
+    entries however many items match.
+    :param user_id: user's ID
+    :param name: beginning of the item name
+    :param limit: maximum number of returned items
+    :return: a queryset
+    """
+    return Item.objects.annotate(
+        upper_name=CollateC(Upper('name')),
+        score=Coalesce('usage__score', 0.0),
+    ).filter(
+        user_id=user_id,
+        upper_name__startswith=Upper(Value(name)),
+    ).order_by('upper_name')[:limit]
+
+
+def get_item_autocomplete_items(user_id: int, name: str,
+                                limit: int = AUTOCOMPLETE_LIMIT) -> List[Item]:
+    """
+    Get the item name autocomplete suggestions from the database, the most
+    used of the candidates first. Only the first candidates in name order
+    are ranked, so a much used item can be missing for a short prefix with
+    more matches than candidates.
+    :param user_id: user's ID
+    :param name: beginning of the item name
+    :param limit: maximum number of returned items
+    :return: list of items
+    """
+    items = get_item_autocomplete_queryset(user_id, name)
+    return sorted(items, key=lambda x: (-x.score, x.upper_name, x.id))[:limit]
+
+
+def get_item_autocomplete_index_queryset(user_id: int) -> QuerySet:
+    """
+    A query for loading all items of a user into the autocomplete index
+    :param user_id: user's ID
+    :return: a queryset
+    """
+    return Item.objects.filter(
+        user_id=user_id,
+    ).annotate(
+        score=Coalesce('usage__score', 0.0),
+    ).only('id', 'name', 'code', 'price', 'user_id')
+
+
+def get_search_queryset(user_id: int, query: SearchQuery) -> QuerySet:
+    """
+    A single query searching the user's items and shopping lists with the
+    GIN indexed search vectors, ordered by rank
+    :param user_id: user's ID
+    :param query: full text search query
+    :return: a queryset of dictionaries with id, name, type and rank keys
+    """
+    items = Item.objects.filter(
+        user_id=user_id,
+        search_vector=query,
+    ).annotate(
+        type=Value('item', output_field=CharField()),
+        rank=SearchRank(F('search_vector'), query),
+    ).values('id', 'name', 'type', 'rank')
+    shopping_lists = ShoppingList.objects.filter(
+        user_id=user_id,
+        search_vector=query,
+    ).annotate(
+        type=Value('list', output_field=CharField()),
+        rank=SearchRank(F('search_vector'), query),
+    ).values('id', 'name', 'type', 'rank')
+    return items.union(shopping_lists, all=True).order_by('-rank', 'type',
+                                                          'id')
+
+
+def get_daily_spending_queryset(user_id: int, start: date) -> QuerySet:
+    """
+    A query for the user's spending per day from the precomputed rollups
+    :param user_id: user's ID
+    :param start: first day included
+    :return: a queryset of dicts
+    """
+    return DailySpending.objects.filter(
+        user_id=user_id,
+        period__gte=start,
+    ).values('period', 'item_count', 'total_spent').order_by('period')
+
+
+def get_monthly_spending_queryset(user_id: int, start: date) -> QuerySet:
+    """
+    A query for the user's spending and item count per month from the
+    precomputed rollups
+    :param user_id: user's ID
+    :param start: first day of the first month included
+    :return: a queryset of dicts
+    """
+    return MonthlySpending.objects.filter(
+        user_id=user_id,
+        period__gte=start,
+    ).values('period', 'item_count', 'total_spent').order_by('period')
+
+
+def get_top_categories_queryset(user_id: int, start: date,
+                                limit: int = 5) -> QuerySet:
+    """
+    A query for the categories the user spent the most on from the
+    precomputed rollups, excluding untagged items
+    :param user_id: user's ID
+    :param start: first day of the first month included
+    :param limit: maximum number of categories
+    :return: a queryset of dicts
+    """
+    return CategorySpending.objects.filter(
+        user_id=user_id,
+        period__gte=start,
+        category__isnull=False,
+    ).values(
+        'category_id',
+        name=F('category__name'),
+    ).annotate(
+        item_count=Sum('item_count'),
+        total_spent=Sum('total_spent'),
+    ).order_by('-total_spent', 'name')[:limit]
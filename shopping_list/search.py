@@ -0,0 +1,64 @@
+import re
+from typing import Optional
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector, SearchQuery
+from django.db.models import OuterRef, Subquery, CharField
+
+SEARCH_CONFIG = 'simple'
+
+
+def item_search_vector(item_model) -> SearchVector:
+    """
+    Expression computing the search vector of an item from its name, code
+    and tag names. Usable in an UPDATE of the item table.
+    :param item_model: Item model class
+    :return: search vector expression
+    """
+    tags = item_model.tags.through.objects.filter(
+        item_id=OuterRef('pk')
+    ).values('item_id').annotate(
+        names=StringAgg('category__name', ' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('code', weight='B', config=SEARCH_CONFIG) +
+        SearchVector(Subquery(tags, output_field=CharField()), weight='C',
+                     config=SEARCH_CONFIG)
+    )
+
+
+def item_tags_display(item_model) -> Subquery:
+    """
+    Expression computing the comma separated, alphabetically ordered tag
+    names of an item. Usable in an UPDATE of the item table.
+    :param item_model: Item model class
+    :return: subquery expression, NULL for items without tags
+    """
+    tags = item_model.tags.through.objects.filter(
+        item_id=OuterRef('pk')
+    ).values('item_id').annotate(
+        names=StringAgg('category__name', ', ', ordering='category__name')
+    ).values('names')
+    return Subquery(tags, output_field=CharField())
+
+
+def shopping_list_search_vector() -> SearchVector:
+    """
+    Expression computing the search vector of a shopping list from its name
+    :return: search vector expression
+    """
+    return SearchVector('name', weight='A', config=SEARCH_CONFIG)
+
+
+def build_search_query(text: str) -> Optional[SearchQuery]:
+    """
+    Convert user input to a query matching all entered words as prefixes
+    :param text: search text entered by the user
+    :return: search query or None if the text contains no words
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    raw = ' & '.join(f'{word}:*' for word in words)
+    return SearchQuery(raw, config=SEARCH_CONFIG, search_type='raw')
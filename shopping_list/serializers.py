@@ -1,10 +1,19 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Q
 from django.urls import reverse
 from rest_framework import serializers
 
+from account.models import Profile
+from shopping_list.autocomplete import autocomplete_cache, item_index
 from shopping_list.models import Item, ShoppingListItem, SharedShoppingList, \
-    ShoppingList, Category
+    ShoppingList, ItemUsage, ItemPriceHistory, ArchivedShoppingList, \
+    ArchivedShoppingListItem, ShoppingListItemChanges
+from shopping_list.querysets import get_accessible_items_queryset, \
+    get_accessible_shopping_lists_queryset
+from shopping_list.signals import list_items_changed
+from shopping_list.utils import tags_string_to_list, add_tag_to_item, \
+    set_item_tags
 
 
 def item_to_dict(item: Item) -> dict:
@@ -13,7 +22,7 @@ def item_to_dict(item: Item) -> dict:
         'name': item.name,
         'code': item.code or '',
         'price': item.price or '',
-        'tags': ', '.join([str(x) for x in item.tags.all()]),
+        'tags': item.tags_display,
         'url': reverse('api_item_single', args=[item.id])
     }
 
@@ -33,34 +42,16 @@ class ItemSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
     def create(self, validated_data):
-        tags = validated_data.pop('tags_string', '').replace(', ', ',').split(
-            ',')
+        tags = tags_string_to_list(validated_data.pop('tags_string', ''))
         request = self.context['request']
         validated_data['user'] = request.user
         instance = super(ItemSerializer, self).create(validated_data)
-        instance = self._add_tags(instance, tags)
-        instance.save()
-        return instance
+        return add_tag_to_item(instance, tags)
 
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags_string', '').replace(', ', ',').split(
-            ',')
+        tags = tags_string_to_list(validated_data.pop('tags_string', ''))
         instance = super(ItemSerializer, self).update(instance, validated_data)
-        instance.tags.filter(~Q(name__in=tags)).all().delete()
-        instance = self._add_tags(instance, tags)
-        instance.save()
-        return instance
-
-    @classmethod
-    def _add_tags(cls, instance, tags):
-        for tag in tags:
-            tag_query = Category.objects.filter(name=tag)
-            if tag_query.exists():
-                tag = tag_query.first()
-            else:
-                tag = Category.objects.create(name=tag)
-            instance.tags.add(tag)
-        return instance
+        return set_item_tags(instance, tags)
 
 
 class ShoppingListDetailsSerializer(serializers.Serializer):
@@ -85,26 +76,6 @@ class ShoppingListItemSerializer(serializers.Serializer):
                                         default=1)
     is_done = serializers.BooleanField(default=False)
 
-    def validate(self, attrs):
-        attrs = super(ShoppingListItemSerializer, self).validate(attrs)
-        item_id = attrs.get('item_id')
-        if item_id:
-            exists = Item.objects.filter(pk=item_id).exists()
-            if not exists:
-                raise serializers.ValidationError({
-                    'item_id': 'Invalid Item PK value'
-                }, code='invalid')
-
-        link_id = attrs.get('link_id')
-        if link_id:
-            exists = ShoppingListItem.objects \
-                .filter(pk=link_id, deleted__isnull=True).exists()
-            if not exists:
-                raise serializers.ValidationError({
-                    'link_id': 'Invalid ShoppingListItem PK value'
-                }, code='invalid')
-        return attrs
-
 
 class ShoppingListSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=100, allow_blank=True)
@@ -123,8 +94,50 @@ class ShoppingListSerializer(serializers.Serializer):
                 {'items': 'List must contain at least one item'},
                 code='invalid'
             )
+        errors = self.check_references(attrs['items'])
+        if any(errors):
+            raise serializers.ValidationError({'items': errors},
+                                              code='invalid')
         return attrs
 
+    def check_references(self, items):
+        """
+        Check that the referenced items and shopping list items exist and
+        belong to the user or to lists shared with them, using one query for
+        all items and one for all links
+        :param items: validated shopping list items
+        :return: list with the errors of every item, empty if it is valid
+        """
+        user = self.context['request'].user
+        item_ids = {x['item_id'] for x in items if x.get('item_id')}
+        link_ids = {x['link_id'] for x in items if x.get('link_id')}
+
+        valid_item_ids = set()
+        if item_ids:
+            valid_item_ids = set(get_accessible_items_queryset(user.id)
+                                 .filter(pk__in=item_ids)
+                                 .values_list('id', flat=True))
+
+        valid_link_ids = set()
+        if link_ids:
+            lists = get_accessible_shopping_lists_queryset(user.id)
+            if self.instance is not None:
+                lists = lists.filter(pk=self.instance.pk)
+            valid_link_ids = set(ShoppingListItem.objects.filter(
+                pk__in=link_ids, shopping_list__in=lists
+            ).values_list('id', flat=True))
+
+        errors = []
+        for item in items:
+            error = {}
+            if item.get('item_id') and item['item_id'] not in valid_item_ids:
+                error['item_id'] = ['Invalid Item PK value']
+            if item.get('link_id') and item['link_id'] not in valid_link_ids:
+                error['link_id'] = ['Invalid ShoppingListItem PK value']
+            errors.append(error)
+        return errors
+
+    @transaction.atomic
     def create(self, validated_data):
         user = self.context['request'].user
         instance = ShoppingList.objects.create(
@@ -133,9 +146,9 @@ class ShoppingListSerializer(serializers.Serializer):
         )
         self._save_items(instance, validated_data['items'])
         self._save_emails(instance, validated_data['emails'])
-        instance.save()
         return instance
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name')
         self._save_items(instance, validated_data.get('items'))
@@ -158,45 +171,359 @@ class ShoppingListSerializer(serializers.Serializer):
                 )
 
     def _save_items(self, instance, items):
-        request = self.context['request']
-        user = request.user
+        """
+        Synchronize the links of the shopping list with the submitted items.
+        Existing links are read once and the changes are written with bulk
+        queries, so the number of queries doesn't depend on the list size.
+        Bulk queries skip model signals, so the search vectors, autocomplete
+        index and usage counters of new items are updated here.
+        :param instance: shopping list being saved
+        :param items: validated items of the shopping list
+        :return: None
+        """
+        user = self.context['request'].user
+        changes = ShoppingListItemChanges(list_ids=[instance.pk])
         list_items = instance.shoppinglistitem_set
-        link_ids = []
+        existing_links = list_items.select_related('item').in_bulk()
+
+        updated_links = []
+        added_items = []
         for item in items:
             link_id = item.get('link_id')
             if link_id:
-                link = list_items.get(pk=link_id)
+                link = existing_links.get(link_id)
+                if link is None:
+                    raise serializers.ValidationError({
+                        'items': 'Invalid ShoppingListItem PK value'
+                    }, code='invalid')
                 link.is_done = item['is_done']
                 link.quantity = item['quantity']
-                link.price = item['price']
+                link.price = item['price'] or link.item.price
                 link.editor = user
-                link.save()
+                updated_links.append(link)
             else:
-                if not item.get('item_id'):
-                    item_obj = Item.objects.create(
-                        name=item['name'],
-                        code=item['code'],
-                        price=item['price'],
+                added_items.append(item)
+
+        new_links = self.create_links(instance, added_items)
+        if updated_links:
+            ShoppingListItem.objects.bulk_update(
+                updated_links, ['is_done', 'quantity', 'price', 'editor']
+            )
+            ItemPriceHistory.record(
+                ((x.item_id, x.price, instance.pk) for x in updated_links),
+                ItemPriceHistory.LIST
+            )
+
+        kept_ids = [x.id for x in updated_links + new_links]
+        list_items.filter(~Q(id__in=kept_ids)).delete()
+        list_items_changed.send(sender=ShoppingList, list_ids=[instance.pk],
+                                changes=changes)
+
+    def create_links(self, instance, items):
+        """
+        Add new items to the shopping list with bulk queries. Items without
+        an ID reuse the user's existing item with the same normalized name,
+        and only the remaining ones are created. Bulk queries skip model
+        signals, so the search vectors, autocomplete index, usage counters
+        and price history are updated here. Doesn't send list_items_changed.
+        :param instance: shopping list the items are added to
+        :param items: validated items without a link ID
+        :return: list of created ShoppingListItem objects
+        """
+        user = self.context['request'].user
+        linked_items = Item.objects.in_bulk(
+            {x['item_id'] for x in items if x.get('item_id')}
+        )
+        names = {Item.normalize_name(x['name'])
+                 for x in items if not x.get('item_id')}
+        named_items = {}
+        if names:
+            # Ordered newest first so the oldest item wins for duplicates
+            named_items = {x.normalized_name: x for x in Item.objects.filter(
+                user=user, normalized_name__in=names
+            ).order_by('-id')}
+
+        new_items = []
+        linked = []
+        for data in items:
+            if data.get('item_id'):
+                item = linked_items[data['item_id']]
+            else:
+                name = Item.normalize_name(data['name'])
+                item = named_items.get(name)
+                if item is None:
+                    item = Item(
+                        name=data['name'],
+                        normalized_name=name,
+                        code=data.get('code', ''),
+                        price=data['price'],
                         user=user
                     )
-                    item_obj.save()
-                else:
-                    item_obj = Item.objects.get(pk=item.get('item_id'))
-                link = ShoppingListItem.objects.create(
-                    shopping_list=instance,
-                    item=item_obj,
-                    creator=user,
-                    editor=user,
-                    is_done=item['is_done'],
-                    quantity=item['quantity'],
-                    price=item['price']
-                )
-                link.save()
-            link_ids.append(link.id)
-        list_items.filter(~Q(id__in=link_ids)).delete()
+                    named_items[name] = item
+                    new_items.append(item)
+            linked.append((data, item))
+
+        if new_items:
+            Item.objects.bulk_create(new_items)
+            Item.update_search_vectors([x.id for x in new_items])
+            for item in new_items:
+                item_index.update(item)
+            autocomplete_cache.invalidate_user(user.id)
+            ItemPriceHistory.record(
+                ((x.id, x.price, None) for x in new_items),
+                ItemPriceHistory.ITEM
+            )
+
+        # bulk_create doesn't call ShoppingListItem.save, which would copy
+        # the item price
+        new_links = [ShoppingListItem(
+            shopping_list=instance,
+            item=item,
+            creator=user,
+            editor=user,
+            is_done=data['is_done'],
+            quantity=data['quantity'],
+            price=data['price'] or item.price
+        ) for data, item in linked]
+        ShoppingListItem.objects.bulk_create(new_links)
+        ItemUsage.record(x.item_id for x in new_links)
+        ItemPriceHistory.record(
+            ((x.item_id, x.price, instance.pk) for x in new_links),
+            ItemPriceHistory.LIST
+        )
+        return new_links
+
+
+class ShoppingListOperationSerializer(serializers.Serializer):
+    """A single change to a shopping list or one of its items"""
+    TOGGLE = 'toggle'
+    SET_QUANTITY = 'set_quantity'
+    ADD = 'add'
+    REMOVE = 'remove'
+    RENAME = 'rename'
+    OPERATION_CHOICES = [TOGGLE, SET_QUANTITY, ADD, REMOVE, RENAME]
+    REQUIRED_FIELDS = {
+        TOGGLE: ('link_id', 'is_done'),
+        SET_QUANTITY: ('link_id', 'quantity'),
+        ADD: ('name',),
+        REMOVE: ('link_id',),
+        RENAME: ('name',),
+    }
+    ACCESS_LEVEL_OPERATIONS = {
+        Profile.READ_ACCESS: set(),
+        Profile.COMPLETE_ACCESS: {TOGGLE},
+        Profile.FULL_ACCESS: set(OPERATION_CHOICES),
+    }
+
+    op = serializers.ChoiceField(choices=OPERATION_CHOICES)
+    link_id = serializers.IntegerField(required=False)
+    item_id = serializers.IntegerField(required=False, allow_null=True)
+    is_done = serializers.BooleanField(required=False)
+    name = serializers.CharField(required=False, max_length=200,
+                                 allow_blank=True)
+    code = serializers.CharField(required=False, max_length=20,
+                                 allow_blank=True, default='')
+    price = serializers.DecimalField(required=False, max_digits=9,
+                                     decimal_places=2, default=None,
+                                     min_value=0, allow_null=True)
+    quantity = serializers.DecimalField(required=False, max_digits=4,
+                                        decimal_places=2, min_value=0)
+
+    def validate(self, attrs):
+        attrs = super(ShoppingListOperationSerializer, self).validate(attrs)
+        errors = {
+            field: ['This field is required.']
+            for field in self.REQUIRED_FIELDS[attrs['op']]
+            if field not in attrs
+        }
+        if attrs['op'] == self.RENAME and len(attrs.get('name', '')) > 100:
+            errors['name'] = ['Ensure this field has no more than 100 '
+                              'characters.']
+        if errors:
+            raise serializers.ValidationError(errors, code='invalid')
+        return attrs
+
+
+class ShoppingListOperationsSerializer(serializers.Serializer):
+    """
+    Batch of operations applied to a shopping list. Every operation only
+    touches the rows it affects, e.g. toggling an item is a single UPDATE.
+    """
+    operations = ShoppingListOperationSerializer(many=True)
+
+    def validate_operations(self, operations):
+        if len(operations) > 100:
+            raise serializers.ValidationError(
+                'Can not apply more than 100 operations at once',
+                code='invalid'
+            )
+        elif len(operations) < 1:
+            raise serializers.ValidationError(
+                'At least one operation is required', code='invalid'
+            )
+        user = self.context['request'].user
+        item_ids = {x['item_id'] for x in operations if x.get('item_id')}
+        if item_ids:
+            valid_item_ids = set(get_accessible_items_queryset(user.id)
+                                 .filter(pk__in=item_ids)
+                                 .values_list('id', flat=True))
+            errors = [
+                {'item_id': ['Invalid Item PK value']}
+                if x.get('item_id') and x['item_id'] not in valid_item_ids
+                else {}
+                for x in operations
+            ]
+            if any(errors):
+                raise serializers.ValidationError(errors, code='invalid')
+        return operations
+
+    @classmethod
+    def get_allowed_operations(cls, access_level):
+        """
+        Get the operations a user with the given access level can apply
+        :param access_level: one of the share levels or None
+        :return: set of operation names
+        """
+        operations = ShoppingListOperationSerializer.ACCESS_LEVEL_OPERATIONS
+        return operations.get(access_level, set())
+
+    @transaction.atomic
+    def apply(self, instance):
+        """
+        Apply the validated operations to the shopping list in order
+        :param instance: shopping list to change
+        :return: list with the result of every operation
+        """
+        # Toggles only change the completed count, the other changed items
+        # are read before and after. Items created by the add operation are
+        # tracked by the model signals.
+        self._tracked_link_ids = {
+            x['link_id'] for x in self.validated_data['operations']
+            if x.get('link_id')
+            and x['op'] != ShoppingListOperationSerializer.TOGGLE
+        }
+        self._changes = ShoppingListItemChanges(self._tracked_link_ids)
+        results = []
+        for index, operation in enumerate(self.validated_data['operations']):
+            apply = getattr(self, f'_apply_{operation["op"]}')
+            result = apply(instance, operation)
+            if result is None:
+                errors = [{}] * index + [{
+                    'link_id': ['Invalid ShoppingListItem PK value']
+                }]
+                raise serializers.ValidationError({'operations': errors},
+                                                  code='invalid')
+            results.append(result)
+        list_items_changed.send(sender=ShoppingList, list_ids=[instance.pk],
+                                changes=self._changes)
+        return results
+
+    def _links(self, instance, operation):
+        return ShoppingListItem.objects.filter(
+            pk=operation['link_id'],
+            shopping_list=instance
+        )
+
+    def _apply_toggle(self, instance, operation):
+        links = self._links(instance, operation)
+        editor = self.context['request'].user
+        changed = links.exclude(is_done=operation['is_done']).update(
+            is_done=operation['is_done'],
+            editor=editor
+        )
+        if not changed and not links.update(editor=editor):
+            return None
+        if operation['link_id'] not in self._tracked_link_ids:
+            self._changes.add_completed(
+                instance.pk, changed if operation['is_done'] else -changed
+            )
+        return {'link_id': operation['link_id']}
+
+    def _apply_set_quantity(self, instance, operation):
+        updated = self._links(instance, operation).update(
+            quantity=operation['quantity'],
+            editor=self.context['request'].user
+        )
+        return {'link_id': operation['link_id']} if updated else None
+
+    def _apply_remove(self, instance, operation):
+        deleted, _ = self._links(instance, operation).delete()
+        return {'link_id': operation['link_id']} if deleted else None
+
+    def _apply_rename(self, instance, operation):
+        instance.name = operation['name']
+        instance.save(update_fields=['name'])
+        return {}
+
+    def _apply_add(self, instance, operation):
+        user = self.context['request'].user
+        if operation.get('item_id'):
+            item = Item.objects.get(pk=operation['item_id'])
+        else:
+            item = Item.objects.filter(
+                user=user,
+                normalized_name=Item.normalize_name(operation['name'])
+            ).order_by('id').first()
+        if item is None:
+            item = Item.objects.create(
+                name=operation['name'],
+                code=operation['code'],
+                price=operation['price'],
+                user=user
+            )
+        link = ShoppingListItem.objects.create(
+            shopping_list=instance,
+            item=item,
+            creator=user,
+            editor=user,
+            is_done=operation.get('is_done', False),
+            quantity=operation.get('quantity', 1),
+            price=operation['price']
+        )
+        ItemUsage.record([item.id])
+        return {'link_id': link.id, 'item_id': item.id}
 
 
 class ItemAutocompleteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = ('id', 'name', 'code', 'price')
+
+
+class ArchivedShoppingListItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedShoppingListItem
+        fields = ('id', 'item_id', 'name', 'code', 'is_done', 'quantity',
+                  'price')
+
+
+class ArchivedShoppingListSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ArchivedShoppingList
+        fields = ('id', 'name', 'created', 'archived', 'item_count',
+                  'total_price', 'url')
+
+    def get_url(self, obj):
+        return reverse('api_shopping_list_archive_single', args=[obj.id])
+
+
+class ArchivedShoppingListDetailsSerializer(ArchivedShoppingListSerializer):
+    items = ArchivedShoppingListItemSerializer(many=True)
+
+    class Meta(ArchivedShoppingListSerializer.Meta):
+        fields = ArchivedShoppingListSerializer.Meta.fields + ('items',)
+
+
+class SearchResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    type = serializers.CharField()
+    rank = serializers.FloatField()
+    url = serializers.SerializerMethodField()
+
+    def get_url(self, obj):
+        if obj['type'] == 'list':
+            return reverse('shopping_list_single', args=[obj['id']])
+        return reverse('api_item_single', args=[obj['id']])
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent after items of shopping lists were changed with bulk queries, which
+# don't send the model signals. Receivers get the list_ids argument and the
+# ShoppingListItemChanges created before the write as changes.
+list_items_changed = Signal()
@@ -0,0 +1,59 @@
+import logging
+
+from django import template
+from django.conf import settings
+
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger('shoppero')
+
+register = template.Library()
+
+# Process local cache of rendered template fragments by name and version
+fragment_cache = LRUCache(settings.FRAGMENT_CACHE_SIZE,
+                          settings.FRAGMENT_CACHE_TTL)
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        key = (self.name,) + tuple(x.resolve(context) for x in self.vary_on)
+        content = fragment_cache.get(key)
+        if content is None:
+            content = self.nodelist.render(context)
+            fragment_cache.set(key, content)
+            logger.debug('Fragment cache miss: %s', fragment_cache.stats())
+        return content
+
+
+@register.tag
+def cached_fragment(parser, token):
+    """
+    Cache the rendered content of the block in a process local cache. The
+    key is the fragment name and the given values, which have to include
+    a version of everything the content depends on, since entries are
+    never invalidated, only replaced by newer versions or evicted.
+
+    Usage::
+
+        {% cached_fragment 'list_table' list.id list.version %}
+            ...
+        {% endcached_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} tag requires a fragment name and at least one '
+            f'version value'
+        )
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(
+        nodelist,
+        bits[1].strip('"\''),
+        [parser.compile_filter(x) for x in bits[2:]]
+    )
@@ -0,0 +1,1888 @@
+import base64
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from random import Random
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shopping_list.autocomplete import AUTOCOMPLETE_LIMIT, \
+    autocomplete_cache, item_index, ItemIndex, ItemTrie
+from shopping_list.ingest import ShoppingListIngest
+from shopping_list.models import Item, ShoppingList, ShoppingListItem, \
+    SharedShoppingList, Category, ItemUsage, ShoppingListSummary, tag_cache, \
+    DailySpending, MonthlySpending, CategorySpending, ItemPriceHistory, \
+    ArchivedShoppingList, ArchivedShoppingListItem, price_cache
+from shopping_list.pagination import ItemKeysetPagination
+from shopping_list.querysets import get_item_autocomplete_queryset, \
+    get_item_autocomplete_items, get_shopping_list_items_queryset
+from shopping_list.serializers import ShoppingListSerializer
+from shopping_list.signals import list_items_changed
+from shopping_list.templatetags.fragment_cache import fragment_cache
+from shopping_list.utils import add_tag_to_item, set_item_tags
+
+AUTOCOMPLETE_URL = reverse('api_item_autocomplete')
+ITEMS_URL = reverse('api_items_list')
+SEARCH_URL = reverse('api_search')
+ITEMS_PAGE_URL = reverse('items')
+LIST_CREATE_URL = reverse('api_shopping_list_create')
+STATISTICS_URL = reverse('api_statistics')
+ITEM_PRICES_URL = reverse('api_item_prices')
+ARCHIVE_URL = reverse('api_shopping_list_archive')
+
+
+def sample_user(email='user@shoppero.com', password='pass'):
+    """Helper function for creating sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+def sample_item(user, name='Milk', **kwargs):
+    """Helper function for creating sample item"""
+    return Item.objects.create(user=user, name=name, **kwargs)
+
+
+class TestItemAutocompletePrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        autocomplete_cache.clear()
+        item_index.clear()
+
+    def test_autocomplete_matches_name_prefix(self):
+        """Test that autocomplete returns items starting with the term
+        regardless of letter case"""
+        sample_item(self.user, 'Milk')
+        sample_item(self.user, 'milk chocolate')
+        sample_item(self.user, 'Almond milk')
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'MIL'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [x['name'] for x in res.json()]
+        self.assertEqual(names, ['Milk', 'milk chocolate'])
+
+    def test_autocomplete_scoped_to_user(self):
+        """Test that autocomplete doesn't return other users' items or
+        deleted items"""
+        other_user = sample_user('other@shoppero.com')
+        sample_item(other_user, 'Milk')
+        deleted = sample_item(self.user, 'Milk')
+        deleted.soft_delete()
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), [])
+
+    def test_autocomplete_result_limit(self):
+        """Test that autocomplete returns a bounded number of items"""
+        for i in range(AUTOCOMPLETE_LIMIT + 5):
+            sample_item(self.user, f'Milk {i:02d}')
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'milk'})
+        names = [x['name'] for x in res.json()]
+        self.assertEqual(len(names), AUTOCOMPLETE_LIMIT)
+        self.assertEqual(names, sorted(names))
+
+    def test_autocomplete_cached_for_longer_prefix(self):
+        """Test that a longer prefix is answered from the cached result of
+        a shorter prefix without querying the database"""
+        sample_item(self.user, 'Milk')
+        sample_item(self.user, 'Mint')
+        self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        with self.assertNumQueries(0):
+            res = self.client.get(AUTOCOMPLETE_URL, {'name': 'mil'})
+        self.assertEqual([x['name'] for x in res.json()], ['Milk'])
+        self.assertEqual(autocomplete_cache.stats()['hits'], 1)
+        self.assertEqual(autocomplete_cache.stats()['misses'], 1)
+
+    def test_autocomplete_cache_invalidated(self):
+        """Test that saving and soft deleting items invalidates the cached
+        autocomplete results"""
+        item = sample_item(self.user, 'Milk')
+        self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        sample_item(self.user, 'Mint')
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        self.assertEqual(len(res.json()), 2)
+        item.soft_delete()
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        self.assertEqual([x['name'] for x in res.json()], ['Mint'])
+
+    def test_autocomplete_ranked_by_usage(self):
+        """Test that items used on more shopping lists are suggested first,
+        both from the in memory index and from the database"""
+        sample_item(self.user, 'Milk')
+        mint = sample_item(self.user, 'Mint')
+        self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        self.user.is_active = True
+        self.user.save()
+        self.client.force_login(self.user)
+        payload = {
+            'name': 'List',
+            'items': [{'item_id': mint.id, 'name': mint.name}]
+        }
+        res = self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        self.assertEqual([x['name'] for x in res.json()], ['Mint', 'Milk'])
+        items = get_item_autocomplete_items(self.user.id, 'mi')
+        self.assertEqual([x.name for x in items], ['Mint', 'Milk'])
+        self.assertEqual(mint.usage.use_count, 1)
+
+    def test_autocomplete_query_reads_index_in_order(self):
+        """Test that the database autocomplete matches the prefix and reads
+        the name order from item_user_upper_name_idx, without sorting all
+        the matches"""
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = get_item_autocomplete_queryset(self.user.id, 'mi') \
+                .explain()
+        self.assertIn('Index Scan using item_user_upper_name_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+    def test_autocomplete_index_updated_in_place(self):
+        """Test that creating, renaming and archiving items through the api
+        updates the loaded autocomplete index without reloading it"""
+        self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        self.assertIn(self.user.id, item_index)
+        res = self.client.post(ITEMS_URL, {'name': 'Milk', 'price': '1.5'})
+        item_url = reverse('api_item_single', args=[res.data['id']])
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'mi'})
+        self.assertEqual(res.json(), [{
+            'id': res.json()[0]['id'], 'name': 'Milk', 'code': '',
+            'price': '1.50'
+        }])
+        self.client.put(item_url, {'name': 'Mint', 'tags_string': ''})
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'mil'})
+        self.assertEqual(res.json(), [])
+        self.client.patch(item_url)
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'min'})
+        self.assertEqual(res.json(), [])
+        self.assertIn(self.user.id, item_index)
+
+
+class TestItemTrie(TestCase):
+    def test_trie_search_order_and_prune(self):
+        """Test that trie search returns items ordered by name and ID and
+        removing items prunes empty nodes"""
+        trie = ItemTrie()
+        trie.insert({'id': 3, 'name': 'milk'})
+        trie.insert({'id': 1, 'name': 'Mint'})
+        trie.insert({'id': 2, 'name': 'Milk'})
+        names = [(x['id'], x['name']) for x in trie.search('mi', 10)]
+        self.assertEqual(names, [(2, 'Milk'), (3, 'milk'), (1, 'Mint')])
+        trie.set_score(1, 2.0)
+        trie.insert({'id': 3, 'name': 'milk'}, 1.0)
+        names = [(x['id'], x['name']) for x in trie.search('mi', 10)]
+        self.assertEqual(names, [(1, 'Mint'), (3, 'milk'), (2, 'Milk')])
+        self.assertEqual(len(trie.search('mi', 2)), 2)
+        node_count = trie.node_count
+        trie.remove(1)
+        self.assertEqual(trie.node_count, node_count - 2)
+        trie.remove(2)
+        trie.remove(3)
+        self.assertEqual(trie.node_count, 1)
+
+    def test_trie_top_lists_match_full_ranking(self):
+        """Test that the ranked lists kept at the nodes give the same
+        results as ranking every match, after inserts, score changes and
+        removals"""
+        random = Random(1)
+        trie = ItemTrie(top_size=3)
+        names = ['milk', 'mint', 'mild', 'mix', 'mango', 'melon', 'm', 'bread']
+        for item_id, name in enumerate(names * 2):
+            trie.insert({'id': item_id, 'name': name}, random.random())
+        for step in range(60):
+            item_id = random.randrange(len(names) * 2)
+            action = random.choice(['insert', 'score', 'remove'])
+            if action == 'insert':
+                trie.insert({'id': item_id, 'name': random.choice(names)},
+                            random.random())
+            elif action == 'score':
+                trie.set_score(item_id, random.random())
+            else:
+                trie.remove(item_id)
+            for prefix in ('', 'm', 'mi', 'mil', 'b', 'x'):
+                expected = trie.search(prefix, 4)[:3]
+                self.assertEqual(trie.search(prefix, 3), expected)
+
+    def test_index_memory_ceiling(self):
+        """Test that the index drops the least recently used tries to stay
+        under its node ceiling and refuses oversized catalogs"""
+        index = ItemIndex(max_nodes=10, idle_seconds=60, max_age=60)
+        index.search(1, 'ab', 10, lambda: [({'id': 1, 'name': 'abcd'}, 0)])
+        index.search(2, 'ab', 10, lambda: [({'id': 2, 'name': 'abcd'}, 0)])
+        index.search(3, 'ab', 10, lambda: [({'id': 3, 'name': 'abcd'}, 0)])
+        self.assertNotIn(1, index)
+        self.assertIn(3, index)
+        self.assertLessEqual(index.node_count, 10)
+        result = index.search(4, 'ab', 10,
+                              lambda: [({'id': 4, 'name': 'a' * 20}, 0)])
+        self.assertIsNone(result)
+
+
+class TestSearchPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_search_items_tags_and_lists(self):
+        """Test that search matches item names, codes, tags and shopping
+        list names and ranks name matches first"""
+        self.client.post(ITEMS_URL, {'name': 'Yogurt', 'code': '12345',
+                                     'tags_string': 'dairy, breakfast'})
+        self.client.post(ITEMS_URL, {'name': 'Dairy free milk'})
+        ShoppingList.objects.create(name='Dairy run', user=self.user)
+        res = self.client.get(SEARCH_URL, {'q': 'dair'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 3)
+        names = [x['name'] for x in res.data['results']]
+        self.assertEqual(names[-1], 'Yogurt')
+        self.assertCountEqual(names[:2], ['Dairy free milk', 'Dairy run'])
+        res = self.client.get(SEARCH_URL, {'q': '1234'})
+        self.assertEqual([x['name'] for x in res.data['results']],
+                         ['Yogurt'])
+
+    def test_search_scoped_and_paginated(self):
+        """Test that search doesn't return other users' or deleted objects
+        and that the results are paginated"""
+        sample_item(sample_user('other@shoppero.com'), 'Bread')
+        sample_item(self.user, 'Bread roll').soft_delete()
+        for i in range(3):
+            sample_item(self.user, f'Bread {i}')
+        res = self.client.get(SEARCH_URL, {'q': 'bread', 'page_size': 2})
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_search_empty_query(self):
+        """Test that a query without words returns no results"""
+        res = self.client.get(SEARCH_URL, {'q': '  &!'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [])
+
+
+class TestItemPaginationPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.page_size = ItemKeysetPagination.page_size
+        for i in range(self.page_size + 5):
+            sample_item(self.user, f'Item {i % 10}', code=str(i))
+
+    def test_item_list_keyset_pages(self):
+        """Test that following the next links returns every item exactly
+        once in the requested order"""
+        res = self.client.get(ITEMS_URL, {'order_by': '-name'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), self.page_size)
+        items = res.data['results']
+        res = self.client.get(res.data['next'])
+        self.assertIsNone(res.data['next'])
+        items += res.data['results']
+        self.assertEqual(len({x['id'] for x in items}), self.page_size + 5)
+        keys = [(x['name'], x['id']) for x in items]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_item_list_invalid_ordering_and_cursor(self):
+        """Test that an ordering that isn't whitelisted falls back to the
+        default ordering and an invalid cursor returns 404"""
+        res = self.client.get(ITEMS_URL, {'order_by': 'user__password'})
+        ids = [x['id'] for x in res.data['results']]
+        self.assertEqual(ids, sorted(ids))
+        res = self.client.get(ITEMS_URL, {'cursor': 'invalid'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_item_list_cursor_value_type(self):
+        """Test that a cursor with a value of the wrong type for the
+        ordering field returns 404"""
+        for ordering, value in (('name', {'a': 1}), ('name', 5),
+                                ('name', True), ('id', 'x'), ('id', [1])):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps([ordering, value, 1]).encode()
+            ).decode()
+            res = self.client.get(ITEMS_URL, {'order_by': ordering,
+                                              'cursor': cursor})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_item_list_cursor_pk_overflow(self):
+        """Test that a cursor with an infinite primary key returns 404"""
+        for pk in ('Infinity', '1e999', '-Infinity'):
+            cursor = base64.urlsafe_b64encode(
+                f'["id", 1, {pk}]'.encode()
+            ).decode()
+            res = self.client.get(ITEMS_URL, {'cursor': cursor})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_item_page_infinite_scroll(self):
+        """Test that the item page renders the first page and serves the
+        next one with the same cursor"""
+        self.user.is_active = True
+        self.user.save()
+        self.client.force_login(self.user)
+        res = self.client.get(ITEMS_PAGE_URL, {'order_by': 'code'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertContains(res, 'id="items-load-more"')
+        res = self.client.get(ITEMS_PAGE_URL, {'order_by': 'code'},
+                              HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        codes = [x['code'] for x in res.json()['results']]
+        res = self.client.get(res.json()['next'],
+                              HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.json()['next'])
+        codes += [x['code'] for x in res.json()['results']]
+        self.assertEqual(len(codes), self.page_size + 5)
+        self.assertEqual(codes, sorted(codes))
+
+
+class TestShoppingListSavePrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.request = RequestFactory().post(LIST_CREATE_URL)
+        self.request.user = self.user
+
+    def _count_save_queries(self, items, instance=None):
+        """Count the queries made while saving a validated shopping list"""
+        serializer = ShoppingListSerializer(
+            instance, data={'name': 'List', 'items': items},
+            context={'request': self.request}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.save()
+        return len(queries)
+
+    def test_save_items_query_count_constant(self):
+        """Test that saving a shopping list takes the same number of queries
+        for one item and for a hundred items"""
+        existing = [sample_item(self.user, f'Item {i}') for i in range(50)]
+
+        def payload(count):
+            new = [{'name': f'New {i}'} for i in range(count)]
+            linked = [{'item_id': x.id, 'name': x.name}
+                      for x in existing[:count]]
+            return new + linked
+
+        small = self._count_save_queries(payload(1))
+        large = self._count_save_queries(payload(50))
+        self.assertEqual(small, large)
+
+        def update(shopping_list):
+            links = [{'link_id': x.id, 'name': x.item.name, 'is_done': True}
+                     for x in shopping_list.shoppinglistitem_set.all()]
+            return self._count_save_queries(links, shopping_list)
+
+        small_list, large_list = ShoppingList.objects.order_by('id')
+        self.assertEqual(update(small_list), update(large_list))
+
+    def test_save_items_diff(self):
+        """Test that saving a shopping list updates submitted links, removes
+        missing links and creates new items with their price"""
+        milk = sample_item(self.user, 'Milk', price=2)
+        bread = sample_item(self.user, 'Bread', price=1)
+        payload = {'name': 'List', 'items': [
+            {'item_id': milk.id, 'name': milk.name},
+            {'item_id': bread.id, 'name': bread.name},
+        ]}
+        res = self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        shopping_list = ShoppingList.objects.get(user=self.user)
+        milk_link = shopping_list.shoppinglistitem_set.get(item=milk)
+        self.assertEqual(milk_link.price, 2)
+
+        payload = {'name': 'List', 'items': [
+            {'link_id': milk_link.id, 'name': milk.name, 'quantity': 3,
+             'is_done': True},
+            {'name': 'Eggs', 'code': '', 'price': 4},
+        ]}
+        url = reverse('api_shopping_list_single', args=[shopping_list.id])
+        res = self.client.put(url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        links = shopping_list.shoppinglistitem_set.order_by('id')
+        self.assertEqual([(x.item.name, x.quantity, x.is_done, x.price)
+                          for x in links],
+                         [('Milk', 3, True, 2), ('Eggs', 1, False, 4)])
+        eggs = Item.objects.get(name='Eggs')
+        self.assertEqual(eggs.user, self.user)
+        res = self.client.get(AUTOCOMPLETE_URL, {'name': 'eg'})
+        self.assertEqual([x['name'] for x in res.json()], ['Eggs'])
+
+
+class TestShoppingListValidationPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.request = RequestFactory().post(LIST_CREATE_URL)
+        self.request.user = self.user
+
+    def _serializer(self, items, instance=None):
+        """Create a shopping list serializer for the given items"""
+        return ShoppingListSerializer(
+            instance, data={'name': 'List', 'items': items},
+            context={'request': self.request}
+        )
+
+    def test_invalid_references_error_per_item(self):
+        """Test that unknown item and link IDs are reported on the item
+        that references them"""
+        item = sample_item(self.user)
+        serializer = self._serializer([
+            {'item_id': item.id, 'name': item.name},
+            {'item_id': item.id + 100, 'name': 'Unknown'},
+            {'link_id': 1000, 'name': 'Unknown'},
+        ])
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors, {'items': [
+            {},
+            {'item_id': ['Invalid Item PK value']},
+            {'link_id': ['Invalid ShoppingListItem PK value']},
+        ]})
+
+    def test_references_checked_for_ownership(self):
+        """Test that other users' items are rejected unless they are on a
+        list shared with the user"""
+        owner = sample_user('owner@shoppero.com')
+        shared_item = sample_item(owner, 'Shared')
+        private_item = sample_item(owner, 'Private')
+        shopping_list = ShoppingList.objects.create(user=owner, name='List')
+        ShoppingListItem.objects.create(shopping_list=shopping_list,
+                                        item=shared_item)
+        private_list = ShoppingList.objects.create(user=owner, name='Other')
+        private_link = ShoppingListItem.objects.create(
+            shopping_list=private_list, item=private_item)
+        SharedShoppingList.objects.create(shopping_list=shopping_list,
+                                          user=self.user)
+
+        serializer = self._serializer([
+            {'item_id': shared_item.id, 'name': shared_item.name},
+            {'item_id': private_item.id, 'name': private_item.name},
+            {'link_id': private_link.id, 'name': private_item.name},
+        ])
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors, {'items': [
+            {},
+            {'item_id': ['Invalid Item PK value']},
+            {'link_id': ['Invalid ShoppingListItem PK value']},
+        ]})
+
+    def test_validation_query_count_constant(self):
+        """Test that validating references takes one query for items and
+        one for links regardless of the number of items"""
+        items = [sample_item(self.user, f'Item {i}') for i in range(50)]
+        shopping_list = ShoppingList.objects.create(user=self.user)
+        links = [ShoppingListItem.objects.create(shopping_list=shopping_list,
+                                                 item=x) for x in items]
+        payload = [{'item_id': x.id, 'name': x.name} for x in items] + \
+                  [{'link_id': x.id, 'name': 'Link'} for x in links]
+        serializer = self._serializer(payload, shopping_list)
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class TestShoppingListOperationsPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.shopping_list = ShoppingList.objects.create(user=self.user,
+                                                         name='List')
+        self.milk = sample_item(self.user, 'Milk', price=2)
+        self.link = ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, item=self.milk)
+        self.url = reverse('api_shopping_list_operations',
+                           args=[self.shopping_list.id])
+
+    def _share(self, access_level):
+        """Share the list with a new user and log in as them"""
+        user = sample_user('shared@shoppero.com')
+        user.is_active = True
+        user.save()
+        SharedShoppingList.objects.create(shopping_list=self.shopping_list,
+                                          user=user,
+                                          access_level=access_level)
+        self.client.force_login(user)
+
+    def test_toggle_single_update(self):
+        """Test that toggling an item writes a single UPDATE of the item
+        rows"""
+        payload = {'operations': [
+            {'op': 'toggle', 'link_id': self.link.id, 'is_done': True}
+        ]}
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        writes = [x['sql'] for x in queries
+                  if x['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        item_writes = [x for x in writes if 'shopping_list_item' in x]
+        self.assertEqual(len(item_writes), 1)
+        self.assertTrue(item_writes[0].startswith('UPDATE'))
+        self.link.refresh_from_db()
+        self.assertTrue(self.link.is_done)
+
+    def test_batch_operations(self):
+        """Test that add, set quantity, remove and rename are applied in
+        order"""
+        payload = {'operations': [
+            {'op': 'add', 'name': 'Eggs', 'price': 4},
+            {'op': 'add', 'item_id': self.milk.id, 'name': 'Milk'},
+            {'op': 'set_quantity', 'link_id': self.link.id, 'quantity': 3},
+            {'op': 'remove', 'link_id': self.link.id},
+            {'op': 'rename', 'name': 'Groceries'},
+        ]}
+        res = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        content = res.json()['content']
+        self.assertEqual(len(content), 5)
+        links = self.shopping_list.shoppinglistitem_set.order_by('id')
+        self.assertEqual([(x.item.name, x.price) for x in links],
+                         [('Eggs', 4), ('Milk', 2)])
+        self.assertEqual(links[0].id, content[0]['link_id'])
+        self.shopping_list.refresh_from_db()
+        self.assertEqual(self.shopping_list.name, 'Groceries')
+
+    def test_invalid_link_rolls_back(self):
+        """Test that an operation on a link of another list fails the whole
+        batch"""
+        other_list = ShoppingList.objects.create(user=self.user)
+        other_link = ShoppingListItem.objects.create(shopping_list=other_list,
+                                                     item=self.milk)
+        payload = {'operations': [
+            {'op': 'toggle', 'link_id': self.link.id, 'is_done': True},
+            {'op': 'toggle', 'link_id': other_link.id, 'is_done': True},
+        ]}
+        res = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json()['errors'], {'operations': [
+            {}, {'link_id': ['Invalid ShoppingListItem PK value']}
+        ]})
+        self.link.refresh_from_db()
+        self.assertFalse(self.link.is_done)
+
+    def test_missing_operation_fields(self):
+        """Test that each operation requires its own fields"""
+        payload = {'operations': [{'op': 'set_quantity',
+                                   'link_id': self.link.id}]}
+        res = self.client.patch(self.url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json()['errors'], {'operations': [
+            {'quantity': ['This field is required.']}
+        ]})
+
+    def test_operations_respect_access_level(self):
+        """Test that users with complete access can only toggle items"""
+        self._share('complete')
+        toggle = {'op': 'toggle', 'link_id': self.link.id, 'is_done': True}
+        res = self.client.patch(self.url, {'operations': [toggle]},
+                                format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        remove = {'op': 'remove', 'link_id': self.link.id}
+        res = self.client.patch(self.url, {'operations': [remove]},
+                                format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(ShoppingListItem.objects.filter(
+            pk=self.link.id).exists())
+
+    def test_read_access_forbidden(self):
+        """Test that users with read access can't change the list"""
+        self._share('read')
+        toggle = {'op': 'toggle', 'link_id': self.link.id, 'is_done': True}
+        res = self.client.patch(self.url, {'operations': [toggle]},
+                                format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def _replace(self):
+        """Replace the name and items of the list with a PUT"""
+        url = reverse('api_shopping_list_single',
+                      args=[self.shopping_list.id])
+        return self.client.put(url, {'name': 'Renamed', 'items': [
+            {'name': 'Eggs', 'code': '', 'price': 4},
+        ]}, format='json')
+
+    def test_replace_other_users_list_not_found(self):
+        """Test that a user the list isn't shared with can't replace it"""
+        other = sample_user('other@shoppero.com')
+        other.is_active = True
+        other.save()
+        self.client.force_login(other)
+        res = self._replace()
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.shopping_list.refresh_from_db()
+        self.assertEqual(self.shopping_list.name, 'List')
+        self.assertTrue(ShoppingListItem.objects.filter(
+            pk=self.link.id).exists())
+
+    def test_replace_needs_full_access(self):
+        """Test that users with complete access can't replace the list"""
+        self._share('complete')
+        res = self._replace()
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.shopping_list.refresh_from_db()
+        self.assertEqual(self.shopping_list.name, 'List')
+        SharedShoppingList.objects.update(access_level='all')
+        res = self._replace()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_rename_refused_on_both_write_paths(self):
+        """Test that a rename refused as an operation is also refused as a
+        replace of the list"""
+        self._share('complete')
+        rename = {'op': 'rename', 'name': 'Renamed'}
+        res = self.client.patch(self.url, {'operations': [rename]},
+                                format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        url = reverse('api_shopping_list_single',
+                      args=[self.shopping_list.id])
+        res = self.client.put(url, {'name': 'Renamed', 'items': [
+            {'link_id': self.link.id, 'name': 'Milk'},
+        ]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.shopping_list.refresh_from_db()
+        self.assertEqual(self.shopping_list.name, 'List')
+
+
+class TestShoppingListVersionPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.shopping_list = ShoppingList.objects.create(user=self.user,
+                                                         name='List')
+        self.milk = sample_item(self.user, 'Milk', price=2)
+        self.link = ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, item=self.milk)
+        self.url = reverse('api_shopping_list_single',
+                           args=[self.shopping_list.id])
+        self.operations_url = reverse('api_shopping_list_operations',
+                                      args=[self.shopping_list.id])
+
+    def _version(self):
+        self.shopping_list.refresh_from_db()
+        return self.shopping_list.version
+
+    def _toggle(self, **extra):
+        payload = {'operations': [
+            {'op': 'toggle', 'link_id': self.link.id, 'is_done': True}
+        ]}
+        return self.client.patch(self.operations_url, payload,
+                                 format='json', **extra)
+
+    def test_version_bumped_on_changes(self):
+        """Test that changing the list, its items, its shares or the items
+        on it increases the version"""
+        version = self._version()
+        self._toggle()
+        self.assertGreater(self._version(), version)
+        version = self._version()
+        self.shopping_list.name = 'Groceries'
+        self.shopping_list.save()
+        self.assertGreater(self._version(), version)
+        version = self._version()
+        SharedShoppingList.objects.create(shopping_list=self.shopping_list,
+                                          email='friend@shoppero.com')
+        self.assertGreater(self._version(), version)
+        version = self._version()
+        self.milk.price = 3
+        self.milk.save()
+        self.assertGreater(self._version(), version)
+
+    def test_stale_instance_does_not_reset_version(self):
+        """Test that saving a stale instance keeps the newer version"""
+        stale = ShoppingList.objects.get(pk=self.shopping_list.pk)
+        self._toggle()
+        version = self._version()
+        stale.save()
+        self.assertGreater(self._version(), version)
+
+    def test_detail_etag(self):
+        """Test that the detail endpoint returns an ETag and answers 304
+        until the list changes"""
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['items'][0]['link_id'], self.link.id)
+        etag = res['ETag']
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self._toggle()
+        self.assertNotEqual(res['ETag'], etag)
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_overview_etag(self):
+        """Test that the overview ETag changes when any list changes"""
+        url = reverse('api_shopping_list_create')
+        etag = self.client.get(url)['ETag']
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self._toggle()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_if_match_precondition(self):
+        """Test that writes with an outdated If-Match are rejected"""
+        etag = self.client.get(self.url)['ETag']
+        self.shopping_list.save()
+        res = self._toggle(HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.link.refresh_from_db()
+        self.assertFalse(self.link.is_done)
+        etag = self.client.get(self.url)['ETag']
+        res = self._toggle(HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_if_match_single_write(self):
+        """Test that only the first of two writes based on the same version
+        succeeds, and that stale archives and deletes are rejected"""
+        etag = self.client.get(self.url)['ETag']
+        res = self._toggle(HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self._toggle(HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        res = self.client.patch(self.url, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        res = self.client.delete(self.url, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertTrue(ShoppingList.objects.filter(
+            pk=self.shopping_list.pk).exists())
+        etag = self.client.get(self.url)['ETag']
+        res = self.client.delete(self.url, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class TestShoppingListIngestPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.request = RequestFactory().post(LIST_CREATE_URL)
+        self.request.user = self.user
+
+    def _lines(self, count, start=0):
+        """Helper function for creating NDJSON encoded items"""
+        return [json.dumps({'name': f'Item {i}', 'price': 1}).encode()
+                for i in range(start, start + count)]
+
+    def _post(self, url, lines):
+        res = self.client.post(url, b'\n'.join(lines),
+                               content_type='application/x-ndjson')
+        reports = b''.join(res.streaming_content).decode().splitlines()
+        return res, [json.loads(x) for x in reports]
+
+    def test_ingest_new_list(self):
+        """Test that importing creates a list with all valid items and
+        reports progress and invalid lines"""
+        milk = sample_item(self.user, 'Milk', price=2)
+        lines = self._lines(3) + [
+            b'not json',
+            json.dumps({'item_id': milk.id, 'name': 'Milk'}).encode(),
+            json.dumps({'item_id': milk.id + 100, 'name': 'Unknown'}).encode(),
+            json.dumps({'price': 1}).encode(),
+        ]
+        url = reverse('api_shopping_list_import') + '?name=Catering'
+        res, reports = self._post(url, lines)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        shopping_list = ShoppingList.objects.get(name='Catering')
+        self.assertEqual(reports[-1], {'status': 'done',
+                                       'list_id': shopping_list.id,
+                                       'processed': 7, 'created': 4,
+                                       'error_count': 3})
+        self.assertEqual([x['line'] for x in reports[0]['errors']],
+                         [4, 6, 7])
+        self.assertEqual(shopping_list.shoppinglistitem_set.count(), 4)
+
+    def test_failed_ingest_reports_list(self):
+        """Test that a failed import of a new list leaves no list behind
+        before the first batch and reports the list to retry against
+        after it"""
+        def failing(lines):
+            yield from lines
+            raise OSError('Client disconnected')
+
+        shopping_list = ShoppingList(user=self.user, name='New')
+        ingest = ShoppingListIngest(shopping_list, self.request,
+                                    batch_size=10)
+        reports = list(ingest.run(failing(self._lines(5))))
+        self.assertEqual(reports[-1]['status'], 'error')
+        self.assertIsNone(reports[-1]['list_id'])
+        self.assertFalse(ShoppingList.objects.exists())
+
+        shopping_list = ShoppingList(user=self.user, name='New')
+        ingest = ShoppingListIngest(shopping_list, self.request,
+                                    batch_size=10)
+        reports = list(ingest.run(failing(self._lines(15))))
+        self.assertEqual(reports[-1]['status'], 'error')
+        self.assertEqual(reports[-1]['list_id'], shopping_list.pk)
+        self.assertEqual(reports[-1]['created'], 10)
+        self.assertEqual(ShoppingList.objects.get().shoppinglistitem_set
+                         .count(), 10)
+
+    def test_ingest_into_existing_list_in_batches(self):
+        """Test that importing into a list writes fixed-size batches with a
+        constant number of queries each"""
+        shopping_list = ShoppingList.objects.create(user=self.user)
+
+        def count_queries(lines):
+            ingest = ShoppingListIngest(shopping_list, self.request,
+                                        batch_size=10)
+            with CaptureQueriesContext(connection) as queries:
+                reports = list(ingest.run(lines))
+            return len(queries), reports
+
+        single, _ = count_queries(self._lines(10))
+        triple, reports = count_queries(self._lines(30, 10))
+        self.assertEqual(triple, single * 3)
+        self.assertEqual([x['processed'] for x in reports], [10, 20, 30, 30])
+        self.assertEqual(shopping_list.shoppinglistitem_set.count(), 40)
+
+        url = reverse('api_shopping_list_import_into',
+                      args=[shopping_list.id])
+        res, reports = self._post(url, self._lines(2, 40))
+        self.assertEqual(reports[-1]['created'], 2)
+        self.assertEqual(shopping_list.shoppinglistitem_set.count(), 42)
+
+    def test_ingest_item_limit(self):
+        """Test that importing stops at the maximum number of items"""
+        shopping_list = ShoppingList.objects.create(user=self.user)
+        ingest = ShoppingListIngest(shopping_list, self.request,
+                                    batch_size=2, max_items=3)
+        reports = list(ingest.run(self._lines(5)))
+        self.assertEqual(reports[-1]['status'], 'error')
+        self.assertEqual(reports[-1]['created'], 3)
+        self.assertEqual(shopping_list.shoppinglistitem_set.count(), 3)
+
+    def test_ingest_requires_full_access(self):
+        """Test that users without full access can't import into a list"""
+        owner = sample_user('owner@shoppero.com')
+        shopping_list = ShoppingList.objects.create(user=owner)
+        SharedShoppingList.objects.create(shopping_list=shopping_list,
+                                          user=self.user,
+                                          access_level='complete')
+        url = reverse('api_shopping_list_import_into',
+                      args=[shopping_list.id])
+        res = self.client.post(url, b'\n'.join(self._lines(1)),
+                               content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestItemTagsPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_resolve_ids_normalizes_and_creates(self):
+        """Test that tag names are normalized and only missing categories
+        are created"""
+        dairy = Category.objects.create(name='dairy')
+        ids = Category.resolve_ids([' dairy', 'fresh   food', '', 'dairy '])
+        self.assertEqual(ids[0], dairy.id)
+        self.assertEqual(Category.objects.get(pk=ids[1]).name, 'fresh food')
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_resolve_ids_query_count(self):
+        """Test that resolving tags takes a bounded number of queries"""
+        Category.objects.create(name='dairy')
+        names = ['dairy'] + [f'tag {i}' for i in range(20)]
+        with self.assertNumQueries(3):
+            Category.resolve_ids(names)
+
+    def test_item_update_keeps_shared_categories(self):
+        """Test that removing a tag from an item doesn't delete the category
+        used by other items"""
+        res = self.client.post(ITEMS_URL, {'name': 'Milk',
+                                           'tags_string': 'dairy, fresh'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sorted(res.data['tags']), ['dairy', 'fresh'])
+        cheese = sample_item(self.user, 'Cheese')
+        add_tag_to_item(cheese, ['dairy'])
+
+        url = reverse('api_item_single', args=[res.data['id']])
+        res = self.client.put(url, {'name': 'Milk', 'tags_string': 'fresh'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'], ['fresh'])
+        self.assertEqual([x.name for x in cheese.tags.all()], ['dairy'])
+
+    def test_tags_display_in_sync(self):
+        """Test that the displayed tag names follow tag changes"""
+        milk = sample_item(self.user, 'Milk')
+        add_tag_to_item(milk, ['fresh', 'dairy'])
+        milk.refresh_from_db()
+        self.assertEqual(milk.tags_display, 'dairy, fresh')
+        set_item_tags(milk, ['fresh'])
+        milk.refresh_from_db()
+        self.assertEqual(milk.tags_display, 'fresh')
+        Category.objects.get(name='fresh').delete()
+        milk.refresh_from_db()
+        self.assertEqual(milk.tags_display, '')
+
+    def test_item_catalog_query_count_constant(self):
+        """Test that the item catalog page and API don't query the tags
+        of each item"""
+        self.user.is_active = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        def count_queries():
+            counts = []
+            for url in (ITEMS_PAGE_URL, ITEMS_URL):
+                with CaptureQueriesContext(connection) as queries:
+                    res = self.client.get(url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                counts.append(len(queries))
+            return counts
+
+        def create_items(count):
+            items = Item.objects.bulk_create([
+                Item(user=self.user, name=f'Item {i}') for i in range(count)
+            ])
+            for item in items:
+                add_tag_to_item(item, ['dairy', 'fresh'])
+
+        create_items(1)
+        small = count_queries()
+        create_items(30)
+        self.assertEqual(count_queries(), small)
+        res = self.client.get(ITEMS_PAGE_URL)
+        self.assertContains(res, 'dairy, fresh')
+
+
+class TestItemTagsCache(TransactionTestCase):
+    def tearDown(self) -> None:
+        tag_cache.clear()
+
+    def test_resolve_ids_cached_after_commit(self):
+        """Test that committed categories are resolved without queries"""
+        names = ['dairy', 'fresh']
+        with transaction.atomic():
+            ids = Category.resolve_ids(names)
+        with self.assertNumQueries(0):
+            self.assertEqual(Category.resolve_ids(names), ids)
+
+    def test_resolve_ids_not_cached_after_rollback(self):
+        """Test that categories created in a rolled back transaction are
+        not cached"""
+        try:
+            with transaction.atomic():
+                Category.resolve_ids(['dairy'])
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertNotIn('dairy', tag_cache)
+        category_id, = Category.resolve_ids(['dairy'])
+        self.assertTrue(Category.objects.filter(pk=category_id).exists())
+
+
+class TestItemDeduplicationPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+
+    def test_save_list_reuses_items_by_name(self):
+        """Test that new list items reuse the user's items with the same
+        normalized name"""
+        milk = sample_item(self.user, 'Milk', price=2)
+        sample_item(sample_user('other@shoppero.com'), 'Eggs')
+        payload = {'name': 'List', 'items': [
+            {'name': ' MILK '},
+            {'name': 'Eggs', 'price': 3},
+            {'name': 'eggs'},
+        ]}
+        res = self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        links = ShoppingList.objects.get(user=self.user) \
+            .shoppinglistitem_set.order_by('id')
+        self.assertEqual(links[0].item_id, milk.id)
+        self.assertEqual(links[0].price, 2)
+        self.assertEqual(links[1].item_id, links[2].item_id)
+        self.assertEqual(self.user.item_set.count(), 2)
+        self.assertEqual(links[1].item.normalized_name, 'eggs')
+
+    def test_merge_duplicate_items(self):
+        """Test that the merge command moves links, tags, price history and
+        usage to the oldest item and soft deletes the duplicates"""
+        milk = sample_item(self.user, 'Milk')
+        duplicate = sample_item(self.user, 'milk')
+        other = sample_item(sample_user('other@shoppero.com'), 'Milk')
+        add_tag_to_item(duplicate, ['dairy'])
+        shopping_list = ShoppingList.objects.create(user=self.user)
+        link = ShoppingListItem.objects.create(shopping_list=shopping_list,
+                                               item=duplicate)
+        ItemUsage.record([milk.id, duplicate.id])
+        ItemPriceHistory.record([(duplicate.id, 3, shopping_list.id)],
+                                ItemPriceHistory.LIST)
+
+        out = StringIO()
+        call_command('merge_duplicate_items', '--batch-size', '1',
+                     stdout=out)
+        self.assertIn('Merged 1 duplicate items in 1 groups', out.getvalue())
+        link.refresh_from_db()
+        duplicate.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(link.item_id, milk.id)
+        self.assertIsNotNone(duplicate.deleted)
+        self.assertIsNone(other.deleted)
+        self.assertEqual([x.name for x in milk.tags.all()], ['dairy'])
+        milk.refresh_from_db()
+        self.assertEqual(milk.tags_display, 'dairy')
+        self.assertEqual(ItemUsage.objects.get(item=milk).use_count, 2)
+        self.assertFalse(ItemUsage.objects.filter(item=duplicate).exists())
+        self.assertEqual(ItemPriceHistory.last_paid_prices([milk.id])
+                         [milk.id][0], 3)
+        self.assertFalse(duplicate.price_history.exists())
+
+    def test_benchmark_list_save(self):
+        """Test that the benchmark command reports every size and rolls
+        back the lists it saved"""
+        out = StringIO()
+        call_command('benchmark_list_save', '--sizes', '1', '5',
+                     '--repeat', '2', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([x.split(' items')[0].split() for x in lines], [
+            ['create', '1'], ['update', '1'], ['create', '5'], ['update', '5']
+        ])
+        self.assertFalse(ShoppingList.objects.exists())
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+
+class TestShoppingListSummaryPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.milk = sample_item(self.user, 'Milk', price=2)
+        self.bread = sample_item(self.user, 'Bread', price=1)
+        payload = {'name': 'List', 'items': [
+            {'item_id': self.milk.id, 'name': 'Milk', 'quantity': 2},
+            {'item_id': self.bread.id, 'name': 'Bread', 'is_done': True},
+        ]}
+        self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.shopping_list = ShoppingList.objects.get(user=self.user)
+
+    def _overview(self):
+        return [(x['shopping_list__name'], x['item_count'],
+                 x['complete_item_count'], float(x['total_price']))
+                for x in get_shopping_list_items_queryset(self.user.id)]
+
+    def test_summary_maintained(self):
+        """Test that the overview reflects list and item changes"""
+        self.assertEqual(self._overview(), [('List', 2, 1, 5.0)])
+        link = self.shopping_list.shoppinglistitem_set.get(item=self.milk)
+        url = reverse('api_shopping_list_operations',
+                      args=[self.shopping_list.id])
+        self.client.patch(url, {'operations': [
+            {'op': 'toggle', 'link_id': link.id, 'is_done': True},
+        ]}, format='json')
+        self.assertEqual(self._overview(), [('List', 2, 2, 5.0)])
+        self.milk.price = 3
+        self.milk.save()
+        self.assertEqual(self._overview(), [('List', 2, 2, 7.0)])
+        self.client.patch(url, {'operations': [
+            {'op': 'remove', 'link_id': link.id},
+        ]}, format='json')
+        self.assertEqual(self._overview(), [('List', 1, 1, 1.0)])
+        self.shopping_list.soft_delete()
+        self.assertEqual(self._overview(), [])
+
+    def test_summary_deltas_match_refresh(self):
+        """Test that the summary updated by differences matches a
+        recomputed summary"""
+        milk, bread = self.shopping_list.shoppinglistitem_set \
+            .order_by('id')
+        url = reverse('api_shopping_list_operations',
+                      args=[self.shopping_list.id])
+        self.client.patch(url, {'operations': [
+            {'op': 'toggle', 'link_id': milk.id, 'is_done': True},
+            {'op': 'toggle', 'link_id': milk.id, 'is_done': True},
+            {'op': 'toggle', 'link_id': bread.id, 'is_done': False},
+            {'op': 'set_quantity', 'link_id': bread.id, 'quantity': 3},
+            {'op': 'toggle', 'link_id': bread.id, 'is_done': True},
+            {'op': 'add', 'name': 'Eggs', 'price': 4},
+        ]}, format='json')
+        self.assertEqual(self._overview(), [('List', 3, 2, 11.0)])
+        ShoppingListSummary.refresh([self.shopping_list.id])
+        self.assertEqual(self._overview(), [('List', 3, 2, 11.0)])
+
+    def test_toggle_updates_summary_only(self):
+        """Test that a toggle changes the summary with a single UPDATE
+        without reading the items of the list"""
+        link = self.shopping_list.shoppinglistitem_set.get(item=self.milk)
+        url = reverse('api_shopping_list_operations',
+                      args=[self.shopping_list.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(url, {'operations': [
+                {'op': 'toggle', 'link_id': link.id, 'is_done': True},
+            ]}, format='json')
+        summary = [x['sql'] for x in queries
+                   if 'shopping_list_summary' in x['sql']]
+        self.assertEqual(len(summary), 1)
+        self.assertTrue(summary[0].lstrip().startswith('UPDATE'))
+        self.assertFalse([x for x in queries
+                          if x['sql'].startswith('SELECT')
+                          and 'FROM "shopping_list_item"'
+                          in x['sql']])
+        self.assertEqual(self._overview(), [('List', 2, 2, 5.0)])
+
+    def test_item_rename_skips_summary(self):
+        """Test that saving an item without a price change bumps the list
+        versions with one query and doesn't touch the summaries"""
+        self.milk.name = 'Whole milk'
+        with CaptureQueriesContext(connection) as queries:
+            self.milk.save()
+        self.assertFalse([x for x in queries
+                          if 'shopping_list_summary' in x['sql']])
+        self.assertEqual(len([x for x in queries
+                              if 'FROM "shopping_list_item"' in x['sql']]),
+                         1)
+        self.milk.price = Decimal('2.5')
+        self.milk.save()
+        self.assertEqual(self._overview(), [('List', 2, 1, 6.0)])
+        ShoppingListSummary.refresh([self.shopping_list.id])
+        self.assertEqual(self._overview(), [('List', 2, 1, 6.0)])
+
+    def test_overview_single_query(self):
+        """Test that the overview is read with a single query"""
+        with self.assertNumQueries(1):
+            self._overview()
+
+    def test_verify_and_rebuild_command(self):
+        """Test that the command detects outdated summaries and rebuilds
+        them"""
+        out = StringIO()
+        call_command('rebuild_list_summaries', '--verify', stdout=out)
+        self.assertIn('All 1 shopping list summaries', out.getvalue())
+        ShoppingListSummary.objects.update(item_count=10)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_list_summaries', '--verify', stdout=out)
+        call_command('rebuild_list_summaries', '--batch-size', '1',
+                     stdout=out)
+        self.assertEqual(self._overview(), [('List', 2, 1, 5.0)])
+
+    def test_archive_returns_delta(self):
+        """Test that archiving a list returns the removed ID and the new
+        overview version, and the full overview only when asked for"""
+        url = reverse('api_shopping_list_single',
+                      args=[self.shopping_list.id])
+        res = self.client.patch(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['removed'], self.shopping_list.id)
+        self.assertNotIn('content', res.data)
+        overview = self.client.get(LIST_CREATE_URL)
+        self.assertEqual(overview['ETag'], f'"{res.data["version"]}"')
+
+        other = ShoppingList.objects.create(user=self.user, name='Other')
+        ShoppingListItem.objects.create(shopping_list=other, item=self.milk)
+        url = reverse('api_shopping_list_single', args=[other.id])
+        res = self.client.delete(url + '?full=1')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['removed'], other.id)
+        self.assertEqual(res.data['content'], [])
+
+
+class TestSpendingStatisticsPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.milk = sample_item(self.user, 'Milk', price=2)
+        self.bread = sample_item(self.user, 'Bread', price=1)
+        add_tag_to_item(self.milk, ['dairy'])
+        payload = {'name': 'List', 'items': [
+            {'item_id': self.milk.id, 'name': 'Milk', 'quantity': 2},
+            {'item_id': self.bread.id, 'name': 'Bread'},
+        ]}
+        self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.shopping_list = ShoppingList.objects.get(user=self.user)
+
+    def _rollups(self):
+        return [
+            [(x.item_count, float(x.total_spent))
+             for x in model.objects.filter(user=self.user)]
+            for model in (DailySpending, MonthlySpending)
+        ]
+
+    def test_rollups_maintained(self):
+        """Test that the rollups follow list creation, changes and
+        deletion"""
+        self.assertEqual(self._rollups(), [[(2, 5.0)], [(2, 5.0)]])
+        dairy = CategorySpending.objects.get(user=self.user,
+                                             category__name='dairy')
+        self.assertEqual((dairy.item_count, float(dairy.total_spent)),
+                         (1, 4.0))
+
+        link = self.shopping_list.shoppinglistitem_set.get(item=self.milk)
+        url = reverse('api_shopping_list_operations',
+                      args=[self.shopping_list.id])
+        self.client.patch(url, {'operations': [
+            {'op': 'remove', 'link_id': link.id},
+        ]}, format='json')
+        self.assertEqual(self._rollups(), [[(1, 1.0)], [(1, 1.0)]])
+
+        url = reverse('api_shopping_list_single',
+                      args=[self.shopping_list.id])
+        self.client.delete(url)
+        self.assertEqual(self._rollups(), [[], []])
+
+    def _all_rollups(self):
+        return [sorted(
+            (x.period, getattr(x, 'category_id', None) or 0, x.item_count,
+             float(x.total_spent)) for x in model.objects.all()
+        ) for model in (DailySpending, MonthlySpending, CategorySpending)]
+
+    def test_rollup_deltas_match_rebuild(self):
+        """Test that the rollups updated by differences are the same as
+        rebuilt ones after items, tags and categories change"""
+        link = self.shopping_list.shoppinglistitem_set.get(item=self.bread)
+        url = reverse('api_shopping_list_operations',
+                      args=[self.shopping_list.id])
+        self.client.patch(url, {'operations': [
+            {'op': 'set_quantity', 'link_id': link.id, 'quantity': 3},
+            {'op': 'add', 'name': 'Eggs', 'price': 4},
+        ]}, format='json')
+        add_tag_to_item(self.bread, ['bakery', 'dairy'])
+        Category.objects.get(name='dairy').delete()
+        other = ShoppingList.objects.create(user=self.user, name='Other')
+        ShoppingListItem.objects.create(shopping_list=other, item=self.milk,
+                                        quantity=2)
+        other.delete()
+        updated = self._all_rollups()
+
+        call_command('backfill_spending_rollups', stdout=StringIO())
+        self.assertEqual(updated, self._all_rollups())
+        self.assertEqual(self._rollups(), [[(3, 11.0)], [(3, 11.0)]])
+
+    def test_toggle_skips_rollups(self):
+        """Test that toggling an item doesn't touch the rollups"""
+        link = self.shopping_list.shoppinglistitem_set.get(item=self.milk)
+        url = reverse('api_shopping_list_operations',
+                      args=[self.shopping_list.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(url, {'operations': [
+                {'op': 'toggle', 'link_id': link.id, 'is_done': True},
+            ]}, format='json')
+        self.assertFalse(any('spending_' in x['sql']
+                             for x in queries.captured_queries))
+
+    def test_apply_deltas_upserts(self):
+        """Test that differences are added to existing rows, including rows
+        without a category, instead of inserting duplicates"""
+        month = MonthlySpending.objects.get(user=self.user).period
+        for _ in range(2):
+            CategorySpending.apply_deltas({
+                (self.user.id, month, None): [1, 2],
+            })
+        untagged = CategorySpending.objects.get(user=self.user,
+                                                category__isnull=True)
+        self.assertEqual((untagged.item_count, float(untagged.total_spent)),
+                         (3, 5.0))
+        CategorySpending.apply_deltas({
+            (self.user.id, month, None): [-3, -5],
+        })
+        self.assertFalse(CategorySpending.objects.filter(
+            user=self.user, category__isnull=True
+        ).exists())
+
+    def test_backfill_command(self):
+        """Test that the backfill command rebuilds missing rollups"""
+        for model in (DailySpending, MonthlySpending, CategorySpending):
+            model.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_spending_rollups', '--batch-size', '1',
+                     stdout=out)
+        self.assertIn('of 1 users', out.getvalue())
+        self.assertEqual(self._rollups(), [[(2, 5.0)], [(2, 5.0)]])
+        self.assertEqual(CategorySpending.objects.count(), 2)
+
+    def test_statistics_endpoint(self):
+        """Test that the endpoint returns the spending statistics"""
+        res = self.client.get(STATISTICS_URL, {'months': 3})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['daily']), 1)
+        self.assertEqual(res.data['monthly'][0]['item_count'], 2)
+        self.assertEqual(float(res.data['monthly'][0]['total_spent']), 5.0)
+        self.assertEqual([x['name'] for x in res.data['top_categories']],
+                         ['dairy'])
+
+        res = self.client.get(STATISTICS_URL, {'months': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_statistics_queries_independent_of_history(self):
+        """Test that the endpoint doesn't read more with more lists"""
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(STATISTICS_URL)
+        for i in range(5):
+            self.client.post(LIST_CREATE_URL, {'name': f'List {i}', 'items': [
+                {'item_id': self.bread.id, 'name': 'Bread'},
+            ]}, format='json')
+        with CaptureQueriesContext(connection) as after:
+            res = self.client.get(STATISTICS_URL)
+        self.assertEqual(len(after), len(before))
+        self.assertEqual(res.data['monthly'][0]['item_count'], 7)
+        self.assertFalse(any('shopping_list_item' in x['sql']
+                             for x in after.captured_queries))
+
+
+class TestItemPriceHistoryPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.milk = sample_item(self.user, 'Milk', price=2)
+        price_cache.clear()
+
+    def _create_list(self, price):
+        payload = {'name': 'List', 'items': [
+            {'item_id': self.milk.id, 'name': 'Milk', 'price': price},
+        ]}
+        self.client.post(LIST_CREATE_URL, payload, format='json')
+
+    def _history(self, source):
+        return [float(x.price) for x in ItemPriceHistory.between(
+            self.milk.id
+        ).filter(source=source)]
+
+    def test_history_is_compact(self):
+        """Test that only changed prices are recorded"""
+        self.milk.save()
+        self.milk.price = 3
+        self.milk.save()
+        self.assertEqual(self._history(ItemPriceHistory.ITEM), [2.0, 3.0])
+        self._create_list(4)
+        self._create_list(4)
+        self._create_list(5)
+        self.assertEqual(self._history(ItemPriceHistory.LIST), [4.0, 5.0])
+
+    def test_last_paid_prices_bulk(self):
+        """Test that the last paid prices are fetched with one query"""
+        bread = sample_item(self.user, 'Bread', price=1)
+        self._create_list(4)
+        with self.assertNumQueries(1):
+            prices = ItemPriceHistory.last_paid_prices([self.milk.id,
+                                                        bread.id])
+        self.assertEqual(list(prices), [self.milk.id])
+        self.assertEqual(float(prices[self.milk.id][0]), 4.0)
+
+    def test_prices_endpoints(self):
+        """Test the last prices and price history endpoints, limited to
+        accessible items"""
+        other = sample_item(sample_user('other@shoppero.com'), 'Eggs')
+        self._create_list(4)
+        res = self.client.get(ITEM_PRICES_URL,
+                              {'ids': f'{self.milk.id},{other.id}'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data['prices']), [self.milk.id])
+
+        res = self.client.get(ITEM_PRICES_URL, {'ids': 'a'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        url = reverse('api_item_price_history', args=[self.milk.id])
+        res = self.client.get(url)
+        self.assertEqual([x['source'] for x in res.data], ['item', 'list'])
+        res = self.client.get(url, {'since': '2999-01-01T00:00:00Z'})
+        self.assertEqual(res.data, [])
+        url = reverse('api_item_price_history', args=[other.id])
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+
+class TestItemPriceCache(TransactionTestCase):
+    def tearDown(self) -> None:
+        price_cache.clear()
+
+    def test_last_paid_prices_cached_after_commit(self):
+        """Test that committed last prices are served from the cache until
+        a new price is paid"""
+        user = sample_user()
+        milk = sample_item(user, 'Milk')
+        bread = sample_item(user, 'Bread')
+        shopping_list = ShoppingList.objects.create(user=user, name='List')
+        ShoppingListItem.objects.create(shopping_list=shopping_list,
+                                        item=milk, price=4)
+        with transaction.atomic():
+            ItemPriceHistory.last_paid_prices([milk.id, bread.id])
+        with self.assertNumQueries(0):
+            prices = ItemPriceHistory.last_paid_prices([milk.id, bread.id])
+        self.assertEqual(float(prices[milk.id][0]), 4.0)
+        self.assertNotIn(bread.id, prices)
+
+        ShoppingListItem.objects.create(shopping_list=shopping_list,
+                                        item=milk, price=6)
+        prices = ItemPriceHistory.last_paid_prices([milk.id])
+        self.assertEqual(float(prices[milk.id][0]), 6.0)
+
+
+class TestShoppingListDetailPagePrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.shopping_list = ShoppingList.objects.create(user=self.user,
+                                                         name='List')
+        SharedShoppingList.objects.create(shopping_list=self.shopping_list,
+                                          email='friend@shoppero.com')
+        self.url = reverse('shopping_list_single',
+                           args=[self.shopping_list.id])
+        fragment_cache.clear()
+
+    def _add_items(self, count):
+        items = Item.objects.bulk_create([
+            Item(user=self.user, name=f'Item {i}') for i in range(count)
+        ])
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(shopping_list=self.shopping_list, item=x)
+            for x in items
+        ])
+        list_items_changed.send(sender=ShoppingList,
+                                list_ids=[self.shopping_list.id])
+
+    def test_detail_page_query_count_constant(self):
+        """Test that the detail page query count doesn't depend on the
+        number of items"""
+        self._add_items(1)
+        with CaptureQueriesContext(connection) as small:
+            res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self._add_items(30)
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.get(self.url)
+        self.assertEqual(len(large), len(small))
+        self.assertContains(res, 'Item 29')
+        self.assertContains(res, 'friend@shoppero.com')
+
+    def test_detail_page_hides_deleted(self):
+        """Test that soft deleted items and shares are not shown"""
+        self._add_items(2)
+        ShoppingListItem.objects.filter(item__name='Item 0') \
+            .update(deleted=timezone.now())
+        SharedShoppingList.objects.update(deleted=timezone.now())
+        res = self.client.get(self.url)
+        self.assertNotContains(res, 'Item 0')
+        self.assertContains(res, 'Item 1')
+        self.assertNotContains(res, 'friend@shoppero.com')
+
+    def test_detail_page_of_other_user(self):
+        """Test that lists of other users are not found"""
+        other = sample_user('other@shoppero.com')
+        other.is_active = True
+        other.save()
+        self.client.force_login(other)
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestFragmentCachePrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.milk = sample_item(self.user, 'Milk', price=2)
+        payload = {'name': 'List', 'items': [
+            {'item_id': self.milk.id, 'name': 'Milk'},
+        ]}
+        self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.shopping_list = ShoppingList.objects.get(user=self.user)
+        fragment_cache.clear()
+
+    def test_list_table_cached_until_changed(self):
+        """Test that a repeated detail page view reuses the rendered table
+        and skips the items query, and that changes show up at once"""
+        url = reverse('shopping_list_single', args=[self.shopping_list.id])
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            res = self.client.get(url)
+        self.assertLess(len(second), len(first))
+        self.assertContains(res, 'Milk')
+        self.assertEqual(fragment_cache.stats()['hits'], 1)
+
+        self.milk.name = 'Oat milk'
+        self.milk.save()
+        self.assertContains(self.client.get(url), 'Oat milk')
+
+    def test_item_rows_and_overview_rows_cached(self):
+        """Test that catalog and overview rows are cached by version"""
+        self.client.get(ITEMS_PAGE_URL)
+        self.client.get(reverse('shopping_list'))
+        self.assertEqual(fragment_cache.stats()['misses'], 2)
+        self.client.get(ITEMS_PAGE_URL)
+        self.client.get(reverse('shopping_list'))
+        self.assertEqual(fragment_cache.stats()['hits'], 2)
+
+        add_tag_to_item(self.milk, ['dairy'])
+        self.assertContains(self.client.get(ITEMS_PAGE_URL), 'dairy')
+        self.milk.price = 3
+        self.milk.save()
+        self.assertContains(self.client.get(reverse('shopping_list')),
+                            '3.00')
+
+    def test_cache_stats_for_staff_only(self):
+        """Test that the cache counters are only shown to staff users"""
+        url = reverse('api_cache_stats')
+        self.assertEqual(self.client.get(url).status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', res.data['fragments'])
+
+
+class TestSoftDeleteManagersPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.milk = sample_item(self.user, 'Milk')
+        self.bread = sample_item(self.user, 'Bread')
+        self.shopping_list = ShoppingList.objects.create(user=self.user,
+                                                         name='List')
+
+    def test_default_manager_hides_soft_deleted(self):
+        """Test that objects and related managers skip soft deleted rows
+        and all_objects doesn't"""
+        link = ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, item=self.bread
+        )
+        self.milk.soft_delete()
+        link.soft_delete()
+        self.assertEqual(list(Item.objects.filter(user=self.user)),
+                         [self.bread])
+        self.assertEqual(Item.all_objects.filter(user=self.user).count(), 2)
+        self.assertEqual(list(self.user.item_set.all()), [self.bread])
+        self.assertFalse(self.shopping_list.shoppinglistitem_set.exists())
+        self.assertEqual(link.item, self.bread)
+
+    def test_soft_deleted_item_not_added(self):
+        """Test that a soft deleted item can't be added to a list"""
+        self.milk.soft_delete()
+        payload = {'name': 'List', 'items': [
+            {'item_id': self.milk.id, 'name': 'Milk'},
+        ]}
+        res = self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors']['items'][0]['item_id'],
+                         ['Invalid Item PK value'])
+
+    def test_archived_list_not_found(self):
+        """Test that an archived list can't be changed"""
+        self.shopping_list.soft_delete()
+        url = reverse('api_shopping_list_operations',
+                      args=[self.shopping_list.id])
+        res = self.client.patch(url, {'operations': [
+            {'op': 'rename', 'name': 'New'},
+        ]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_queryset_soft_delete_cascades(self):
+        """Test that a queryset soft delete marks the lists and their live
+        children with one update per table, and undelete restores only the
+        children deleted with the lists"""
+        link = ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, item=self.milk
+        )
+        removed = ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, item=self.bread
+        )
+        removed.soft_delete()
+        share = SharedShoppingList.objects.create(
+            shopping_list=self.shopping_list, email='friend@shoppero.com'
+        )
+        lists = ShoppingList.objects.filter(user=self.user)
+        with self.assertNumQueries(3):
+            self.assertEqual(lists.soft_delete(), 1)
+        self.assertFalse(ShoppingListItem.objects.exists())
+        self.assertFalse(SharedShoppingList.objects.exists())
+
+        with self.assertNumQueries(3):
+            self.assertEqual(ShoppingList.all_objects.undelete(), 1)
+        self.assertEqual(list(ShoppingListItem.objects.all()), [link])
+        self.assertEqual(list(SharedShoppingList.objects.all()), [share])
+        self.assertIsNotNone(
+            ShoppingListItem.all_objects.get(pk=removed.id).deleted
+        )
+
+    def test_user_soft_delete_cascades(self):
+        """Test that soft deleting a user soft deletes their lists, items
+        and the items of their lists"""
+        ShoppingListItem.objects.create(shopping_list=self.shopping_list,
+                                        item=self.milk)
+        self.user.soft_delete()
+        self.assertFalse(ShoppingList.objects.exists())
+        self.assertFalse(Item.objects.exists())
+        self.assertFalse(ShoppingListItem.objects.exists())
+        self.assertEqual(
+            set(ShoppingList.all_objects.values_list('deleted', flat=True)),
+            {self.user.deleted}
+        )
+
+        self.user.undelete()
+        self.assertEqual(Item.objects.count(), 2)
+        self.assertEqual(ShoppingListItem.objects.count(), 1)
+
+    def test_partial_indexes(self):
+        """Test that the live rows of every soft delete table are indexed"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tablename FROM pg_indexes "
+                "WHERE indexdef LIKE '%%WHERE (deleted IS NULL)'"
+            )
+            tables = {x[0] for x in cursor.fetchall()}
+        self.assertTrue({'item', 'shopping_list', 'shopping_list_item',
+                         'shared_shopping_list'} <= tables)
+
+
+class TestPurgeSoftDeletedPrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.shopping_list = ShoppingList.objects.create(user=self.user,
+                                                         name='List')
+        self.old = timezone.now() - timedelta(days=40)
+
+    def test_purge_old_tombstones(self):
+        """Test that only old soft deleted rows are purged and items still
+        on a list are kept"""
+        linked = sample_item(self.user, 'Milk')
+        old = sample_item(self.user, 'Bread')
+        recent = sample_item(self.user, 'Eggs')
+        alive = sample_item(self.user, 'Cheese')
+        ShoppingListItem.objects.create(shopping_list=self.shopping_list,
+                                        item=linked)
+        dead_link = ShoppingListItem.objects.create(
+            shopping_list=self.shopping_list, item=alive, deleted=self.old
+        )
+        Item.objects.filter(pk__in=[linked.id, old.id]) \
+            .update(deleted=self.old)
+        recent.soft_delete()
+
+        out = StringIO()
+        call_command('purge_soft_deleted', '--dry-run', stdout=out)
+        self.assertIn('Would purge 2 rows', out.getvalue())
+        self.assertEqual(Item.all_objects.count(), 4)
+
+        call_command('purge_soft_deleted', '--older-than', '30',
+                     '--batch-size', '1', '--sleep', '0', stdout=out)
+        self.assertIn('Purged 2 rows', out.getvalue())
+        self.assertEqual(
+            set(Item.all_objects.values_list('name', flat=True)),
+            {'Milk', 'Eggs', 'Cheese'}
+        )
+        self.assertFalse(
+            ShoppingListItem.all_objects.filter(pk=dead_link.id).exists()
+        )
+        self.assertEqual(
+            ShoppingListSummary.objects.get(
+                shopping_list=self.shopping_list
+            ).item_count, 1
+        )
+
+    def test_purge_soft_deleted_user(self):
+        """Test that the rows owned by a purged user are purged in batches
+        before the user, and counted with the user"""
+        other = sample_user('other@shoppero.com')
+        other_list = ShoppingList.objects.create(user=other, name='Other')
+        ShoppingListItem.objects.create(shopping_list=other_list,
+                                        item=sample_item(other, 'Bread'))
+        for name in ('Milk', 'Eggs', 'Cheese'):
+            item = sample_item(self.user, name)
+            add_tag_to_item(item, ['Dairy'])
+            ShoppingListItem.objects.create(shopping_list=self.shopping_list,
+                                            item=item, price=1)
+        archived = ShoppingList.objects.create(user=self.user, name='Old')
+        ShoppingListItem.objects.create(shopping_list=archived, item=item)
+        archived.soft_delete()
+        ArchivedShoppingList.archive_lists([archived.pk])
+        self.user.soft_delete()
+        get_user_model().all_objects.filter(pk=self.user.pk) \
+            .update(deleted=self.old)
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_soft_deleted', '--batch-size', '2',
+                         '--sleep', '0', stdout=out)
+        self.assertFalse(get_user_model().all_objects
+                         .filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Item.all_objects.values_list('name',
+                                                           flat=True)),
+                         ['Bread'])
+        self.assertEqual(list(ShoppingList.all_objects.all()), [other_list])
+        self.assertEqual(ShoppingListItem.all_objects.get().shopping_list,
+                         other_list)
+        self.assertFalse(ArchivedShoppingList.objects.exists())
+        self.assertFalse(DailySpending.objects.filter(
+            user_id=self.user.pk).exists())
+        item_deletes = [x for x in queries
+                        if x['sql'].startswith('DELETE FROM "item" ')]
+        self.assertEqual(len(item_deletes), 2)
+        self.assertIn('account_user: 22 rows', out.getvalue())
+
+    def test_purge_user_items_on_other_users_lists(self):
+        """Test that purging a user removes their items from the lists of
+        other users with the summary, spending and version updated"""
+        other = sample_user('other@shoppero.com')
+        other_list = ShoppingList.objects.create(user=other, name='Shared')
+        SharedShoppingList.objects.create(shopping_list=other_list,
+                                          user=self.user,
+                                          access_level='all')
+        ShoppingListItem.objects.create(
+            shopping_list=other_list, item=sample_item(other, 'Bread'),
+            price=1
+        )
+        ShoppingListItem.objects.create(
+            shopping_list=other_list,
+            item=sample_item(self.user, 'Milk', price=2), price=2
+        )
+        other_list.refresh_from_db()
+        version = other_list.version
+        self.user.soft_delete()
+        get_user_model().all_objects.filter(pk=self.user.pk) \
+            .update(deleted=self.old)
+
+        call_command('purge_soft_deleted', '--sleep', '0', stdout=StringIO())
+        other_list.refresh_from_db()
+        self.assertGreater(other_list.version, version)
+        self.assertEqual(
+            [x.item.name for x in other_list.shoppinglistitem_set.all()],
+            ['Bread']
+        )
+        summary = ShoppingListSummary.objects.get(shopping_list=other_list)
+        self.assertEqual((summary.item_count, float(summary.total_price)),
+                         (1, 0.0))
+        ShoppingListSummary.refresh([other_list.pk])
+        summary.refresh_from_db()
+        self.assertEqual((summary.item_count, float(summary.total_price)),
+                         (1, 0.0))
+        self.assertEqual(
+            list(DailySpending.objects.filter(user=other).values_list(
+                'item_count', 'total_spent')),
+            [(1, 1)]
+        )
+
+
+class TestShoppingListArchivePrivate(TestCase):
+    def setUp(self) -> None:
+        self.user = sample_user()
+        self.user.is_active = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.milk = sample_item(self.user, 'Milk', price=2)
+        payload = {'name': 'List', 'items': [
+            {'item_id': self.milk.id, 'name': 'Milk', 'quantity': 2},
+        ]}
+        self.client.post(LIST_CREATE_URL, payload, format='json')
+        self.shopping_list = ShoppingList.objects.get(user=self.user)
+
+    def _archive(self):
+        url = reverse('api_shopping_list_single',
+                      args=[self.shopping_list.id])
+        return self.client.patch(url)
+
+    def test_archive_moves_list(self):
+        """Test that archiving moves the list and its items to the archive
+        tables and keeps the spending statistics"""
+        res = self._archive()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(ShoppingList.all_objects.exists())
+        self.assertFalse(ShoppingListItem.all_objects.exists())
+        archived = ArchivedShoppingList.objects.get(pk=self.shopping_list.id)
+        self.assertEqual((archived.name, archived.item_count,
+                          float(archived.total_price)), ('List', 1, 4.0))
+        self.assertEqual(
+            list(archived.items.values_list('item_id', 'name', 'quantity')),
+            [(self.milk.id, 'Milk', 2)]
+        )
+        monthly = MonthlySpending.objects.get(user=self.user)
+        self.assertEqual((monthly.item_count, float(monthly.total_spent)),
+                         (1, 4.0))
+
+    def test_archive_api(self):
+        """Test that the archived lists are listed without items and a
+        single archived list is returned with its items"""
+        self._archive()
+        res = self.client.get(ARCHIVE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['next'])
+        self.assertEqual([x['id'] for x in res.data['results']],
+                         [self.shopping_list.id])
+        self.assertNotIn('items', res.data['results'][0])
+
+        res = self.client.get(res.data['results'][0]['url'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([x['name'] for x in res.data['items']], ['Milk'])
+
+    def test_archive_of_other_user_not_found(self):
+        """Test that an archived list of another user can't be read"""
+        self._archive()
+        other = sample_user('other@shoppero.com')
+        other.is_active = True
+        other.save()
+        self.client.force_login(other)
+        res = self.client.get(ARCHIVE_URL)
+        self.assertEqual(res.data['results'], [])
+        url = reverse('api_shopping_list_archive_single',
+                      args=[self.shopping_list.id])
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_archive_command(self):
+        """Test that the command moves previously soft deleted lists and
+        that they are not purged"""
+        ShoppingList.all_objects.update(
+            deleted=timezone.now() - timedelta(days=40)
+        )
+        call_command('purge_soft_deleted', '--sleep', '0',
+                     stdout=StringIO())
+        self.assertTrue(ShoppingList.all_objects.exists())
+
+        out = StringIO()
+        call_command('archive_shopping_lists', '--batch-size', '1',
+                     stdout=out)
+        self.assertIn('Archived 1 shopping lists', out.getvalue())
+        self.assertFalse(ShoppingList.all_objects.exists())
+        self.assertEqual(ArchivedShoppingListItem.objects.count(), 1)
+
+    def test_purge_archived_item(self):
+        """Test that a soft deleted item only kept by an archived list is
+        purged and the archive keeps its name"""
+        self._archive()
+        self.milk.soft_delete()
+        Item.all_objects.update(deleted=timezone.now() - timedelta(days=40))
+        call_command('purge_soft_deleted', '--sleep', '0',
+                     stdout=StringIO())
+        self.assertFalse(Item.all_objects.exists())
+        self.assertEqual(
+            list(ArchivedShoppingListItem.objects.values_list('item_id',
+                                                              'name')),
+            [(None, 'Milk')]
+        )
@@ -1,18 +1,36 @@
 from django.urls import path
 
-from shopping_list.views import ShoppingListViewSet, ItemViewSet
+from shopping_list.views import ShoppingListViewSet, ItemViewSet, \
+    SearchViewSet, StatisticsViewSet, CacheStatsViewSet, \
+    ShoppingListArchiveViewSet
 
 urlpatterns = [
     path('lists/',
-         ShoppingListViewSet.as_view({'post': 'create'}),
+         ShoppingListViewSet.as_view({'get': 'list', 'post': 'create'}),
          name='api_shopping_list_create'),
+    path('lists/import/',
+         ShoppingListViewSet.as_view({'post': 'ingest'}),
+         name='api_shopping_list_import'),
+    path('lists/<int:pk>/import/',
+         ShoppingListViewSet.as_view({'post': 'ingest'}),
+         name='api_shopping_list_import_into'),
+    path('lists/archive/',
+         ShoppingListArchiveViewSet.as_view({'get': 'list'}),
+         name='api_shopping_list_archive'),
+    path('lists/archive/<int:pk>/',
+         ShoppingListArchiveViewSet.as_view({'get': 'retrieve'}),
+         name='api_shopping_list_archive_single'),
     path('lists/<int:pk>/',
          ShoppingListViewSet.as_view({
+             'get': 'retrieve',
              'put': 'update',
              'patch': 'archive',
              'delete': 'delete'
          }),
          name='api_shopping_list_single'),
+    path('lists/<int:pk>/items/',
+         ShoppingListViewSet.as_view({'patch': 'operations'}),
+         name='api_shopping_list_operations'),
     path('items/',
          ItemViewSet.as_view({
              'get': 'list',
@@ -30,5 +48,24 @@ urlpatterns = [
          ItemViewSet.as_view({
              'get': 'autocomplete'
          }),
-         name='api_item_autocomplete')
+         name='api_item_autocomplete'),
+    path('items/prices/',
+         ItemViewSet.as_view({
+             'get': 'last_prices'
+         }),
+         name='api_item_prices'),
+    path('items/<int:pk>/prices/',
+         ItemViewSet.as_view({
+             'get': 'price_history'
+         }),
+         name='api_item_price_history'),
+    path('search/',
+         SearchViewSet.as_view({'get': 'list'}),
+         name='api_search'),
+    path('statistics/',
+         StatisticsViewSet.as_view({'get': 'list'}),
+         name='api_statistics'),
+    path('cache-stats/',
+         CacheStatsViewSet.as_view({'get': 'list'}),
+         name='api_cache_stats'),
 ]
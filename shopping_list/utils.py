@@ -1,23 +1,27 @@
-import logging
 from collections import Iterable
 
 from shopping_list.models import Category
 
-logger = logging.getLogger('shoppero')
-
 
 def add_tag_to_item(instance, tag_list):
-    for t in tag_list:
-        tag_query = Category.objects.filter(name=t)
-        if tag_query.exists():
-            tag = tag_query.all()[0]
-        else:
-            tag = Category.objects.create(name=t)
-        try:
-            instance.tags.add(tag)
-        except Exception as e:
-            logger.exception(e)
-    instance.save()
+    """
+    Add tags to an item, creating the missing categories
+    :param instance: Item instance
+    :param tag_list: list of tag names
+    :return: the item
+    """
+    instance.tags.add(*Category.resolve_ids(tag_list))
+    return instance
+
+
+def set_item_tags(instance, tag_list):
+    """
+    Replace the tags of an item, creating the missing categories
+    :param instance: Item instance
+    :param tag_list: list of tag names
+    :return: the item
+    """
+    instance.tags.set(Category.resolve_ids(tag_list))
     return instance
 
 
@@ -1,31 +1,62 @@
+import hashlib
+import json
 import logging
+import re
+from datetime import timedelta
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse, Http404, \
+    StreamingHttpResponse
+from django.db import transaction
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode, quote_etag, parse_etags
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
 from django.views import View
+from django.views.decorators.http import condition
 from django.views.generic import TemplateView
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet, ModelViewSet
 
+from account.models import Profile
+from shopping_list.autocomplete import autocomplete_cache, item_index, \
+    AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MIN_LENGTH
 from shopping_list.forms import ItemForm, ShoppingListForm, \
     ShoppingListItemForm, SharedShoppingListForm
-from shopping_list.models import Item, ShoppingList
-from shopping_list.querysets import get_shopping_list_items_queryset
+from shopping_list.ingest import ShoppingListIngest
+from shopping_list.models import Item, ShoppingList, ItemPriceHistory, \
+    ArchivedShoppingList, price_cache, tag_cache
+from shopping_list.pagination import SearchPagination, KeysetPaginator, \
+    ItemKeysetPagination, ArchivedShoppingListPagination, InvalidCursor, \
+    ITEM_ORDERING_FIELDS
+from shopping_list.querysets import get_shopping_list_items_queryset, \
+    get_item_autocomplete_items, get_item_autocomplete_index_queryset, \
+    get_search_queryset, get_accessible_shopping_lists_queryset, \
+    get_shopping_list_detail_items_queryset, get_daily_spending_queryset, \
+    get_monthly_spending_queryset, get_top_categories_queryset, \
+    get_accessible_items_queryset, get_shopping_list_detail
+from shopping_list.search import build_search_query
 from shopping_list.serializers import item_to_dict, \
     ShoppingListDetailsSerializer, ShoppingListSerializer, \
-    ItemAutocompleteSerializer, ItemSerializer
+    ItemAutocompleteSerializer, ItemSerializer, SearchResultSerializer, \
+    ShoppingListOperationsSerializer, ShoppingListOperationSerializer, \
+    ShoppingListItemSerializer, ArchivedShoppingListSerializer, \
+    ArchivedShoppingListDetailsSerializer
+from shopping_list.templatetags.fragment_cache import fragment_cache
 from shopping_list.utils import tags_string_to_list, add_tag_to_item
 
 logger = logging.getLogger('shoppero')
 
+SHOPPING_LIST_ETAG_RE = re.compile(r'(?:W/)?"(\d+)-(\d+)"')
+
 
 class ShoppingListView(TemplateView):
     template_name = 'shopping_list/shopping_lists.html'
@@ -63,19 +94,20 @@ class ShoppingListSingle(View):
                                                         **kwargs)
 
     def get_initial_context(self, pk):
-        s_list = get_object_or_404(ShoppingList, pk=pk, user=self.request.user,
-                                   deleted__isnull=True)
+        s_list = get_shopping_list_detail(pk, self.request.user.id)
+        if s_list is None:
+            raise Http404
         return {'list': s_list}
 
     def get(self, request, pk):
         context = self.get_initial_context(pk)
-        rendered = render(request, self.template_name, context)
-        return HttpResponse(rendered)
+        return render(request, self.template_name, context)
 
 
 class ItemListView(View):
     _template_name = 'shopping_list/item_list.html'
     _form_class = ItemForm
+    _page_size = 50
 
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
@@ -83,14 +115,25 @@ class ItemListView(View):
 
     def get(self, request, *args, **kwargs):
         logger.info('User %d requesting item list', request.user.id)
-        order_param = request.GET.get('order_by', 'id')
-        items = Item.objects.filter(
-            deleted__isnull=True,
-            user=request.user
-        ).all().order_by(
-            order_param)
-        context = {'items': items}
-        return HttpResponse(render(request, self._template_name, context))
+        queryset = Item.objects.filter(user=request.user)
+        paginator = KeysetPaginator(ITEM_ORDERING_FIELDS, self._page_size)
+        try:
+            items = paginator.paginate_queryset(queryset, request.GET)
+        except InvalidCursor:
+            raise Http404
+        next_url = None
+        if paginator.next_cursor:
+            next_url = reverse('items') + '?' + urlencode({
+                KeysetPaginator.ordering_param: paginator.ordering,
+                KeysetPaginator.cursor_param: paginator.next_cursor,
+            })
+        if request.is_ajax():
+            return JsonResponse({
+                'next': next_url,
+                'results': [item_to_dict(x) for x in items]
+            })
+        context = {'items': items, 'next_url': next_url}
+        return render(request, self._template_name, context)
 
     def post(self, request):
         logger.info('Creating new item for user %d', request.user.id)
@@ -119,15 +162,91 @@ class ItemListView(View):
         return JsonResponse(context, safe=False)
 
 
+def shopping_list_etag(request, pk, *args, **kwargs):
+    """
+    ETag of a shopping list the user can access, based on its version
+    :param request: request of the user accessing the list
+    :param pk: shopping list's ID
+    :return: ETag value or None if the list doesn't exist
+    """
+    version = get_accessible_shopping_lists_queryset(request.user.id) \
+        .filter(pk=pk).values_list('version', flat=True).first()
+    if version is None:
+        return None
+    return f'{pk}-{version}'
+
+
+def shopping_list_if_match(request, pk):
+    """
+    Check the If-Match header of a write against the version of a shopping
+    list and increase the version in the same query, so that only one of
+    the writes based on the same version succeeds. Has to be called in the
+    transaction of the write.
+    :param request: request of the user changing the list
+    :param pk: shopping list's ID
+    :return: False if the precondition failed
+    """
+    header = request.META.get('HTTP_IF_MATCH')
+    if header is None:
+        return True
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    versions = []
+    for etag in etags:
+        match = SHOPPING_LIST_ETAG_RE.fullmatch(etag)
+        if match and match.group(1) == str(pk):
+            versions.append(int(match.group(2)))
+    return bool(versions) and ShoppingList.bump_version_if_match(pk, versions)
+
+
+def shopping_lists_etag(request, *args, **kwargs):
+    """
+    ETag of the user's shopping lists overview, based on the versions of all
+    of the user's lists
+    :param request: request of the user accessing the overview
+    :return: ETag value
+    """
+    versions = ShoppingList.objects.filter(
+        user_id=request.user.id
+    ).order_by('id').values_list('id', 'version')
+    return hashlib.md5(str(list(versions)).encode()).hexdigest()
+
+
 class ShoppingListViewSet(ViewSet):
     _serializer = ShoppingListSerializer
     _serializer_details = ShoppingListDetailsSerializer
+    _operations_serializer = ShoppingListOperationsSerializer
 
     @method_decorator(login_required)
     def dispatch(self, request, *args, **kwargs):
         return super(ShoppingListViewSet, self).dispatch(request, *args,
                                                          **kwargs)
 
+    @method_decorator(condition(etag_func=shopping_lists_etag))
+    def list(self, request):
+        """
+        Endpoint for the shopping lists overview. The ETag changes whenever
+        one of the user's lists changes.
+        """
+        return Response({'status': 'success',
+                         'content': self._get_overview(request.user.id)})
+
+    @method_decorator(condition(etag_func=shopping_list_etag))
+    def retrieve(self, request, pk):
+        """Endpoint for a single shopping list with its items"""
+        instance = get_object_or_404(
+            get_accessible_shopping_lists_queryset(request.user.id)
+            .distinct(), pk=pk
+        )
+        items = get_shopping_list_detail_items_queryset(instance.pk)
+        return Response({
+            'id': instance.id,
+            'name': instance.name,
+            'version': instance.version,
+            'items': ShoppingListItemSerializer(items, many=True).data
+        })
+
     def create(self, request):
         logger.info(f'User {request.user} creating a new list')
         logger.info(request.data)
@@ -152,16 +271,29 @@ class ShoppingListViewSet(ViewSet):
     def update(self, request, pk):
         logger.info(f'User {request.user} updating list {pk}')
         logger.info(request.data)
-        instance = get_object_or_404(ShoppingList, pk=pk, deleted__isnull=True)
+        instance = get_object_or_404(ShoppingList, pk=pk)
+        access_level = instance.get_access_level(request.user)
+        if access_level is None:
+            raise Http404
+        # Replacing the list can do anything a batch of operations can do
+        forbidden = self._check_operations(
+            access_level,
+            set(ShoppingListOperationSerializer.OPERATION_CHOICES)
+        )
+        if forbidden:
+            return forbidden
         serializer = self._serializer(instance, data=request.data,
                                       context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                if not shopping_list_if_match(request, pk):
+                    return self._precondition_failed()
+                serializer.save()
             messages.success(request, _('Shopping list update'))
-            return Response({
+            return self._with_etag(Response({
                 'status': 'success',
                 'url': reverse('shopping_list')
-            })
+            }), request, pk)
         else:
             logger.info(serializer.errors)
             context = {'errors': serializer.errors}
@@ -170,40 +302,170 @@ class ShoppingListViewSet(ViewSet):
                 context['message'] = message
             return Response(context, status=status.HTTP_400_BAD_REQUEST)
 
+    def operations(self, request, pk):
+        """
+        Apply a batch of small operations to a shopping list, so that e.g.
+        checking off an item doesn't rewrite the whole list
+        :param request: DRF request with the list of operations
+        :param pk: shopping list's ID
+        :return: result of every operation
+        """
+        logger.info('User %d changing list %d', request.user.id, pk)
+        instance = get_object_or_404(ShoppingList, pk=pk)
+        access_level = instance.get_access_level(request.user)
+        if access_level is None:
+            raise Http404
+        serializer = self._operations_serializer(
+            data=request.data, context={'request': request}
+        )
+        if not serializer.is_valid():
+            logger.info(serializer.errors)
+            return Response({'errors': serializer.errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+        forbidden = self._check_operations(
+            access_level,
+            {x['op'] for x in serializer.validated_data['operations']}
+        )
+        if forbidden:
+            return forbidden
+        try:
+            with transaction.atomic():
+                if not shopping_list_if_match(request, pk):
+                    return self._precondition_failed()
+                results = serializer.apply(instance)
+        except ValidationError as e:
+            logger.info(e.detail)
+            return Response({'errors': e.detail},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return self._with_etag(
+            Response({'status': 'success', 'content': results}), request, pk
+        )
+
+    def ingest(self, request, pk=None):
+        """
+        Import a large number of items from an NDJSON request body into a
+        new shopping list, or into an existing one if pk is given. Items are
+        saved in batches and the progress of every batch is streamed back
+        as NDJSON, with the ID of the list once it is saved.
+        :param request: DRF request with one item per line
+        :param pk: ID of an existing shopping list
+        :return: streamed progress reports
+        """
+        if pk is None:
+            logger.info('User %d importing a new list', request.user.id)
+            name = request.GET.get('name', '')
+            max_length = ShoppingList._meta.get_field('name').max_length
+            # Saved with the first batch of items
+            instance = ShoppingList(name=name[:max_length],
+                                    user=request.user)
+        else:
+            logger.info('User %d importing into list %d', request.user.id,
+                        pk)
+            instance = get_object_or_404(ShoppingList, pk=pk)
+            access_level = instance.get_access_level(request.user)
+            if access_level is None:
+                raise Http404
+            if access_level != Profile.FULL_ACCESS:
+                return Response({
+                    'status': 'error',
+                    'message': _('You are not allowed to change this list')
+                }, status=status.HTTP_403_FORBIDDEN)
+        ingest = ShoppingListIngest(instance, request)
+        lines = iter(request.readline, b'')
+        response = StreamingHttpResponse(
+            (json.dumps(x) + '\n' for x in ingest.run(lines)),
+            content_type='application/x-ndjson'
+        )
+        if instance.pk is not None:
+            response['Location'] = reverse('api_shopping_list_single',
+                                           args=[instance.pk])
+        return response
+
     def archive(self, request, pk):
         logger.info(u'User %d archiving list %d', request.user.id, pk)
-        item = get_object_or_404(ShoppingList, pk=pk, user=request.user,
-                                 deleted__isnull=True)
-        item.soft_delete()
-        result = get_shopping_list_items_queryset(request.user.id)
-        serializer = self._serializer_details(result, many=True)
-        data = serializer.data
-        for i in range(0, len(data)):
-            data[i]['url'] = reverse('api_shopping_list_single',
-                                     args=[data[i]['id']])
-        return Response({'status': 'success', 'content': data})
+        item = get_object_or_404(ShoppingList, pk=pk, user=request.user)
+        with transaction.atomic():
+            if not shopping_list_if_match(request, pk):
+                return self._precondition_failed()
+            item.soft_delete()
+            ArchivedShoppingList.archive_lists([item.pk])
+        return self._removed_response(request, pk)
 
     def delete(self, request, pk, ):
         logger.info(u'User %d deleting list %d', request.user.id, pk)
-        item = get_object_or_404(ShoppingList, pk=pk, user=request.user,
-                                 deleted__isnull=True)
-        item.delete()
-        result = get_shopping_list_items_queryset(request.user.id)
+        item = get_object_or_404(ShoppingList, pk=pk, user=request.user)
+        with transaction.atomic():
+            if not shopping_list_if_match(request, pk):
+                return self._precondition_failed()
+            item.delete()
+        return self._removed_response(request, pk)
+
+    def _removed_response(self, request, pk):
+        """
+        Response for a list removed from the overview, containing the
+        removed list's ID and the new overview version. The whole overview
+        is only included if the full parameter is set.
+        """
+        context = {
+            'status': 'success',
+            'removed': pk,
+            'version': shopping_lists_etag(request),
+        }
+        if request.query_params.get('full') in ('1', 'true'):
+            context['content'] = self._get_overview(request.user.id)
+        return Response(context)
+
+    def _get_overview(self, user_id):
+        result = get_shopping_list_items_queryset(user_id)
         serializer = self._serializer_details(result, many=True)
         data = serializer.data
         for i in range(0, len(data)):
             data[i]['url'] = reverse('api_shopping_list_single',
                                      args=[data[i]['id']])
-        return Response({'status': 'success', 'content': data})
+        return data
+
+    def _check_operations(self, access_level, requested):
+        """
+        Check that an access level allows the requested operations, so all
+        the write endpoints of a list follow the same rules
+        :param access_level: user's access level to the list
+        :param requested: names of the requested operations
+        :return: error response, or None if the operations are allowed
+        """
+        allowed = self._operations_serializer.get_allowed_operations(
+            access_level
+        )
+        if not requested <= allowed:
+            return Response({
+                'status': 'error',
+                'message': _('You are not allowed to change this list')
+            }, status=status.HTTP_403_FORBIDDEN)
+        return None
+
+    @classmethod
+    def _precondition_failed(cls):
+        return Response({
+            'status': 'error',
+            'message': _('The shopping list was changed in the meantime')
+        }, status=status.HTTP_412_PRECONDITION_FAILED)
+
+    @classmethod
+    def _with_etag(cls, response, request, pk):
+        etag = shopping_list_etag(request, pk)
+        if etag:
+            response['ETag'] = quote_etag(etag)
+        return response
 
 
 class ItemViewSet(ModelViewSet):
     serializer_class = ItemSerializer
     autocomplete_serializer_class = ItemAutocompleteSerializer
+    pagination_class = ItemKeysetPagination
     permission_classes = (IsAuthenticated,)
+    max_price_items = 500
 
     def get_queryset(self):
-        return self.request.user.item_set.filter(deleted__isnull=True).all()
+        return self.request.user.item_set.prefetch_related('tags')
 
     def get_serializer_context(self):
         context = super(ItemViewSet, self).get_serializer_context()
@@ -215,7 +477,6 @@ class ItemViewSet(ModelViewSet):
         logger.info('User %d deleting item %d', request.user.id, pk)
         instance = self.get_object()
         instance.soft_delete()
-        instance.save()
         context = {'status': 'success', 'message': _('Item deleted')}
         return JsonResponse(context)
 
@@ -237,9 +498,199 @@ class ItemViewSet(ModelViewSet):
 
     def autocomplete(self, request):
         name = request.GET.get('name', '')
-        if len(name) < 2:
+        if len(name) < AUTOCOMPLETE_MIN_LENGTH:
             return JsonResponse([], status=200)
-        items = Item.objects.filter(name__icontains=name,
-                                    deleted__isnull=True).all()
-        serializer = self.autocomplete_serializer_class(items, many=True)
-        return JsonResponse(serializer.data, safe=False)
+        data = autocomplete_cache.get(request.user.id, name)
+        if data is None:
+            data = self._autocomplete_search(request.user.id, name)
+            autocomplete_cache.set(request.user.id, name, data)
+            logger.debug('Autocomplete cache miss: %s',
+                         autocomplete_cache.stats())
+        return JsonResponse(data, safe=False)
+
+    def _autocomplete_search(self, user_id, name):
+        """
+        Search the user's items in the in memory index and fall back to the
+        database if the user's catalog is too large for the index
+        """
+        data = item_index.search(
+            user_id, name, AUTOCOMPLETE_LIMIT,
+            lambda: self._load_autocomplete_index(user_id)
+        )
+        if data is None:
+            items = get_item_autocomplete_items(user_id, name)
+            data = self._serialize_autocomplete(items)
+        return data
+
+    def _load_autocomplete_index(self, user_id):
+        items = list(get_item_autocomplete_index_queryset(user_id))
+        data = self._serialize_autocomplete(items)
+        return zip(data, [x.score for x in items])
+
+    def _serialize_autocomplete(self, items):
+        return self.autocomplete_serializer_class(items, many=True).data
+
+    def last_prices(self, request):
+        """
+        Endpoint for the last paid prices of the items shown in the list
+        editor, looked up in bulk
+        :param request: DRF request with comma separated item IDs in the ids
+            parameter
+        :return: last paid price and its time by item ID
+        """
+        try:
+            item_ids = {int(x) for x in request.GET.get('ids', '').split(',')
+                        if x.strip()}
+        except ValueError:
+            raise ValidationError({'ids': ['Invalid Item PK value']})
+        if len(item_ids) > self.max_price_items:
+            raise ValidationError({'ids': [
+                f'Ensure there are no more than {self.max_price_items} items.'
+            ]})
+        if item_ids:
+            item_ids = get_accessible_items_queryset(request.user.id).filter(
+                id__in=item_ids
+            ).values_list('id', flat=True).distinct()
+        prices = ItemPriceHistory.last_paid_prices(item_ids)
+        return Response({'prices': {
+            item_id: {'price': price, 'recorded_at': recorded_at}
+            for item_id, (price, recorded_at) in prices.items()
+        }})
+
+    def price_history(self, request, pk=None):
+        """
+        Endpoint for the price history of an item
+        :param request: DRF request with optional ISO formatted since and
+            until parameters limiting the time range
+        :param pk: item's ID
+        :return: recorded prices, oldest first
+        """
+        items = get_accessible_items_queryset(request.user.id)
+        if not items.filter(pk=pk).exists():
+            raise Http404
+        limits = {}
+        for name in ('since', 'until'):
+            value = request.GET.get(name)
+            limits[name] = value and parse_datetime(value)
+            if value and limits[name] is None:
+                raise ValidationError({name: ['Invalid datetime format']})
+        history = ItemPriceHistory.between(pk, limits['since'],
+                                           limits['until'])
+        return Response(list(history.values(
+            'price', 'source', 'shopping_list_id', 'recorded_at'
+        )))
+
+
+class SearchViewSet(ViewSet):
+    serializer_class = SearchResultSerializer
+    pagination_class = SearchPagination
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request):
+        """
+        Endpoint for full text search over the user's items, their codes
+        and tags, and shopping list names
+        :param request: DRF request with the search text in the q parameter
+        :return: paginated list of results ordered by rank
+        """
+        logger.info('User %d searching', request.user.id)
+        paginator = self.pagination_class()
+        query = build_search_query(request.GET.get('q', ''))
+        if query is None:
+            queryset = []
+        else:
+            queryset = get_search_queryset(request.user.id, query)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ShoppingListArchiveViewSet(ViewSet):
+    permission_classes = (IsAuthenticated,)
+
+    def list(self, request):
+        """
+        Endpoint for the user's archived shopping lists, newest first. The
+        items are not included and are loaded with retrieve.
+        :param request: DRF request with the optional cursor parameter
+        :return: page of archived lists and the link to the next page
+        """
+        paginator = ArchivedShoppingListPagination()
+        page = paginator.paginate_queryset(
+            ArchivedShoppingList.objects.filter(user_id=request.user.id),
+            request, view=self
+        )
+        serializer = ArchivedShoppingListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, pk):
+        """
+        Endpoint for a single archived shopping list with its items
+        :param request: DRF request
+        :param pk: archived shopping list's ID
+        :return: archived list with items
+        """
+        instance = get_object_or_404(
+            ArchivedShoppingList.objects.prefetch_related('items'),
+            pk=pk, user_id=request.user.id
+        )
+        return Response(ArchivedShoppingListDetailsSerializer(instance).data)
+
+
+class StatisticsViewSet(ViewSet):
+    permission_classes = (IsAuthenticated,)
+    daily_days = 30
+    default_months = 12
+    max_months = 36
+    top_categories = 5
+
+    def list(self, request):
+        """
+        Endpoint for the dashboard spending statistics. Only the precomputed
+        spending rollups are read, so the cost doesn't grow with the number
+        of shopping lists of the user.
+        :param request: DRF request with the optional months parameter
+        :return: daily spending, monthly spending and top categories
+        """
+        months = request.GET.get('months', self.default_months)
+        try:
+            months = int(months)
+        except (TypeError, ValueError):
+            raise ValidationError({'months': ['A valid integer is required.']})
+        if not 1 <= months <= self.max_months:
+            raise ValidationError({'months': [
+                f'Ensure this value is between 1 and {self.max_months}.'
+            ]})
+
+        today = timezone.localdate()
+        daily_start = today - timedelta(days=self.daily_days - 1)
+        year, month = divmod(today.year * 12 + today.month - months, 12)
+        monthly_start = today.replace(year=year, month=month + 1, day=1)
+
+        user_id = request.user.id
+        return Response({
+            'daily': list(get_daily_spending_queryset(user_id, daily_start)),
+            'monthly': list(get_monthly_spending_queryset(user_id,
+                                                          monthly_start)),
+            'top_categories': list(get_top_categories_queryset(
+                user_id, monthly_start, self.top_categories
+            )),
+        })
+
+
+class CacheStatsViewSet(ViewSet):
+    permission_classes = (IsAdminUser,)
+
+    def list(self, request):
+        """
+        Endpoint for the hit and miss counters of the process local caches
+        of the process serving the request
+        :param request: DRF request of a staff user
+        :return: counters by cache name
+        """
+        return Response({
+            'fragments': fragment_cache.stats(),
+            'autocomplete': autocomplete_cache.stats(),
+            'tags': tag_cache.stats(),
+            'prices': price_cache.stats(),
+        })
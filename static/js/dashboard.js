@@ -0,0 +1,54 @@
+/************************
+ * Spending statistics *
+ ************************/
+
+/**
+ * Load the spending statistics of the user and render them in the
+ * dashboard cards
+ */
+function initSpendingStatistics() {
+    const section = $('#statistics');
+    jsonRequest(section.data('url')).then(function (response) {
+        renderStatisticBars('#daily-spending', response.daily,
+            'period', 'total_spent');
+        renderStatisticBars('#monthly-spending', response.monthly,
+            'period', 'item_count');
+        renderStatisticBars('#top-categories', response.top_categories,
+            'name', 'total_spent');
+    }).catch(function (response) {
+        createToastMessage('Could not load the statistics', 'danger');
+    });
+}
+
+/**
+ * Render rows of statistics as labelled horizontal bars scaled to the
+ * largest value
+ * @param selector - selector of the container element
+ * @param rows - list of statistic rows
+ * @param labelKey - key of the row label
+ * @param valueKey - key of the row value
+ */
+function renderStatisticBars(selector, rows, labelKey, valueKey) {
+    const container = $(selector).empty();
+    if (!rows.length) {
+        container.text('No data yet');
+        return;
+    }
+    const max = Math.max(...rows.map(row => parseFloat(row[valueKey]) || 0));
+    rows.forEach(function (row) {
+        const value = parseFloat(row[valueKey]) || 0;
+        const width = max ? value / max * 100 : 0;
+        const bar = $('<div class="progress mb-2"></div>').append(
+            $('<div class="progress-bar" role="progressbar"></div>')
+                .css('width', width + '%')
+        );
+        container.append(
+            $('<div class="d-flex justify-content-between small"></div>')
+                .append($('<span></span>').text(row[labelKey]))
+                .append($('<span></span>').text(
+                    Number.isInteger(value) ? value : value.toFixed(2)
+                )),
+            bar
+        );
+    });
+}
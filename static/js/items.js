@@ -178,3 +178,37 @@ function postOrPutItemData() {
         }
     });
 }
+
+/**
+ * Initialize loading the next page of items when the user scrolls to
+ * the end of the item table. The url of the next page contains the
+ * cursor of the last loaded item.
+ */
+function initItemInfiniteScroll() {
+    let loading = false;
+    $(window).off('scroll.items').on('scroll.items', function (e) {
+        const $loadMore = $('#items-load-more');
+        if (loading || !$loadMore.length) {
+            return;
+        }
+        const bottom = $(window).scrollTop() + $(window).height();
+        if (bottom < $loadMore.offset().top - 200) {
+            return;
+        }
+        loading = true;
+        jsonRequest($loadMore.data('url')).then(function (response) {
+            response.results.forEach(item => addItemRow(item));
+            initItemEditBtn();
+            initItemDeleteBtn();
+            if (response.next) {
+                $loadMore.data('url', response.next);
+            } else {
+                $loadMore.remove();
+            }
+            loading = false;
+        }).catch(function (response) {
+            loading = false;
+            createSubmissionErrorToast();
+        });
+    });
+}
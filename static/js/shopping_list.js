@@ -36,18 +36,19 @@ function initListDeleteConfirmBtn() {
 }
 
 /**
- * Helper function for deleting or archiving a list
+ * Helper function for deleting or archiving a list. Removes the list's row
+ * from the table instead of reloading the whole table.
  * @param url - string value of the api endpoint
  * @param method - string name of the method (patch or delete)
  * @param toastMessage - string message to be shown to the user
  */
 function deleteOrArchiveList(url, method, toastMessage) {
     jsonRequest(url, null, method).then(function (response) {
-        const table = generateShoppingListTable(response.content);
-        $('#shopping-list-table tbody').html(table);
-        initListArchiveBtn();
-        initListDeleteBtn();
-        initClickableShoppingListCell();
+        $(`.archive-list[data-url="${url}"]`).closest('tr').remove();
+        const $tableBody = $('#shopping-list-table tbody');
+        if (!$tableBody.children('tr').length) {
+            $tableBody.html(generateShoppingListTable([]));
+        }
         $('.modal').modal('hide');
         createToastMessage(toastMessage, 'info');
     });
@@ -258,6 +259,29 @@ function createShoppingListItemRow(item) {
     return tableRow;
 }
 
+/**
+ * Load the last paid prices of all items in the list table with a single
+ * request and show them in the price cell tooltips
+ */
+function initLastPaidPrices() {
+    const url = $('#submit-shopping-list').data('prices-url');
+    const ids = $('tr.data[data-item-id]').map(function () {
+        return $(this).data('item-id');
+    }).get();
+    if (!url || !ids.length) {
+        return;
+    }
+    jsonRequest(`${url}?ids=${ids.join(',')}`).then(function (response) {
+        $('tr.data[data-item-id]').each(function () {
+            const last = response.prices[$(this).data('item-id')];
+            if (last) {
+                $(this).children('.item-price')
+                    .attr('title', `Last paid: ${last.price}`);
+            }
+        });
+    });
+}
+
 /**
  * Helper function that populates the item addition form
  * in the shopping list view when an item from the search list
@@ -517,14 +541,33 @@ function createEditItemRowForm($container) {
 }
 
 /**
- * Initialize the button for toggling an item's is_done state.
+ * Initialize the button for toggling an item's is_done state. Items that
+ * are already saved are toggled on the server right away.
  */
 function initToggleItemDone() {
     $('.toggle-done').off('click').on('click', function (e) {
-        let value = $(this).attr('data-value');
-        value = value === 'True' ? 'False' : 'True';
-        $(this).attr('data-value', value);
-        $(this).html(getItemDoneElement(value));
+        const $toggle = $(this);
+        const previous = $toggle.attr('data-value');
+        const value = previous === 'True' ? 'False' : 'True';
+        $toggle.attr('data-value', value);
+        $toggle.html(getItemDoneElement(value));
+
+        const url = $('#submit-shopping-list').attr('data-operations-url');
+        const linkId = $toggle.closest('.data').attr('data-link');
+        if (!url || !linkId) {
+            return;
+        }
+        const data = {
+            operations: [{
+                op: 'toggle',
+                link_id: linkId,
+                is_done: value === 'True'
+            }]
+        };
+        jsonRequest(url, data, 'PATCH').catch(function () {
+            $toggle.attr('data-value', previous);
+            $toggle.html(getItemDoneElement(previous));
+        });
     })
 }
 
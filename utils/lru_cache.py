@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread safe, size bounded least recently used cache with an optional
+    time to live for its entries. Keeps hit and miss counters.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """
+        :param max_size: maximum number of entries kept in the cache
+        :param ttl: optional number of seconds after which an entry expires
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key: Hashable, default: Any = None,
+            count: bool = True) -> Any:
+        """
+        Get a value from the cache and mark it as recently used
+        :param key: cache key
+        :param default: value returned if the key is not cached
+        :param count: whether to update the hit and miss counters
+        :return: cached value or default
+        """
+        with self._lock:
+            entry = self._lookup(key)
+        if count:
+            self.record(entry is not None)
+        return default if entry is None else entry[1]
+
+    def record(self, hit: bool) -> None:
+        """
+        Update the hit and miss counters, used by callers that look up
+        several keys to answer a single request
+        :param hit: whether the request was answered from the cache
+        :return: None
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value in the cache, evicting the least recently used
+        entries if the cache is full
+        :param key: cache key
+        :param value: value to store
+        :return: None
+        """
+        expires = time.monotonic() + self.ttl if self.ttl is not None else 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a key from the cache if it exists"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Remove all entries whose key satisfies the predicate
+        :param predicate: function receiving a key and returning a boolean
+        :return: number of removed entries
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Get the cache usage counters
+        :return: dictionary with hits, misses, size and max_size keys
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'max_size': self.max_size,
+        }
@@ -1,25 +1,36 @@
 from typing import List, Optional
 
-from django.core.mail import EmailMessage
+from core.models import OutgoingEmail
 
 
 def send_mail(subject: str, message: str, receiver_list: List[str],
               cc_list: Optional[List[str]] = None,
               sender: Optional[str] = None,
-              **kwargs) -> None:
+              **kwargs) -> OutgoingEmail:
     """
-    Wrapper function to simplify sending html type emails
+    Wrapper function to simplify sending html type emails. The email is
+    written to the outbox in the current transaction and sent by the
+    run_mail_worker command, so it is only sent if the transaction commits.
     :param subject: subject of the email
     :param message: email content
     :param receiver_list: a list of emails to which to send the email
     :param cc_list: optional list of emails added as cc
     :param sender: optional string of the sender's email address
-    :param kwargs: other keyword arguments used by the EmailMessage class
-    :return: None
+    :param kwargs: bcc, reply_to and headers arguments of the EmailMessage
+    class
+    :return: outbox entry of the email
     """
-    if cc_list is None:
-        cc_list = []
-    email = EmailMessage(subject, message, sender, to=receiver_list,
-                         cc=cc_list, **kwargs)
-    email.content_subtype = 'html'
-    email.send()
+    unsupported = set(kwargs) - {'bcc', 'reply_to', 'headers'}
+    if unsupported:
+        raise TypeError(f'Unsupported email arguments: '
+                        f'{", ".join(sorted(unsupported))}')
+    return OutgoingEmail.objects.create(
+        subject=str(subject),
+        body=message,
+        from_email=sender,
+        to=list(receiver_list),
+        cc=list(cc_list or []),
+        bcc=list(kwargs.get('bcc') or []),
+        reply_to=list(kwargs.get('reply_to') or []),
+        headers=kwargs.get('headers') or {},
+    )